@@ -3,15 +3,17 @@
 
 import db
 from config import ADMIN_IDS, is_admin
+from utils import format_collection_stats, format_duration
+from archive_logger import get_archive_stats
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from datetime import datetime
 import html
 
 
-def build_admin_main_menu():
+async def build_admin_main_menu():
     """Build the admin main menu message and keyboard"""
-    stats = db.get_global_stats()
+    stats = await db.aio.get_global_stats()
     
     message_text = (
         "🔧 <b>ממשק ניהול מערכת</b>\n\n"
@@ -41,7 +43,7 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ אין לך הרשאות גישה לממשק הניהול.")
         return
     
-    message_text, reply_markup = build_admin_main_menu()
+    message_text, reply_markup = await build_admin_main_menu()
     
     await update.message.reply_text(
         message_text,
@@ -132,7 +134,7 @@ async def handle_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def show_main_menu(query, context: ContextTypes.DEFAULT_TYPE):
     """תצוגת תפריט ראשי"""
-    message_text, reply_markup = build_admin_main_menu()
+    message_text, reply_markup = await build_admin_main_menu()
     
     await query.edit_message_text(
         message_text,
@@ -143,7 +145,7 @@ async def show_main_menu(query, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_global_stats(query, context: ContextTypes.DEFAULT_TYPE):
     """תצוגת סטטיסטיקות כלליות"""
-    stats = db.get_global_stats()
+    stats = await db.aio.get_global_stats()
     
     message_text = (
         "📊 <b>סטטיסטיקות מערכת</b>\n\n"
@@ -152,6 +154,13 @@ async def show_global_stats(query, context: ContextTypes.DEFAULT_TYPE):
         f"📄 פריטים: {stats['items']}\n"
     )
     
+    activity_queue = get_archive_stats()["activity"]
+    message_text += f"\n📮 תור יומן פעילות: {activity_queue['depth']}"
+    if activity_queue["depth"]:
+        message_text += f" (הוותיק ממתין {format_duration(activity_queue['oldest_age_seconds'])})"
+    if activity_queue["dropped"]:
+        message_text += f"\n⚠️ אירועים שנזרקו: {activity_queue['dropped']}"
+    
     keyboard = [[InlineKeyboardButton("⬅️ חזור", callback_data="admin_back_to_main")]]
     
     await query.edit_message_text(
@@ -165,7 +174,7 @@ async def show_global_stats(query, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_users_list(query, context: ContextTypes.DEFAULT_TYPE):
     """תצוגת רשימת משתמשים"""
-    user_ids = db.get_all_users_with_collections()
+    user_ids = await db.aio.get_all_users_with_collections()
     
     if not user_ids:
         await query.edit_message_text(
@@ -178,7 +187,7 @@ async def show_users_list(query, context: ContextTypes.DEFAULT_TYPE):
     keyboard = []
     
     for uid in user_ids:
-        user_info = db.get_user_details(uid)
+        user_info = await db.aio.get_user_details(uid)
         if user_info:
             username = user_info['username'] or ""
             first_name = user_info['first_name'] or f"User_{uid}"
@@ -196,7 +205,7 @@ async def show_users_list(query, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_user_card(query, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """כרטיס משתמש בודד"""
-    user_info = db.get_user_details(user_id)
+    user_info = await db.aio.get_user_details(user_id)
     
     if not user_info:
         await query.answer("משתמש לא נמצא", show_alert=True)
@@ -240,7 +249,7 @@ async def show_user_card(query, context: ContextTypes.DEFAULT_TYPE, user_id: int
 
 async def block_user_action(query, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """חסימת משתמש"""
-    success = db.block_user(user_id)
+    success = await db.aio.block_user(user_id)
     
     if success:
         await query.answer("✅ המשתמש נחסם בהצלחה!", show_alert=True)
@@ -254,7 +263,7 @@ async def block_user_action(query, context: ContextTypes.DEFAULT_TYPE, user_id:
 async def show_collections_list(query, context: ContextTypes.DEFAULT_TYPE, page: int = 1):
     """תצוגת רשימת אוספים עם pagination"""
     items_per_page = 12
-    total_items = db.count_all_collections()
+    total_items = await db.aio.count_all_collections()
     
     if total_items == 0:
         await query.edit_message_text(
@@ -267,7 +276,7 @@ async def show_collections_list(query, context: ContextTypes.DEFAULT_TYPE, page:
     page = max(1, min(page, total_pages))
     offset = (page - 1) * items_per_page
     
-    collections = db.get_all_collections_paginated(offset=offset, limit=items_per_page)
+    collections = await db.aio.get_all_collections_paginated(offset=offset, limit=items_per_page)
     
     message_text = f"📦 <b>רשימת אוספים</b> (עמוד {page}/{total_pages})\n\n"
     keyboard = []
@@ -309,16 +318,16 @@ async def show_collections_list(query, context: ContextTypes.DEFAULT_TYPE, page:
 
 async def show_collection_card(query, context: ContextTypes.DEFAULT_TYPE, collection_id: int):
     """כרטיס אוסף בודד"""
-    collection = db.get_collection_by_id(collection_id)
+    collection = await db.aio.get_collection_by_id(collection_id)
     
     if not collection:
         await query.answer("אוסף לא נמצא", show_alert=True)
         return
     
     col_id, col_name, owner_id = collection
-    item_count = db.count_items_in_collection(collection_id)
+    stats = await db.aio.get_collection_stats(collection_id)
     
-    owner_info = db.get_user(owner_id)
+    owner_info = await db.aio.get_user(owner_id)
     owner_display = owner_info.username if owner_info and owner_info.username else f"User_{owner_id}"
     
     # Escape HTML characters in collection name and owner
@@ -330,8 +339,11 @@ async def show_collection_card(query, context: ContextTypes.DEFAULT_TYPE, collec
         f"📛 שם: {safe_col_name}\n"
         f"🆔 ID: <code>{col_id}</code>\n"
         f"👤 בעלים: @{safe_owner_display}\n"
-        f"📄 פריטים: {item_count}\n"
+        f"📄 פריטים: {stats['items']}\n"
     )
+    breakdown = format_collection_stats(stats)
+    if breakdown:
+        message_text += f"{breakdown}\n"
     
     keyboard = [
         [InlineKeyboardButton("👁️ דפדף בתוכן", callback_data=f"browse_page:{collection_id}:1")],
@@ -349,7 +361,7 @@ async def show_collection_card(query, context: ContextTypes.DEFAULT_TYPE, collec
 async def clone_collection_action(query, context: ContextTypes.DEFAULT_TYPE, collection_id: int):
     """שכפול אוסף לאדמין"""
     admin_id = query.from_user.id
-    new_collection_id = db.clone_collection_for_user(collection_id, admin_id)
+    new_collection_id = await db.aio.clone_collection_for_user(collection_id, admin_id)
     
     if new_collection_id > 0:
         await query.answer("✅ האוסף שוכפל בהצלחה!", show_alert=True)
@@ -362,7 +374,7 @@ async def clone_collection_action(query, context: ContextTypes.DEFAULT_TYPE, col
 
 async def show_shares_dashboard(query, context: ContextTypes.DEFAULT_TYPE, page: int = 1):
     """מסך ראשי שיתופים - תצוגת טקסט עם pagination"""
-    shares = db.get_all_active_shares()
+    shares = await db.aio.get_all_active_shares()
     
     if not shares:
         await query.edit_message_text(
@@ -437,7 +449,7 @@ async def show_shares_dashboard(query, context: ContextTypes.DEFAULT_TYPE, page:
 async def show_share_card(query, context: ContextTypes.DEFAULT_TYPE, share_id: int):
     """כרטיס שיתוף בודד - עם כפתורי פעולה"""
     # Get all shares to find the one we need
-    all_shares = db.get_all_active_shares()
+    all_shares = await db.aio.get_all_active_shares()
     share_info = None
     
     for share in all_shares:
@@ -452,11 +464,12 @@ async def show_share_card(query, context: ContextTypes.DEFAULT_TYPE, share_id: i
     share_id, share_code, collection_id, collection_name, created_by, creator_username, created_at, unique_users, total_accesses = share_info
     
     # Get detailed stats
-    stats = db.get_share_stats(share_code)
-    item_count = db.count_items_in_collection(collection_id)
+    stats = await db.aio.get_share_stats(share_code)
+    daily = await db.aio.get_share_daily_accesses(share_code, days=7)
+    item_count = await db.aio.count_items_in_collection(collection_id)
     
     # Get recent users (up to 10)
-    recent_logs = db.get_detailed_access_log(share_code, limit=10)
+    recent_logs = await db.aio.get_detailed_access_log(share_code, limit=10)
     
     # Format date
     try:
@@ -480,8 +493,12 @@ async def show_share_card(query, context: ContextTypes.DEFAULT_TYPE, share_id: i
         f"📅 נוצר: {date_str}\n"
         f"📁 קבצים: {item_count}\n"
         f"👥 גישות ייחודיות: {stats['unique_users']}\n"
-        f"📊 גישות כולל: {stats['total_accesses']}\n\n"
+        f"📊 גישות כולל: {stats['total_accesses']}\n"
+        f"📈 גישות ב-7 הימים האחרונים: {sum(count for _, count in daily)}\n"
     )
+    if stats["last_access"]:
+        message_text += f"🕒 גישה אחרונה: {stats['last_access'][:16].replace('T', ' ')}\n"
+    message_text += "\n"
     
     if recent_logs:
         message_text += "<b>משתמשים אחרונים:</b>\n"
@@ -508,7 +525,7 @@ async def show_share_card(query, context: ContextTypes.DEFAULT_TYPE, share_id: i
 async def disable_share_action(query, context: ContextTypes.DEFAULT_TYPE, share_code: str):
     """השבתת קוד שיתוף"""
     # Get collection id from share code
-    collection_info = db.get_collection_by_share_code(share_code)
+    collection_info = await db.aio.get_collection_by_share_code(share_code)
     
     if not collection_info:
         await query.answer("❌ קוד שיתוף לא נמצא", show_alert=True)
@@ -516,7 +533,7 @@ async def disable_share_action(query, context: ContextTypes.DEFAULT_TYPE, share_
     
     collection_id, _, owner_id = collection_info
     
-    success = db.revoke_share_code(collection_id, owner_id)
+    success = await db.aio.revoke_share_code(collection_id, owner_id)
     
     if success:
         await query.answer("✅ קוד השיתוף הושבת!", show_alert=True)
@@ -527,7 +544,7 @@ async def disable_share_action(query, context: ContextTypes.DEFAULT_TYPE, share_
 
 async def create_new_share_action(query, context: ContextTypes.DEFAULT_TYPE, collection_id: int):
     """יצירת קוד שיתוף חדש"""
-    collection = db.get_collection_by_id(collection_id)
+    collection = await db.aio.get_collection_by_id(collection_id)
     
     if not collection:
         await query.answer("❌ אוסף לא נמצא", show_alert=True)
@@ -537,7 +554,7 @@ async def create_new_share_action(query, context: ContextTypes.DEFAULT_TYPE, col
     admin_id = query.from_user.id
     
     # Create new share code
-    new_code = db.create_share_link(collection_id, admin_id)
+    new_code = await db.aio.create_share_link(collection_id, admin_id)
     
     await query.answer(f"✅ קוד חדש נוצר: {new_code}", show_alert=True)
     await show_shares_dashboard(query, context)
@@ -545,7 +562,7 @@ async def create_new_share_action(query, context: ContextTypes.DEFAULT_TYPE, col
 
 async def show_share_access_log(query, context: ContextTypes.DEFAULT_TYPE, share_code: str, offset: int = 0):
     """לוג גישות מפורט"""
-    logs = db.get_detailed_access_log(share_code, offset=offset, limit=20)
+    logs = await db.aio.get_detailed_access_log(share_code, offset=offset, limit=20)
     
     if not logs:
         await query.edit_message_text(
@@ -556,7 +573,7 @@ async def show_share_access_log(query, context: ContextTypes.DEFAULT_TYPE, share
         return
     
     # Get share info for title
-    collection_info = db.get_collection_by_share_code(share_code)
+    collection_info = await db.aio.get_collection_by_share_code(share_code)
     collection_name = collection_info[1] if collection_info else "Unknown"
     safe_collection_name = html.escape(collection_name)
     
@@ -588,7 +605,7 @@ async def show_share_access_log(query, context: ContextTypes.DEFAULT_TYPE, share
 
 async def show_user_collections(query, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """תצוגת אוספים של משתמש ספציפי"""
-    collections = db.get_collections(user_id)
+    collections = await db.aio.get_collections(user_id)
     
     if not collections:
         await query.edit_message_text(
@@ -612,7 +629,7 @@ async def show_user_collections(query, context: ContextTypes.DEFAULT_TYPE, user_
 
 async def show_admin_collection_management(query, context: ContextTypes.DEFAULT_TYPE, collection_id: int):
     """ניהול אוסף ספציפי מתוך ממשק הניהול"""
-    collection = db.get_collection_by_id(collection_id)
+    collection = await db.aio.get_collection_by_id(collection_id)
     
     if not collection:
         await query.edit_message_text(
@@ -622,7 +639,8 @@ async def show_admin_collection_management(query, context: ContextTypes.DEFAULT_
         return
     
     col_id, col_name, owner_id = collection
-    item_count = db.count_items_in_collection(collection_id)
+    stats = await db.aio.get_collection_stats(collection_id)
+    breakdown = format_collection_stats(stats)
     
     # Escape HTML characters in collection name
     safe_col_name = html.escape(col_name)
@@ -637,7 +655,8 @@ async def show_admin_collection_management(query, context: ContextTypes.DEFAULT_
     await query.edit_message_text(
         f"📦 <b>ניהול אוסף: {safe_col_name}</b>\n\n"
         f"👤 בעלים: {owner_id}\n"
-        f"📄 פריטים: {item_count}",
+        f"📄 פריטים: {stats['items']}"
+        + (f"\n{breakdown}" if breakdown else ""),
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode="HTML"
     )
@@ -645,7 +664,7 @@ async def show_admin_collection_management(query, context: ContextTypes.DEFAULT_
 
 async def confirm_delete_collection(query, context: ContextTypes.DEFAULT_TYPE, collection_id: int):
     """אישור מחיקת אוסף"""
-    collection = db.get_collection_by_id(collection_id)
+    collection = await db.aio.get_collection_by_id(collection_id)
     
     if not collection:
         await query.answer("האוסף לא נמצא", show_alert=True)
@@ -672,9 +691,9 @@ async def confirm_delete_collection(query, context: ContextTypes.DEFAULT_TYPE, c
 async def delete_collection_action(query, context: ContextTypes.DEFAULT_TYPE, collection_id: int):
     """מחיקת אוסף בפועל"""
     # Delete all items first
-    db.delete_all_items_in_collection(collection_id)
+    await db.aio.delete_all_items_in_collection(collection_id)
     # Delete collection
-    success = db.delete_collection(collection_id)
+    success = await db.aio.delete_collection(collection_id)
     
     if success:
         await query.edit_message_text(
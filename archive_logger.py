@@ -7,49 +7,59 @@ This module handles:
 2. Sending structured activity logs to admin channel
 3. Rate limiting and error handling for channel operations
 
-Uses a queue-based approach to prevent Telegram rate limiting.
+Every channel has its own durable queue (the archive_queue table) drained
+by its own worker. Enqueueing only buffers the event in memory and never
+waits on a send or a lock; the worker persists buffered events, sends them
+in order and deletes each one once sent, so events survive a restart. Each
+channel's sends are paced by that channel's bucket in the shared send
+scheduler.
+
+Queues are bounded: above HIGH_WATER_MARK low-priority events are dropped
+(FILE_ARCHIVED events are digested instead), and in digest mode
+FILE_ARCHIVED events are coalesced per user/collection, so queue depth
+follows the number of active uploaders rather than the upload rate.
 """
 
 import asyncio
+import html
+import json
 import logging
+import time
 from datetime import datetime, timezone
-from typing import Optional, Literal, TypedDict
-from collections import deque
-from telegram import Bot, InlineKeyboardMarkup
-from telegram.error import TelegramError, Forbidden, RetryAfter
+from typing import Awaitable, Callable, Optional, Literal
+from telegram import Bot, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.error import Forbidden, RetryAfter
+
+import db
+from delivery import copy_run, plan_copy_runs
+from send_scheduler import send_scheduler, is_transient
 
 # Channel IDs - configured by admin
 ARCHIVE_CHANNEL_1 = -1003386031529  # ערוץ גיבוי תוכן 1
 ARCHIVE_CHANNEL_2 = -1003470142704  # ערוץ גיבוי תוכן 2
 ADMIN_ACTIVITY_CHANNEL = -1003542497376  # ערוץ מידע - בוט אוספים
 
-# Feature toggle
+# Feature toggles
 ENABLE_ARCHIVING = True
+ENABLE_CHANNEL_BACKUP = True  # copy every saved file to both archive channels
 
-# Rate limiting - more conservative to avoid flood control
-ARCHIVE_DELAY = 5.0  # seconds between archive file sends (per channel)
-ACTIVITY_LOG_DELAY = 2.0  # seconds between activity logs
-RETRY_EXTRA_DELAY = 5.0  # extra delay after a retry
+ARCHIVE_CHANNELS = (ARCHIVE_CHANNEL_1, ARCHIVE_CHANNEL_2)
 
-logger = logging.getLogger(__name__)
+# Channel queues
+HIGH_WATER_MARK = 500  # queued events per channel before low-priority events are shed
+MAX_QUEUED_EVENTS = 2000  # per channel; events beyond this are dropped and counted
+QUEUE_FETCH_SIZE = 50  # events read from the DB per step
+OUTAGE_BACKOFF_BASE = 5.0  # seconds before events kept by an outage are tried again
+OUTAGE_BACKOFF_MAX = 300.0
+MAX_EVENT_ATTEMPTS = 5  # handler crashes before an event is given up on
+ARCHIVE_BATCH_SIZE = 100  # files copied to an archive channel per copy_messages call
 
-class ArchiveQueueItem(TypedDict):
-    item_id: int
-    file_id: Optional[str]
-    content_type: str
-    user_id: int
-    user_name: str
-    username: Optional[str]
-    collection_id: int
-    collection_name: Optional[str]
-    file_name: Optional[str]
-    original_caption: Optional[str]
-    bot: Bot
-
-# Global queue and lock for serializing archive operations
-_archive_queue: deque[ArchiveQueueItem] = deque()
-_archive_lock = asyncio.Lock()
-_queue_processor_running = False
+# Digest mode: FILE_ARCHIVED events of one user/collection are coalesced
+DIGEST_MODE = True
+DIGEST_WINDOW = 30.0  # seconds a digest collects uploads before it is sent
+DIGEST_MAX_ITEMS = 50  # send a digest early once it holds this many items
+
+logger = logging.getLogger(__name__)
 
 # Action types for activity logging
 ActionType = Literal[
@@ -62,6 +72,9 @@ ActionType = Literal[
     "SHARE_REVOKED"
 ]
 
+# Shed first when a channel queue is above its high-water mark
+LOW_PRIORITY_ACTIONS = {"FILE_SAVED", "FILE_ARCHIVED", "FILES_SENT", "SHARE_ACCESSED"}
+
 # Hebrew action names
 ACTION_NAMES_HE = {
     "FILE_SAVED": "קובץ נשמר",
@@ -76,7 +89,7 @@ ACTION_NAMES_HE = {
 
 def format_archive_caption(
     item_id: int,
-    file_id: str,
+    file_id: Optional[str],
     user_id: int,
     archive_msg_id: Optional[int] = None,
     original_caption: Optional[str] = None,
@@ -92,6 +105,7 @@ def format_archive_caption(
     else:
         user_display = str(user_id)
 
+    file_id = file_id or "-"  # text items have no file
     lines = [
         f"📦 מזהה פריט: {item_id}",
         f"📁 מזהה קובץ: {file_id[:50]}..." if len(file_id) > 50 else f"📁 מזהה קובץ: {file_id}",
@@ -160,6 +174,44 @@ def format_activity_log(
     return "\n".join(lines)
 
 
+def format_archive_digest(
+    user_id: int,
+    user_name: str,
+    username: Optional[str],
+    collection_id: int,
+    collection_name: Optional[str],
+    item_ids: list[int],
+    first_at: datetime,
+    last_at: datetime,
+    bot_username: Optional[str] = None
+) -> str:
+    """
+    Format one HTML activity log for several FILE_ARCHIVED events of a user/collection.
+    Item ids link to the admin "view file" deep link.
+    """
+    if username:
+        user_display = f"{html.escape(user_name)} @{html.escape(username)}"
+    else:
+        user_display = str(user_id)
+    collection_display = html.escape(collection_name) if collection_name else str(collection_id)
+
+    if bot_username:
+        items = ", ".join(
+            f'<a href="https://t.me/{bot_username}?start=view_{item_id}">{item_id}</a>'
+            for item_id in item_ids
+        )
+    else:
+        items = ", ".join(str(item_id) for item_id in item_ids)
+
+    return "\n".join([
+        f"🕐 {first_at:%Y-%m-%d %H:%M:%S} - {last_at:%H:%M:%S} UTC",
+        f"📌 פעולה: {len(item_ids)} קבצים התווספו לאוסף \"{collection_display}\"",
+        f"👤 משתמש: {user_display}",
+        f"📦 פריטים: {items}",
+        "מצב: ✅ נשמר בהצלחה",
+    ])
+
+
 def get_message_link(channel_id: int, message_id: int) -> str:
     """
     Generate a direct link to a message in a private channel.
@@ -174,34 +226,37 @@ def get_message_link(channel_id: int, message_id: int) -> str:
     return f"https://t.me/c/{link_channel_id}/{message_id}"
 
 
+def is_outage(error: Exception) -> bool:
+    """Errors that outlasted the retry policy but may clear up later (flood wait, network down)."""
+    return isinstance(error, RetryAfter) or is_transient(error)
+
+
 async def _send_with_retry(
     bot: Bot,
+    channel_id: int,
     send_func,
-    max_retries: int = 3
+    method: str = "send",
+    max_retries: int = 3,
+    raise_outages: bool = False
 ) -> Optional[int]:
     """
-    Execute a send function with retry logic for rate limits.
+    Execute a send function through the send scheduler, which paces it and
+    retries RetryAfter and transient errors.
     Returns message_id on success, None on failure.
+    raise_outages=True re-raises outage errors instead, for the channel
+    queues, which keep the event and try again later.
     """
-    for attempt in range(max_retries):
-        try:
-            msg = await send_func()
-            return msg.message_id
-        except RetryAfter as e:
-            wait_time = e.retry_after + RETRY_EXTRA_DELAY
-            logger.warning(f"Rate limited (attempt {attempt+1}), waiting {wait_time}s")
-            await asyncio.sleep(wait_time)
-        except Forbidden:
-            logger.error("Bot not authorized in channel")
-            return None
-        except (TelegramError, Exception) as e:
-            logger.warning(f"Send error (attempt {attempt+1}): {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(RETRY_EXTRA_DELAY)
-            else:
-                logger.error(f"Failed to send after {max_retries} attempts: {e}")
-                return None
-    return None
+    try:
+        msg = await send_scheduler.send(channel_id, send_func, max_retries=max_retries, method=method)
+        return msg.message_id
+    except Forbidden:
+        logger.error("Bot not authorized in channel")
+        return None
+    except Exception as e:
+        if raise_outages and is_outage(e):
+            raise
+        logger.error(f"Failed to send to channel {channel_id}: {e}")
+        return None
 
 
 async def safe_send_to_channel(
@@ -221,22 +276,25 @@ async def safe_copy_file_to_channel(
     content_type: str,
     caption: Optional[str] = None,
     file_name: Optional[str] = None,
-    reply_markup: Optional[InlineKeyboardMarkup] = None
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    parse_mode: Optional[str] = None,
+    raise_outages: bool = False
 ) -> Optional[int]:
     """
     Copy a file or send a message to a channel.
     Unified function for all content types.
-    Returns message_id on success, None on failure.
+    Returns message_id on success, None on failure (see _send_with_retry
+    for raise_outages).
     """
+    method_map = {
+        "photo": "send_photo",
+        "video": "send_video",
+        "document": "send_document",
+        "audio": "send_audio",
+        "text": "send_message"
+    }
+    
     async def send():
-        method_map = {
-            "photo": "send_photo",
-            "video": "send_video",
-            "document": "send_document",
-            "audio": "send_audio",
-            "text": "send_message"
-        }
-        
         if content_type not in method_map:
             raise ValueError(f"Unknown content type: {content_type}")
             
@@ -254,19 +312,411 @@ async def safe_copy_file_to_channel(
             if content_type == "document":
                 kwargs["filename"] = file_name
         
-        # Add reply_markup if provided
+        # Add reply_markup / parse_mode if provided
         if reply_markup:
             kwargs["reply_markup"] = reply_markup
+        if parse_mode:
+            kwargs["parse_mode"] = parse_mode
                 
         return await method(**kwargs)
     
     try:
-        return await _send_with_retry(bot, send)
+        return await _send_with_retry(
+            bot, channel_id, send, method_map.get(content_type, content_type), raise_outages=raise_outages
+        )
     except ValueError as e:
         logger.warning(str(e))
         return None
 
 
+# --- Channel Workers ---
+
+# handler(bot, channel_id, events) sends a batch of queued events and returns
+# the indexes of the events an outage kept from being sent (they stay queued)
+EventHandler = Callable[[Bot, int, list[dict]], Awaitable[list[int]]]
+
+
+class ChannelWorker:
+    """
+    Durable queue and worker for one channel.
+    submit() only buffers the event; the worker persists buffered events to
+    the archive_queue table (one transaction per batch), then hands queued
+    rows to the handler in id order, batch_size at a time, and deletes the
+    events of each batch that were sent (or failed for good).
+    Events an outage kept from being sent stay queued, and the worker backs
+    off before trying them again; events whose handler crashed are retried
+    up to MAX_EVENT_ATTEMPTS times.
+    Events still queued at shutdown or a crash are sent after start().
+    """
+
+    def __init__(
+        self,
+        channel_id: int,
+        handler: EventHandler,
+        batch_size: int = 1,
+        high_water_mark: int = HIGH_WATER_MARK,
+        max_queued: int = MAX_QUEUED_EVENTS,
+    ):
+        self.channel_id = channel_id
+        self.handler = handler
+        self.batch_size = batch_size
+        self.high_water_mark = high_water_mark
+        self.max_queued = max_queued
+        self.bot: Optional[Bot] = None
+        self._incoming: list[tuple] = []  # (action, payload JSON, created_at) not yet persisted
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.depth = 0  # persisted + buffered events
+        self.oldest: Optional[str] = None  # created_at of the oldest queued event
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.deferred = 0  # events kept for a retry after an outage
+        self._outages = 0  # consecutive batches that hit an outage
+
+    def is_above_high_water(self) -> bool:
+        return self.depth >= self.high_water_mark
+
+    def submit(self, bot: Bot, event: dict, low_priority: bool = False) -> bool:
+        """Queue a JSON-serializable event. Returns False if it was shed."""
+        self.bot = bot
+        if self.depth >= self.max_queued or (low_priority and self.is_above_high_water()):
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(
+                    f"Channel {self.channel_id} queue at {self.depth} event(s), dropped {self.dropped} so far"
+                )
+            return False
+
+        created_at = datetime.now(timezone.utc).isoformat()
+        self._incoming.append((event["action"], json.dumps(event, ensure_ascii=False), created_at))
+        self.depth += 1
+        if self.oldest is None:
+            self.oldest = created_at
+        self._wakeup.set()
+        self._ensure_running()
+        return True
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self, bot: Bot):
+        """Resume sending events left over from the last run (call from post_init)."""
+        self.bot = bot
+        depth, oldest = await db.aio.get_archive_queue_depth(self.channel_id)
+        if depth:
+            self.depth += depth
+            self.oldest = oldest
+            logger.info(f"Channel {self.channel_id}: resuming {depth} queued event(s)")
+            self._ensure_running()
+
+    async def _persist(self) -> bool:
+        if not self._incoming:
+            return True
+        rows, self._incoming = self._incoming, []
+        try:
+            await db.aio.enqueue_archive_events(self.channel_id, rows)
+            return True
+        except Exception as e:
+            logger.error(f"Channel {self.channel_id}: failed to persist {len(rows)} event(s), will retry: {e}")
+            self._incoming[:0] = rows
+            return False
+
+    async def _run(self):
+        while True:
+            if not await self._persist():
+                await asyncio.sleep(1.0)
+                continue
+            rows = await db.aio.get_archive_events(self.channel_id, max(QUEUE_FETCH_SIZE, self.batch_size))
+            if not rows:
+                self._wakeup.clear()
+                if self._incoming:
+                    continue
+                self.oldest = None
+                await self._wakeup.wait()
+                continue
+
+            for i in range(0, len(rows), self.batch_size):
+                batch = rows[i:i + self.batch_size]
+                self.oldest = batch[0][3]
+                kept = await self._send_batch(batch)
+                # Keep new events durable while this batch is being sent
+                await self._persist()
+                if kept:
+                    # Later batches would fail the same way - wait, then start over
+                    self._outages += 1
+                    await asyncio.sleep(min(OUTAGE_BACKOFF_MAX, OUTAGE_BACKOFF_BASE * 2 ** (self._outages - 1)))
+                    break
+                self._outages = 0
+
+    async def _send_batch(self, batch: list[tuple]) -> bool:
+        """Send one batch and remove what is done from the queue. Returns True if events were kept."""
+        try:
+            kept = set(await self.handler(self.bot, self.channel_id, [json.loads(row[2]) for row in batch]))
+            crashed = []
+        except Exception as e:
+            # A bug or a malformed event - retry a few times, never let it stop the channel
+            logger.error(f"Channel {self.channel_id} worker failed on event(s) {batch[0][0]}-{batch[-1][0]}: {e}")
+            kept = set()
+            crashed = [row for row in batch if row[4] + 1 < MAX_EVENT_ATTEMPTS]
+            self.failed += len(batch) - len(crashed)
+
+        if kept:
+            self.deferred += len(kept)
+            logger.warning(f"Channel {self.channel_id} unreachable, keeping {len(kept)} event(s) queued")
+        keep_ids = {batch[index][0] for index in kept} | {row[0] for row in crashed}
+        done = [row[0] for row in batch if row[0] not in keep_ids]
+        if not crashed:
+            self.processed += len(batch) - len(kept)
+        if done:
+            await db.aio.delete_archive_events(done)
+            self.depth -= len(done)
+        if crashed:
+            await db.aio.bump_archive_event_attempts([row[0] for row in crashed])
+        return bool(keep_ids)
+
+    async def close(self):
+        """Stop the worker and persist buffered events; the rest is sent after restart."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._persist()
+
+    def stats(self) -> dict:
+        oldest_age = 0.0
+        if self.oldest:
+            oldest_age = (datetime.now(timezone.utc) - datetime.fromisoformat(self.oldest)).total_seconds()
+        return {
+            "depth": self.depth,
+            "oldest_age_seconds": round(max(oldest_age, 0.0), 1),
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "deferred": self.deferred,
+        }
+
+
+class ArchiveDigest:
+    """
+    Coalesces FILE_ARCHIVED events per (user, collection): the first upload
+    opens a digest, later ones within DIGEST_WINDOW join it, and one activity
+    log is queued per digest. A digest with a single item is logged as usual.
+    The channel queue therefore grows with active uploaders, not with uploads.
+    """
+
+    def __init__(self, worker: ChannelWorker, window: float = DIGEST_WINDOW, max_items: int = DIGEST_MAX_ITEMS):
+        self.worker = worker
+        self.window = window
+        self.max_items = max_items
+        self._digests: dict[tuple[int, int], dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.events = 0
+        self.emitted = 0
+
+    def add(self, bot: Bot, event: dict):
+        """
+        event: FILE_ARCHIVED fields (user, collection, item_id) plus its ready-made
+        single log, or item_ids instead of item_id for an album.
+        """
+        self.events += 1
+        key = (event["user_id"], event["collection_id"])
+        digest = self._digests.get(key)
+        now = datetime.now(timezone.utc)
+        if digest is None:
+            digest = self._digests[key] = {
+                "bot": bot,
+                "first": event,
+                "item_ids": [],
+                "first_at": now,
+                "opened": time.monotonic(),
+            }
+        digest["item_ids"].extend(event.get("item_ids") or [event["item_id"]])
+        digest["last_at"] = now
+
+        if len(digest["item_ids"]) >= self.max_items:
+            self._emit(key)
+        elif self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _emit(self, key: tuple[int, int]):
+        digest = self._digests.pop(key)
+        first = digest["first"]
+        if len(digest["item_ids"]) == 1:
+            self.worker.submit(digest["bot"], {
+                "action": "FILE_ARCHIVED", "text": first["text"], "reply_markup": first["reply_markup"]
+            })
+        else:
+            text = format_archive_digest(
+                first["user_id"], first["user_name"], first["username"],
+                first["collection_id"], first["collection_name"],
+                digest["item_ids"], digest["first_at"], digest["last_at"],
+                getattr(digest["bot"], "username", None)
+            )
+            self.worker.submit(digest["bot"], {"action": "FILE_ARCHIVED", "text": text, "parse_mode": "HTML"})
+        self.emitted += 1
+
+    async def _run(self):
+        # Runs while digests are open, then exits (restarted by the next add)
+        while self._digests:
+            await asyncio.sleep(self.window / 4)
+            cutoff = time.monotonic() - self.window
+            for key in [k for k, d in self._digests.items() if d["opened"] <= cutoff]:
+                self._emit(key)
+
+    def flush(self):
+        """Queue every open digest now (call on shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for key in list(self._digests):
+            self._emit(key)
+
+    def stats(self) -> dict:
+        return {"open": len(self._digests), "events": self.events, "emitted": self.emitted}
+
+
+async def _send_activity_events(bot: Bot, channel_id: int, events: list[dict]) -> list[int]:
+    for i, event in enumerate(events):
+        reply_markup = event.get("reply_markup")
+        try:
+            await safe_copy_file_to_channel(
+                bot=bot,
+                channel_id=channel_id,
+                file_id=None,
+                content_type="text",
+                caption=event["text"],
+                reply_markup=InlineKeyboardMarkup.de_json(reply_markup, bot) if reply_markup else None,
+                parse_mode=event.get("parse_mode"),
+                raise_outages=True
+            )
+        except Exception as e:
+            # Keep this log and everything after it, in order
+            logger.warning(f"Activity channel unreachable: {e}")
+            return list(range(i, len(events)))
+    return []
+
+
+async def _copy_to_archive_channel(bot: Bot, channel_id: int, events: list[dict]):
+    """
+    Back up a batch of files to one archive channel.
+    Files with an origin message go in bulk (one copy_messages call per run of
+    up to 100 from one chat); bulk copies keep the user's own caption, not the
+    archive metadata caption (archive_info still maps them to their items).
+    The rest, runs Telegram refuses and files whose original was deleted (see
+    delivery.copy_run) are sent one by one with the metadata caption. Message ids are saved in one batch.
+    An album is queued as one event whose "files" hold the per-file fields.
+
+    Files an outage kept from being backed up are reported back to the
+    worker (by event index) and stay queued. Files a retried event already
+    backed up (they are in archive_info) are skipped.
+    """
+    event_index = {}  # item_id -> index of its event
+    files = []
+    for index, event in enumerate(events):
+        for file in event.get("files", [event]):
+            event_index[file["item_id"]] = index
+            files.append(file)
+    done = await db.aio.get_archived_item_ids(channel_id, list(event_index))
+    files = [file for file in files if file["item_id"] not in done]
+
+    by_item = {file["item_id"]: file for file in files}
+    origins = {
+        file["item_id"]: (file["origin_chat_id"], file["origin_message_id"])
+        for file in files if file.get("origin_message_id")
+    }
+    runs, single = plan_copy_runs([(file["item_id"],) for file in files], origins)
+    archived: list[tuple[int, int, int]] = []  # (item_id, channel_id, message_id)
+    deferred: list[int] = []  # item ids kept for after the outage
+
+    for from_chat_id, run in runs:
+        if deferred:
+            deferred.extend(item_id for item_id, _ in run)
+            continue
+        try:
+            copied, missing = await copy_run(bot, channel_id, from_chat_id, run)
+        except Exception as e:
+            if is_outage(e):
+                logger.warning(f"Archive copy of {len(run)} file(s) to {channel_id} hit an outage: {e}")
+                deferred.extend(item_id for item_id, _ in run)
+                continue
+            logger.warning(f"Archive copy of {len(run)} file(s) to {channel_id} failed, sending one by one: {e}")
+            single.extend((item_id,) for item_id, _ in run)
+            continue
+        if missing:
+            logger.warning(
+                f"Archive copy to {channel_id}: {len(missing)} of {len(run)} file(s) could not be copied, "
+                f"sending them one by one"
+            )
+            single.extend((item_id,) for item_id in missing)
+        archived.extend((item_id, channel_id, message_id) for item_id, message_id in copied)
+
+    for (item_id,) in single:
+        if deferred:
+            deferred.append(item_id)
+            continue
+        file = by_item[item_id]
+        try:
+            message_id = await safe_copy_file_to_channel(
+                bot=bot,
+                channel_id=channel_id,
+                file_id=file["file_id"],
+                content_type=file["content_type"],
+                caption=file["caption"],
+                file_name=file["file_name"],
+                raise_outages=True
+            )
+        except Exception as e:
+            logger.warning(f"Archive copy of item {item_id} to {channel_id} hit an outage: {e}")
+            deferred.append(item_id)
+            continue
+        if message_id:
+            archived.append((item_id, channel_id, message_id))
+        else:
+            await log_activity(
+                bot, "ARCHIVE_FAILED", file["user_id"],
+                success=False,
+                collection_id=file["collection_id"],
+                item_id=item_id,
+                extra={"channel": channel_id}
+            )
+
+    if archived:
+        await db.aio.save_archive_info_batch(archived)
+    return sorted({event_index[item_id] for item_id in deferred})
+
+
+_activity_worker = ChannelWorker(ADMIN_ACTIVITY_CHANNEL, _send_activity_events)
+_archive_digest = ArchiveDigest(_activity_worker)
+_archive_workers = [
+    ChannelWorker(channel_id, _copy_to_archive_channel, batch_size=ARCHIVE_BATCH_SIZE)
+    for channel_id in ARCHIVE_CHANNELS
+]
+
+
+def get_archive_stats() -> dict:
+    stats = {"activity": _activity_worker.stats(), "digest": _archive_digest.stats()}
+    for worker in _archive_workers:
+        stats[f"archive {worker.channel_id}"] = worker.stats()
+    return stats
+
+
+async def start_archive_workers(bot: Bot):
+    """Send events queued before the last shutdown/crash (call from post_init)."""
+    for worker in (_activity_worker, *_archive_workers):
+        await worker.start(bot)
+
+
+async def close_archive_workers():
+    """Queue open digests, then stop the channel workers (call on shutdown)."""
+    _archive_digest.flush()
+    for worker in (_activity_worker, *_archive_workers):
+        await worker.close()
+
+
+# --- Public API ---
+
 async def log_activity(
     bot: Bot,
     action: ActionType,
@@ -281,83 +731,73 @@ async def log_activity(
     reply_markup: Optional[InlineKeyboardMarkup] = None
 ) -> None:
     """
-    Send activity log to admin channel.
+    Queue an activity log for the admin channel and return right away.
     This is fire-and-forget - failures are logged but don't propagate.
     """
     if not ENABLE_ARCHIVING:
         return
     
-    async with _archive_lock:
-        try:
-            log_text = format_activity_log(
-                action, user_id, success, 
-                collection_id, collection_name,
-                item_id, extra,
-                user_name, username
-            )
-            # Use unified send function with content_type="text"
-            await safe_copy_file_to_channel(
-                bot=bot,
-                channel_id=ADMIN_ACTIVITY_CHANNEL,
-                file_id=None,
-                content_type="text",
-                caption=log_text,
-                reply_markup=reply_markup
-            )
-            await asyncio.sleep(ACTIVITY_LOG_DELAY)
-        except Exception as e:
-            # Never let activity logging crash the main flow
-            logger.error(f"Activity log failed: {e}")
+    try:
+        # Formatted now so the timestamp is the event's, not the send's
+        log_text = format_activity_log(
+            action, user_id, success, 
+            collection_id, collection_name,
+            item_id, extra,
+            user_name, username
+        )
+        _activity_worker.submit(bot, {
+            "action": action,
+            "text": log_text,
+            "reply_markup": reply_markup.to_dict() if reply_markup else None,
+        }, low_priority=action in LOW_PRIORITY_ACTIONS)
+    except Exception as e:
+        # Never let activity logging crash the main flow
+        logger.error(f"Activity log failed: {e}")
 
-async def _do_archive_file(
-    bot: Bot,
-    item_id: int,
-    file_id: Optional[str],
-    content_type: str,
-    user_id: int,
-    collection_id: int,
-    collection_name: Optional[str] = None,
-    file_name: Optional[str] = None,
-    original_caption: Optional[str] = None,
-    user_name: str = "Unknown",
-    username: Optional[str] = None
-) -> bool:
-    """
-    Actually perform the archiving.
-    MODIFIED: Only logs activity with "View File" deep link button.
-    Does NOT send to archive channels anymore.
-    """
-    from telegram import InlineKeyboardMarkup, InlineKeyboardButton
-    
-    # Generate Deep Link URL
+
+def build_view_button(bot: Bot, item_id: int) -> Optional[InlineKeyboardMarkup]:
+    """Deep link button that opens the item in the bot (admins only)."""
     try:
-        bot_username = bot.username
-        deep_link = f"https://t.me/{bot_username}?start=view_{item_id}"
-        
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("👀 צפיה בקובץ (מנהלים בלבד)", url=deep_link)]
-        ])
+        deep_link = f"https://t.me/{bot.username}?start=view_{item_id}"
     except Exception as e:
         logger.error(f"Failed to generate deep link: {e}")
-        keyboard = None
-    
-    # Log activity with the button
-    await log_activity(
-        bot, "FILE_ARCHIVED", user_id,
-        success=True,
-        collection_id=collection_id,
-        collection_name=collection_name,
-        item_id=item_id,
-        user_name=user_name,
-        username=username,
-        reply_markup=keyboard
-    )
-    
-    return True
+        return None
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("👀 צפיה בקובץ (מנהלים בלבד)", url=deep_link)]
+    ])
 
 
-    
-    return success_count > 0
+def _build_backup_file(
+    item_id: int,
+    file_id: Optional[str],
+    content_type: str,
+    user_id: int,
+    collection_id: int,
+    file_name: Optional[str],
+    original_caption: Optional[str],
+    user_name: str,
+    username: Optional[str],
+    origin_chat_id: Optional[int],
+    origin_message_id: Optional[int]
+) -> dict:
+    """Fields the archive workers need to back up one file."""
+    return {
+        "action": "ARCHIVE_COPY",
+        "item_id": item_id,
+        "origin_chat_id": origin_chat_id,
+        "origin_message_id": origin_message_id,
+        "file_id": file_id,
+        "content_type": content_type,
+        "file_name": file_name,
+        "caption": format_archive_caption(
+            item_id, file_id, user_id,
+            original_caption=original_caption,
+            user_name=user_name,
+            username=username
+        ),
+        "user_id": user_id,
+        "collection_id": collection_id,
+    }
 
 
 async def archive_file_to_channels(
@@ -371,67 +811,131 @@ async def archive_file_to_channels(
     file_name: Optional[str] = None,
     original_caption: Optional[str] = None,
     user_name: str = "Unknown",
-    username: Optional[str] = None
+    username: Optional[str] = None,
+    origin_chat_id: Optional[int] = None,
+    origin_message_id: Optional[int] = None
 ) -> bool:
     """
-    Queue a file for logging to the activity channel (Archive channels disabled).
+    Queue a file for backup in both archive channels and for logging to the
+    activity channel, with a "View File" deep link button. In digest mode the
+    log joins the user's open digest for this collection (as it does whenever
+    the channel queue is above its high-water mark).
     Returns immediately after queueing.
     """
-    global _queue_processor_running
-    
     if not ENABLE_ARCHIVING:
         return True
     
-    # Use lock to prevent race condition when checking/setting processor status
-    async with _archive_lock:
-        # Add to queue
-        _archive_queue.append({
-            "item_id": item_id,
-            "file_id": file_id,
-            "content_type": content_type,
+    if ENABLE_CHANNEL_BACKUP:
+        backup = _build_backup_file(
+            item_id, file_id, content_type, user_id, collection_id,
+            file_name, original_caption, user_name, username,
+            origin_chat_id, origin_message_id
+        )
+        for worker in _archive_workers:
+            worker.submit(bot, backup)
+    
+    if not DIGEST_MODE and not _activity_worker.is_above_high_water():
+        await log_activity(
+            bot, "FILE_ARCHIVED", user_id,
+            success=True,
+            collection_id=collection_id,
+            collection_name=collection_name,
+            item_id=item_id,
+            user_name=user_name,
+            username=username,
+            reply_markup=build_view_button(bot, item_id)
+        )
+        return True
+    
+    try:
+        view_button = build_view_button(bot, item_id)
+        _archive_digest.add(bot, {
+            "action": "FILE_ARCHIVED",
+            "text": format_activity_log(
+                "FILE_ARCHIVED", user_id, True,
+                collection_id, collection_name,
+                item_id, None,
+                user_name, username
+            ),
+            "reply_markup": view_button.to_dict() if view_button else None,
             "user_id": user_id,
-            "collection_id": collection_id,
-            "collection_name": collection_name,
-            "file_name": file_name,
-            "original_caption": original_caption,
             "user_name": user_name,
             "username": username,
-            "bot": bot  # Store bot reference for queue processor
+            "collection_id": collection_id,
+            "collection_name": collection_name,
+            "item_id": item_id,
         })
-        
-        # Start queue processor if not already running
-        if not _queue_processor_running:
-            _queue_processor_running = True
-            asyncio.create_task(_process_archive_queue_safe())
-    
+    except Exception as e:
+        logger.error(f"Activity log failed: {e}")
     return True
 
 
-async def _process_archive_queue_safe():
+async def archive_album_to_channels(
+    bot: Bot,
+    files: list[dict],
+    user_id: int,
+    collection_id: int,
+    collection_name: Optional[str] = None,
+    user_name: str = "Unknown",
+    username: Optional[str] = None
+) -> bool:
     """
-    Wrapper for queue processing with proper cleanup on exit.
+    Queue a saved album as one unit: one backup event per archive channel and
+    one activity log (or one addition to the user's open digest).
+    files: dicts with item_id, file_id, content_type, file_name, original_caption,
+    origin_chat_id and origin_message_id.
+    Returns immediately after queueing.
     """
-    global _queue_processor_running
-    
+    if not ENABLE_ARCHIVING or not files:
+        return True
+
+    if ENABLE_CHANNEL_BACKUP:
+        backup = {
+            "action": "ARCHIVE_COPY",
+            "files": [
+                _build_backup_file(
+                    f["item_id"], f.get("file_id"), f["content_type"], user_id, collection_id,
+                    f.get("file_name"), f.get("original_caption"), user_name, username,
+                    f.get("origin_chat_id"), f.get("origin_message_id")
+                )
+                for f in files
+            ],
+        }
+        for worker in _archive_workers:
+            worker.submit(bot, backup)
+
+    item_ids = [f["item_id"] for f in files]
     try:
-        while True:
-            # Get next item under lock
-            async with _archive_lock:
-                if not _archive_queue:
-                    _queue_processor_running = False
-                    return
-                item = _archive_queue.popleft()
-            
-            bot = item.pop("bot")  # Extract bot from item
-            
-            try:
-                await _do_archive_file(bot=bot, **item)
-            except Exception as e:
-                logger.error(f"Error processing archive queue item: {e}")
-            
-            # Wait before processing next item
-            await asyncio.sleep(ARCHIVE_DELAY)
+        if not DIGEST_MODE and not _activity_worker.is_above_high_water():
+            now = datetime.now(timezone.utc)
+            _activity_worker.submit(bot, {
+                "action": "FILE_ARCHIVED",
+                "text": format_archive_digest(
+                    user_id, user_name, username, collection_id, collection_name,
+                    item_ids, now, now, getattr(bot, "username", None)
+                ),
+                "parse_mode": "HTML",
+            })
+            return True
+
+        # The single-file log is only used if the digest ends up with one item
+        view_button = build_view_button(bot, item_ids[0])
+        _archive_digest.add(bot, {
+            "action": "FILE_ARCHIVED",
+            "text": format_activity_log(
+                "FILE_ARCHIVED", user_id, True,
+                collection_id, collection_name,
+                item_ids[0], None,
+                user_name, username
+            ),
+            "reply_markup": view_button.to_dict() if view_button else None,
+            "user_id": user_id,
+            "user_name": user_name,
+            "username": username,
+            "collection_id": collection_id,
+            "collection_name": collection_name,
+            "item_ids": item_ids,
+        })
     except Exception as e:
-        logger.error(f"Queue processor crashed: {e}")
-        async with _archive_lock:
-            _queue_processor_running = False
+        logger.error(f"Activity log failed: {e}")
+    return True
@@ -0,0 +1,253 @@
+# backup.py
+"""
+Collection Backup Module
+
+Handles the text backup format used by export/import:
+
+    # COLLECTION EXPORT: <collection name>
+    # DATE: <export date>
+    # DO NOT EDIT THIS FILE
+
+    CONTENT_TYPE|FILE_ID|TEXT|FILENAME|SIZE
+
+"|" and newlines inside TEXT are escaped as <PIPE> and <NL>.
+Exports stream rows from a DB cursor into a spooled temp file (optionally
+gzip-compressed); imports are streamed line by line and inserted in
+large batches. Neither side holds the whole collection in memory, except
+for the upload itself: PTB reads a sent document fully into memory, which
+UPLOAD_SIZE_LIMIT bounds.
+"""
+
+import asyncio
+import gzip
+import io
+import logging
+import tempfile
+import time
+from datetime import datetime
+from typing import BinaryIO, Awaitable, Callable, Optional
+
+import db
+
+HEADER_PREFIX = "# COLLECTION EXPORT:"
+
+IMPORT_BATCH_SIZE = 1000  # rows per executemany / transaction
+EXPORT_FETCH_SIZE = 1000  # rows per cursor fetch
+EXPORT_MEMORY_BUDGET = 8 * 1024 * 1024  # bytes kept in RAM before the export spills to disk
+PROGRESS_INTERVAL = 3.0  # minimum seconds between progress callbacks
+DOWNLOAD_SIZE_LIMIT = 20 * 1024 * 1024  # largest file the Bot API lets a bot download
+UPLOAD_SIZE_LIMIT = 50 * 1024 * 1024  # largest file the Bot API lets a bot send
+MAX_DECOMPRESSED_SIZE = 20 * DOWNLOAD_SIZE_LIMIT  # bytes a gzip backup may inflate to
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# progress_callback(items_done, bytes_read, total_bytes)
+ProgressCallback = Callable[[int, int, int], Awaitable[None]]
+
+
+def format_backup_line(item: tuple) -> str:
+    """Format an item row (id, content_type, file_id, text_content, file_name, file_size, added_at)."""
+    c_type = item[1]
+    f_id = item[2]
+    text = item[3] or ""
+    text = text.replace("|", "<PIPE>")  # Escape pipe
+    text = text.replace("\n", "<NL>")  # Escape newline
+    f_name = item[4] or ""
+    f_size = str(item[5]) if item[5] else "0"
+    return f"{c_type}|{f_id}|{text}|{f_name}|{f_size}"
+
+
+def write_collection_export(collection_id: int, collection_name: str, compress: bool = False) -> tuple[BinaryIO, int]:
+    """
+    Write a full collection backup into a spooled temp file.
+    Rows are streamed from the DB cursor, so writing the export stays within
+    EXPORT_MEMORY_BUDGET no matter how big the collection is. Sending it does
+    not: PTB reads the whole file into memory for the upload, so check
+    export_size() against UPLOAD_SIZE_LIMIT first.
+    Blocking - run it in a worker thread.
+
+    Returns (file positioned at start, item_count). The caller closes the file.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_MEMORY_BUDGET)
+    out = gzip.GzipFile(fileobj=spool, mode="wb") if compress else spool
+    count = 0
+
+    try:
+        header = (
+            f"{HEADER_PREFIX} {collection_name}\n"
+            f"# DATE: {datetime.now()}\n"
+            "# DO NOT EDIT THIS FILE\n"
+            "\n"
+        )
+        out.write(header.encode("utf-8"))
+
+        for item in db.iter_collection_items(collection_id, EXPORT_FETCH_SIZE):
+            out.write((format_backup_line(item) + "\n").encode("utf-8"))
+            count += 1
+
+        if compress:
+            out.close()  # writes the gzip trailer, leaves the spool open
+    except Exception:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool, count
+
+
+def export_size(fileobj: BinaryIO) -> int:
+    """Size in bytes of a file from write_collection_export; leaves it at the start."""
+    fileobj.seek(0, io.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+def is_gzip_file(fileobj: BinaryIO) -> bool:
+    """Check the gzip magic bytes without moving the file position."""
+    pos = fileobj.tell()
+    magic = fileobj.read(2)
+    fileobj.seek(pos)
+    return magic == b"\x1f\x8b"
+
+
+class BackupTooLargeError(ValueError):
+    """A compressed backup inflates to more than MAX_DECOMPRESSED_SIZE bytes."""
+
+
+def decompress_to_tempfile(fileobj: BinaryIO, max_size: int = MAX_DECOMPRESSED_SIZE) -> BinaryIO:
+    """
+    Stream-decompress a gzip backup into a new temp file (positioned at start).
+    Raises BackupTooLargeError once the output passes max_size, so a gzip bomb
+    can't fill the disk.
+    """
+    out = tempfile.TemporaryFile()
+    written = 0
+    try:
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as gz:
+            while chunk := gz.read(DECOMPRESS_CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_size:
+                    raise BackupTooLargeError(f"Backup inflates to more than {max_size} bytes")
+                out.write(chunk)
+    except BaseException:
+        out.close()
+        raise
+    out.seek(0)
+    return out
+
+
+def parse_backup_header(line: str) -> Optional[str]:
+    """Return the collection name from a header line, or None if not a backup header."""
+    if not line.startswith(HEADER_PREFIX):
+        return None
+    return line[len(HEADER_PREFIX):].strip()
+
+
+def parse_backup_line(line: str) -> Optional[tuple]:
+    """
+    Parse one backup line into (content_type, file_id, text_content, file_name, file_size).
+    Returns None for comments, blank lines and malformed lines.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+
+    parts = line.split("|")
+    if len(parts) < 5:
+        return None
+
+    c_type = parts[0]
+    # Text items were exported with a "None" file id
+    f_id = parts[1] if parts[1] and parts[1] != "None" else None
+    text = parts[2].replace("<PIPE>", "|").replace("<NL>", "\n")
+    f_name = parts[3]
+
+    try:
+        f_size = int(parts[4])
+    except ValueError:
+        f_size = 0
+
+    return c_type, f_id, text or None, f_name or None, f_size
+
+
+def read_backup_batch(fileobj: BinaryIO, max_rows: int) -> tuple[list[tuple], int, int]:
+    """
+    Read and parse up to max_rows backup rows from the current position.
+    Blocking - run it in a worker thread.
+
+    Returns (rows, bytes_read, error_count); fewer than max_rows rows means
+    the end of the file was reached.
+    """
+    rows: list[tuple] = []
+    bytes_read = 0
+    errors = 0
+    while len(rows) < max_rows:
+        raw_line = fileobj.readline()
+        if not raw_line:
+            break
+        bytes_read += len(raw_line)
+        try:
+            row = parse_backup_line(raw_line.decode("utf-8"))
+        except UnicodeDecodeError:
+            errors += 1
+            continue
+        if row is not None:
+            rows.append(row)
+    return rows, bytes_read, errors
+
+
+async def import_backup_file(
+    fileobj: BinaryIO,
+    collection_id: int,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> tuple[int, int]:
+    """
+    Stream backup rows from an open binary file into a collection.
+    The file is read line by line from its current position, so the header
+    can be consumed by the caller first. Each batch is read and parsed in a
+    worker thread, so a big backup doesn't block the event loop.
+
+    Returns (imported_count, error_count).
+    """
+    start_pos = fileobj.tell()
+    fileobj.seek(0, io.SEEK_END)
+    total_bytes = fileobj.tell()
+    fileobj.seek(start_pos)
+
+    bytes_read = start_pos
+    imported = 0
+    errors = 0
+    last_progress = time.monotonic()
+
+    async def flush(batch: list[tuple]):
+        nonlocal imported, errors
+        try:
+            imported += await db.aio.add_items_bulk(collection_id, batch)
+        except Exception as e:
+            # Find the bad rows without losing the good ones
+            logger.warning(f"Bulk import batch failed, inserting rows one by one: {e}")
+            for row in batch:
+                try:
+                    imported += await db.aio.add_items_bulk(collection_id, [row])
+                except Exception:
+                    errors += 1
+
+    while True:
+        batch, batch_bytes, batch_errors = await asyncio.to_thread(
+            read_backup_batch, fileobj, IMPORT_BATCH_SIZE
+        )
+        bytes_read += batch_bytes
+        errors += batch_errors
+        if batch:
+            await flush(batch)
+        if len(batch) < IMPORT_BATCH_SIZE:
+            break
+
+        now = time.monotonic()
+        if progress_callback and now - last_progress >= PROGRESS_INTERVAL:
+            last_progress = now
+            await progress_callback(imported, bytes_read, total_bytes)
+
+    return imported, errors
@@ -0,0 +1,184 @@
+# batch_status.py
+"""
+Batch Status Module
+
+Keeps the "files added" status message of every active uploader up to date
+from one application-wide ticker instead of a loop per user/collection:
+1. Handlers bump a counter and mark the status dirty - no API call
+2. Every tick the ticker walks the dirty statuses and edits each message in
+   place with the current count (one call per status per tick at most)
+3. A fresh message is posted only when there is none yet, the old one is gone,
+   or it is buried under REPOST_AFTER_MESSAGES newer messages
+
+Status updates go through send_scheduler like every other send, so they are
+paced by the same global and per-chat budgets as the real work.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden
+
+from send_scheduler import send_scheduler
+
+TICK_INTERVAL = 2.0  # seconds between status refreshes
+MAX_UPDATES_PER_TICK = 20  # statuses refreshed per tick, the rest wait for the next one
+REPOST_AFTER_MESSAGES = 30  # re-post when this many newer messages bury the status
+
+logger = logging.getLogger(__name__)
+
+
+def format_batch_status(collection_name: str, count: int) -> str:
+    return f"✅ נוספו {count} קבצים לאוסף \"{collection_name}\""
+
+
+def build_batch_status_keyboard(collection_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("📊 מצב איסוף", callback_data=f"batch_status:{collection_id}"),
+            InlineKeyboardButton("🏠 חזרה לבית", callback_data="back_to_main")
+        ]
+    ])
+
+
+class BatchStatusTicker:
+    """
+    Single background task that refreshes all dirty batch statuses.
+    A status is the per-collection dict kept in user_data
+    (count, msg_id, last_sent_count, last_seen_msg_id); the ticker only keeps
+    a reference to it while it has something to show. The task is started
+    lazily on the first bump and stops once nothing is dirty.
+    """
+
+    def __init__(
+        self,
+        tick_interval: float = TICK_INTERVAL,
+        max_updates: int = MAX_UPDATES_PER_TICK,
+        repost_after: int = REPOST_AFTER_MESSAGES,
+    ):
+        self.tick_interval = tick_interval
+        self.max_updates = max_updates
+        self.repost_after = repost_after
+        # (chat_id, collection_id) -> (bot, collection_name, status), oldest first
+        self._dirty: dict = {}
+        self._task: Optional[asyncio.Task] = None
+        self.edits = 0
+        self.posts = 0
+        self.failed = 0
+
+    def bump(self, bot, chat_id: int, collection_id: int, collection_name: str, status: dict,
+             count: int = 1, message_id: Optional[int] = None):
+        """Count `count` new items for this status and schedule a refresh."""
+        status["count"] += count
+        if message_id:
+            status["last_seen_msg_id"] = max(status.get("last_seen_msg_id") or 0, message_id)
+
+        self._dirty[(chat_id, collection_id)] = (bot, collection_name, status)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    @staticmethod
+    def _is_dirty(status: dict) -> bool:
+        return status["count"] != status.get("last_sent_count", 0)
+
+    def _needs_repost(self, status: dict) -> bool:
+        msg_id = status.get("msg_id")
+        if not msg_id:
+            return True
+        return (status.get("last_seen_msg_id") or 0) - msg_id >= self.repost_after
+
+    async def _run(self):
+        while self._dirty:
+            await self.tick()
+            await asyncio.sleep(self.tick_interval)
+
+    async def tick(self):
+        """Refresh up to max_updates dirty statuses; the rest move to the next tick."""
+        keys = list(self._dirty)[:self.max_updates]
+        entries = [(key, self._dirty.pop(key)) for key in keys]
+        await asyncio.gather(*(self._refresh(key, *entry) for key, entry in entries))
+
+        for key, entry in entries:
+            # Re-queued at the back if it was bumped while we were refreshing
+            if self._is_dirty(entry[2]) and key not in self._dirty:
+                self._dirty[key] = entry
+
+    async def _refresh(self, key: tuple, bot, collection_name: str, status: dict):
+        chat_id, collection_id = key
+        count = status["count"]
+        text = format_batch_status(collection_name, count)
+        keyboard = build_batch_status_keyboard(collection_id)
+
+        try:
+            if not self._needs_repost(status):
+                try:
+                    await send_scheduler.send(
+                        chat_id,
+                        lambda: bot.edit_message_text(
+                            chat_id=chat_id, message_id=status["msg_id"], text=text, reply_markup=keyboard
+                        ),
+                        method="edit_message_text",
+                    )
+                    self.edits += 1
+                    status["last_sent_count"] = count
+                    return
+                except BadRequest as e:
+                    if "not modified" in str(e).lower():
+                        status["last_sent_count"] = count
+                        return
+                    # Message deleted or too old to edit - post a new one
+
+            old_msg_id = status.get("msg_id")
+            msg = await send_scheduler.send(
+                chat_id,
+                lambda: bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard),
+                method="send_message",
+            )
+            self.posts += 1
+            status["msg_id"] = msg.message_id
+            status["last_seen_msg_id"] = msg.message_id
+            status["last_sent_count"] = count
+
+            if old_msg_id:
+                try:
+                    await send_scheduler.send(
+                        chat_id,
+                        lambda: bot.delete_message(chat_id=chat_id, message_id=old_msg_id),
+                        max_retries=0,
+                        method="delete_message",
+                    )
+                except Exception:
+                    pass
+        except Exception as e:
+            self.failed += 1
+            # Don't retry a status we can't deliver on every tick
+            status["last_sent_count"] = count
+            if not isinstance(e, Forbidden):
+                logger.error(f"Error updating batch status for chat {chat_id}: {e}")
+
+    async def close(self):
+        """Stop the ticker; pending refreshes are dropped."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._dirty.clear()
+
+    def stats(self) -> dict:
+        return {
+            "dirty": len(self._dirty),
+            "edits": self.edits,
+            "posts": self.posts,
+            "failed": self.failed,
+        }
+
+
+# Shared ticker used by all upload handlers
+batch_status_ticker = BatchStatusTicker()
@@ -13,6 +13,13 @@ from telegram.request import HTTPXRequest
 from config import BOT_TOKEN
 from admin_panel import admin_panel, handle_admin_callback
 from utils import error_handler, UserActionFilter, logger
+from ingest import item_writer, album_aggregator
+from batch_status import batch_status_ticker
+from write_behind import user_tracker, access_log
+from retention import access_log_retention
+from send_scheduler import send_scheduler
+from send_jobs import send_jobs
+from archive_logger import start_archive_workers, close_archive_workers, get_archive_stats
 
 from handlers import (
     start, new_collection, list_collections, manage_collections, browse, 
@@ -30,7 +37,7 @@ from handlers import (
     handle_delete_collection_callback, handle_back_to_manage_callback,
     handle_exit_shared_collection_callback, handle_cancel_share_access_callback,
     handle_exit_delete_mode_callback, handle_import_collection_mode_callback,
-    handle_select_item_delete_col_callback,
+    handle_select_item_delete_col_callback, handle_cancel_send_job_callback,
     handle_message
 )
 
@@ -53,16 +60,68 @@ def setup_logging():
         handlers=[file_handler, console_handler]
     )
 
+async def on_startup(application):
+    """Start background jobs that live outside the handlers."""
+    access_log_retention.start()
+    # Activity logs queued before the last shutdown/crash are still in the DB
+    await start_archive_workers(application.bot)
+    # Send jobs cut short by the last shutdown/crash continue from their checkpoints
+    await send_jobs.resume_all(application.bot)
+
+async def on_stop(application):
+    """
+    Stop the background senders while the bot can still send (PTB runs
+    post_stop before bot.shutdown()). Unsent work stays in the DB and
+    continues after the next start.
+    """
+    await send_jobs.shutdown()
+    await album_aggregator.close()
+    await item_writer.close()
+    await batch_status_ticker.close()
+    await close_archive_workers()
+    logger.info("Send scheduler stats at shutdown: %s", send_scheduler.stats())
+    logger.info("Album stats at shutdown: %s", album_aggregator.stats())
+    logger.info("Batch status stats at shutdown: %s", batch_status_ticker.stats())
+    logger.info("Archive worker stats at shutdown: %s", get_archive_stats())
+
+async def on_shutdown(application):
+    """Flush the write-behind buffers and release the DB (after the bot is shut down)."""
+    await access_log_retention.stop()
+    await user_tracker.close()
+    await access_log.close()
+    logger.info("Write-behind stats at shutdown: users=%s access_log=%s", user_tracker.stats(), access_log.stats())
+    logger.info("DB pool stats at shutdown: %s", db.get_pool_stats())
+    logger.info("DB cache stats at shutdown: %s", db.get_cache_stats())
+    db.aio.shutdown()
+    db.close_pool()
+
 def main():
     setup_logging()
     
     # Initialize DB
     db.init_db()
     
+    # Warn early if a hot query lost its index
+    if not db.audit_query_plans():
+        logger.info("Query plan audit passed (%d hot queries)", len(db.HOT_QUERIES))
+    
     logger.info("Bot starting...")
 
     request = HTTPXRequest(connection_pool_size=8, read_timeout=60.0, write_timeout=60.0, connect_timeout=60.0, pool_timeout=60.0)
-    app = ApplicationBuilder().token(BOT_TOKEN).rate_limiter(AIORateLimiter()).request(request).build()
+    # AIORateLimiter is a ceiling at Telegram's published limits; send_scheduler
+    # paces bulk sends below it, so in practice it only holds back the handlers'
+    # direct replies. Retrying is the scheduler's job: with max_retries=0 a
+    # RetryAfter goes straight up to its retry loop instead of being retried twice.
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .rate_limiter(AIORateLimiter(max_retries=0))
+        .request(request)
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     # --- Error Handler ---
     app.add_error_handler(error_handler)
@@ -99,6 +158,7 @@ def main():
     app.add_handler(CallbackQueryHandler(handle_browse_group_or_select_all_callback, pattern="^(browse_group|browse_page_select_all):"))
     app.add_handler(CallbackQueryHandler(handle_page_file_send_choice_callback, pattern="^page_files_"))
     app.add_handler(CallbackQueryHandler(handle_collection_send_all_callback, pattern="^collection_send_all:"))
+    app.add_handler(CallbackQueryHandler(handle_cancel_send_job_callback, pattern="^cancel_send_job:"))
     app.add_handler(CallbackQueryHandler(handle_batch_status_callback, pattern="^batch_status:"))
 
     # Management
@@ -1,23 +1,149 @@
 # db.py
+import json
+import logging
 import sqlite3
-from datetime import datetime
+import asyncio
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty, Full
+from datetime import datetime, timedelta
 from contextlib import contextmanager
 from config import ADMIN_IDS
 
 DB_PATH = "bot_data.db"
 
+logger = logging.getLogger(__name__)
+
+# Connection pool settings
+POOL_SIZE = 8  # idle connections kept open for reuse
+BUSY_TIMEOUT_MS = 5000  # how long a writer waits for the lock before "database is locked"
+
+# Per-connection pragmas. journal_mode=WAL is persistent in the DB file,
+# the rest must be set on every new connection.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # safe with WAL, fsync only at checkpoints
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA cache_size = -16000",  # ~16 MB page cache
+    "PRAGMA mmap_size = 134217728",  # 128 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+)
+
+# Metadata cache settings (collection rows and share-code lookups)
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL = 60.0  # seconds; bounds staleness if an invalidation is ever missed
+
+# Content types with their own counter column in collection_stats
+STATS_CONTENT_TYPES = ("video", "photo", "document", "audio", "text")
+
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON")
+    """Open a new, fully configured connection (not pooled)."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived SQLite connections.
+
+    Connections are handed out one per transaction and returned afterwards.
+    When the pool is empty a new connection is opened (so nested transactions
+    never deadlock); when it is full, returned connections are closed.
+    """
+
+    def __init__(self, size: int = POOL_SIZE):
+        self.size = size
+        self._idle: Queue = Queue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._reused = 0
+        self._closed = 0
+        self._in_use = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._reused += 1
+                self._in_use += 1
+            return conn
+        except Empty:
+            conn = get_connection()
+            with self._lock:
+                self._created += 1
+                self._in_use += 1
+            return conn
+
+    def release(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._in_use -= 1
+        # Never hand out a connection with a dangling transaction
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except Full:
+            conn.close()
+            with self._lock:
+                self._closed += 1
+
+    def discard(self, conn: sqlite3.Connection):
+        """Drop a connection that may be in a broken state."""
+        with self._lock:
+            self._in_use -= 1
+            self._closed += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._closed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "in_use": self._in_use,
+                "created": self._created,
+                "reused": self._reused,
+                "closed": self._closed,
+            }
+
+
+_pool = ConnectionPool()
+
+
+def get_pool_stats() -> dict:
+    """Get connection pool statistics (idle/in-use/created/reused/closed)."""
+    return _pool.stats()
+
+
+def close_pool():
+    """Close all idle pooled connections (call on shutdown)."""
+    _pool.close_all()
+
+
 @contextmanager
 def db_transaction(commit=True):
     """
     Context manager for database transactions.
-    Automatically handles connection, commit/rollback, and cleanup.
+    Borrows a pooled connection, handles commit/rollback, and returns it.
     
     Args:
         commit: Whether to commit on success (default True)
@@ -26,17 +152,199 @@ def db_transaction(commit=True):
         with db_transaction() as (conn, cur):
             cur.execute("INSERT ...")
     """
-    conn = get_connection()
+    conn = _pool.acquire()
     cur = conn.cursor()
     try:
         yield conn, cur
         if commit:
             conn.commit()
-    except Exception:
-        conn.rollback()
+    except BaseException:
+        cur.close()
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            # Connection is unusable, don't put it back in the pool
+            _pool.discard(conn)
+            raise
+        _pool.release(conn)
         raise
-    finally:
-        conn.close()
+    cur.close()
+    _pool.release(conn)
+
+
+# --- Metadata cache ---
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL and hit/miss counters.
+    Values must be immutable (rows are tuples), they are shared by callers.
+
+    Every invalidation bumps `generation`. A reader captures it before its
+    query and passes it to put(), so a row read before a concurrent write
+    committed is not cached after that write's invalidation ran.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self.stale_puts = 0
+
+    def get(self, key, count_miss: bool = True):
+        """Return the cached value or _MISSING."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            if count_miss:
+                self.misses += 1
+            return _MISSING
+
+    def put(self, key, value, generation: int | None = None):
+        """Cache value, unless an invalidation ran since `generation` was read."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_puts += 1
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry for which predicate(key, value) is true."""
+        with self._lock:
+            self.generation += 1
+            for key in [k for k, (_, v) in self._data.items() if predicate(k, v)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "stale_puts": self.stale_puts}
+
+
+# collection_id -> (id, name, user_id)
+_collection_cache = LRUCache()
+# share_code -> (collection_id, name, owner_user_id), active codes only
+_share_code_cache = LRUCache()
+
+# Reads that db.aio answers straight from the cache, without a thread hop
+CACHED_LOOKUPS = {
+    "get_collection_by_id": _collection_cache,
+    "get_collection_by_share_code": _share_code_cache,
+}
+
+
+def invalidate_collection_cache(collection_id: int):
+    """Forget a collection's cached row and every share code that resolves to it."""
+    _collection_cache.invalidate(collection_id)
+    _share_code_cache.invalidate_where(lambda code, row: row[0] == collection_id)
+
+
+def invalidates_collection(func):
+    """
+    Decorator for writes that change a collection's row or its share codes.
+    The first argument must be the collection id; the cache is cleared after
+    the transaction has committed (or rolled back).
+    """
+    @functools.wraps(func)
+    def wrapper(collection_id, *args, **kwargs):
+        try:
+            return func(collection_id, *args, **kwargs)
+        finally:
+            invalidate_collection_cache(collection_id)
+    return wrapper
+
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters of the metadata caches."""
+    return {
+        "collections": _collection_cache.stats(),
+        "share_codes": _share_code_cache.stats(),
+    }
+
+
+# --- Async facade ---
+
+READ_WORKERS = 4
+
+# Functions that write. They run on a single dedicated writer thread so
+# SQLite never sees two writers at once (no "database is locked" waits).
+WRITE_FUNCTIONS = {
+    "init_db", "migrate_db",
+    "create_collection", "add_item", "add_items_batch", "add_items_bulk",
+    "delete_item_by_id", "delete_items_by_file_id", "delete_all_items_in_collection",
+    "delete_collection", "delete_item",
+    "transfer_collection_ownership", "clone_collection_for_user",
+    "upsert_user", "upsert_users_batch", "block_user",
+    "create_share_link", "revoke_share_code", "regenerate_share_code",
+    "log_share_access", "log_share_access_batch", "delete_access_log_rows",
+    "save_archive_info",
+    "create_send_job", "set_send_job_status_message", "checkpoint_send_job", "finish_send_job",
+    "enqueue_archive_events", "delete_archive_events", "bump_archive_event_attempts",
+    "save_archive_info_batch",
+}
+
+_read_executor = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="db-read")
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+
+class AsyncDB:
+    """
+    Async facade over this module, e.g. ``await db.aio.add_item(...)``.
+    Every call runs the synchronous function on a worker thread, so
+    handlers never block the event loop on SQLite.
+    """
+
+    def __getattr__(self, name: str):
+        func = globals().get(name)
+        if name.startswith("_") or not callable(func) or isinstance(func, type):
+            raise AttributeError(f"db has no function '{name}'")
+
+        executor = _write_executor if name in WRITE_FUNCTIONS else _read_executor
+        cache = CACHED_LOOKUPS.get(name)
+
+        @functools.wraps(func)
+        async def call(*args, **kwargs):
+            if cache is not None and len(args) == 1 and not kwargs:
+                # The miss is counted by the function itself on the worker thread
+                value = cache.get(args[0], count_miss=False)
+                if value is not _MISSING:
+                    return value
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+        return call
+
+    def shutdown(self):
+        """Wait for queued queries to finish and stop the worker threads."""
+        _write_executor.shutdown(wait=True)
+        _read_executor.shutdown(wait=True)
+
+
+aio = AsyncDB()
 
 
 def migrate_db():
@@ -69,6 +377,37 @@ def migrate_db():
         conn.commit()
         print("Migration complete. Added blocked column to users table.")
     
+    # Check if origin message columns exist in items table
+    cur.execute("PRAGMA table_info(items)")
+    item_columns = [info[1] for info in cur.fetchall()]
+    
+    if "origin_message_id" not in item_columns:
+        print("Migrating database: Adding origin message columns to items...")
+        cur.execute("ALTER TABLE items ADD COLUMN origin_chat_id INTEGER")
+        cur.execute("ALTER TABLE items ADD COLUMN origin_message_id INTEGER")
+        conn.commit()
+        print("Migration complete. Added origin message columns to items table.")
+    
+    # Check if compact column exists in send_jobs table
+    cur.execute("PRAGMA table_info(send_jobs)")
+    send_job_columns = [info[1] for info in cur.fetchall()]
+    
+    if "compact" not in send_job_columns:
+        print("Migrating database: Adding compact column to send_jobs...")
+        cur.execute("ALTER TABLE send_jobs ADD COLUMN compact INTEGER NOT NULL DEFAULT 0")
+        conn.commit()
+        print("Migration complete. Added compact column to send_jobs table.")
+    
+    # Check if attempts column exists in archive_queue table
+    cur.execute("PRAGMA table_info(archive_queue)")
+    queue_columns = [info[1] for info in cur.fetchall()]
+    
+    if "attempts" not in queue_columns:
+        print("Migrating database: Adding attempts column to archive_queue...")
+        cur.execute("ALTER TABLE archive_queue ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        conn.commit()
+        print("Migration complete. Added attempts column to archive_queue table.")
+    
     conn.close()
 
 
@@ -95,6 +434,8 @@ def init_db():
         file_name TEXT,
         file_size INTEGER,
         added_at TEXT NOT NULL,
+        origin_chat_id INTEGER,  -- the user's original message, used for bulk copy delivery
+        origin_message_id INTEGER,
         FOREIGN KEY (collection_id) REFERENCES collections(id)
     )
     """)
@@ -143,12 +484,50 @@ def init_db():
     )
     """)
     
+    # Background send jobs and their checkpoints (see send_jobs.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS send_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        collection_id INTEGER NOT NULL,
+        collection_name TEXT NOT NULL,
+        item_ids TEXT,  -- JSON list for page sends, NULL = whole collection
+        compact INTEGER NOT NULL DEFAULT 0,  -- pack text items (see delivery.py)
+        total INTEGER NOT NULL,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed_item_ids TEXT NOT NULL DEFAULT '[]',  -- JSON list, retried on resume
+        last_item_id INTEGER NOT NULL DEFAULT 0,  -- every item up to here was attempted
+        status_message_id INTEGER,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        FOREIGN KEY (collection_id) REFERENCES collections(id) ON DELETE CASCADE
+    )
+    """)
+    
+    # Durable queue of archive/activity channel events (see archive_logger.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS archive_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel_id INTEGER NOT NULL,
+        action TEXT NOT NULL,
+        payload TEXT NOT NULL,  -- JSON event, sent in id order
+        created_at TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0  -- failed sends that were not outages
+    )
+    """)
+    
+    create_collection_stats(cur)
+    create_share_access_rollups(cur)
+    
     # Add indices for better performance
     cur.execute("CREATE INDEX IF NOT EXISTS idx_items_collection ON items(collection_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_items_file_id ON items(file_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_collections_user ON collections(user_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_shared_collections_code ON shared_collections(share_code)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_archive_info_item ON archive_info(item_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_archive_queue_channel ON archive_queue(channel_id, id)")
+    apply_index_migrations(cur)
     
     conn.commit()
     conn.close()
@@ -157,6 +536,256 @@ def init_db():
     migrate_db()
 
 
+def _stats_delta_sql(row: str, sign: str) -> str:
+    """SET clause adding (sign="+") or removing (sign="-") one items row from its collection's stats."""
+    type_columns = "".join(
+        f"{t}_count = {t}_count {sign} ({row}.content_type = '{t}'),\n            "
+        for t in STATS_CONTENT_TYPES
+    )
+    return (
+        f"item_count = item_count {sign} 1,\n            "
+        f"{type_columns}"
+        f"total_size = total_size {sign} COALESCE({row}.file_size, 0)"
+    )
+
+
+def create_collection_stats(cur):
+    """
+    Create the collection_stats table and the triggers that keep it in sync
+    with items, so counts are a single-row lookup instead of a COUNT(*) scan.
+    Existing items are backfilled the first time the table is created.
+    """
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'collection_stats'")
+    needs_backfill = cur.fetchone() is None
+
+    type_columns = "".join(f"{t}_count INTEGER NOT NULL DEFAULT 0,\n        " for t in STATS_CONTENT_TYPES)
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS collection_stats (
+        collection_id INTEGER PRIMARY KEY,
+        item_count INTEGER NOT NULL DEFAULT 0,
+        {type_columns}total_size INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (collection_id) REFERENCES collections(id) ON DELETE CASCADE
+    )
+    """)
+
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_collections_stats_insert
+    AFTER INSERT ON collections
+    BEGIN
+        INSERT OR IGNORE INTO collection_stats (collection_id) VALUES (NEW.id);
+    END
+    """)
+
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_items_stats_insert
+    AFTER INSERT ON items
+    BEGIN
+        INSERT OR IGNORE INTO collection_stats (collection_id) VALUES (NEW.collection_id);
+        UPDATE collection_stats SET
+            {_stats_delta_sql("NEW", "+")}
+        WHERE collection_id = NEW.collection_id;
+    END
+    """)
+
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_items_stats_delete
+    AFTER DELETE ON items
+    BEGIN
+        UPDATE collection_stats SET
+            {_stats_delta_sql("OLD", "-")}
+        WHERE collection_id = OLD.collection_id;
+    END
+    """)
+
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_items_stats_update
+    AFTER UPDATE OF collection_id, content_type, file_size ON items
+    BEGIN
+        UPDATE collection_stats SET
+            {_stats_delta_sql("OLD", "-")}
+        WHERE collection_id = OLD.collection_id;
+        INSERT OR IGNORE INTO collection_stats (collection_id) VALUES (NEW.collection_id);
+        UPDATE collection_stats SET
+            {_stats_delta_sql("NEW", "+")}
+        WHERE collection_id = NEW.collection_id;
+    END
+    """)
+
+    if needs_backfill:
+        type_sums = "".join(f"COALESCE(SUM(i.content_type = '{t}'), 0), " for t in STATS_CONTENT_TYPES)
+        cur.execute(f"""
+            INSERT OR REPLACE INTO collection_stats
+            SELECT c.id, COUNT(i.id), {type_sums}COALESCE(SUM(i.file_size), 0)
+            FROM collections c
+            LEFT JOIN items i ON i.collection_id = c.id
+            GROUP BY c.id
+        """)
+
+
+def create_share_access_rollups(cur):
+    """
+    Create the share access rollup tables and the trigger that feeds them
+    from shared_collection_access_log, so share stats and the admin
+    dashboard read a few rows instead of aggregating the whole log.
+    Rollups are lifetime totals: pruning old log rows does not change them.
+    Existing log rows are backfilled the first time the tables are created.
+    """
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'share_access_stats'")
+    needs_backfill = cur.fetchone() is None
+
+    # Per share: totals and last access
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS share_access_stats (
+        share_code TEXT PRIMARY KEY,
+        total_accesses INTEGER NOT NULL DEFAULT 0,
+        unique_users INTEGER NOT NULL DEFAULT 0,
+        last_access TEXT
+    )
+    """)
+
+    # Per share and day (YYYY-MM-DD): access counts
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS share_access_daily (
+        share_code TEXT NOT NULL,
+        day TEXT NOT NULL,
+        accesses INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (share_code, day)
+    )
+    """)
+
+    # Per share and user: drives unique_users and the "who viewed" lists
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS share_access_users (
+        share_code TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        first_access TEXT NOT NULL,
+        last_access TEXT NOT NULL,
+        accesses INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (share_code, user_id)
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_share_access_users_last ON share_access_users(share_code, last_access)")
+
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_access_log_rollup
+    AFTER INSERT ON shared_collection_access_log
+    BEGIN
+        INSERT INTO share_access_stats (share_code, total_accesses, unique_users, last_access)
+        VALUES (NEW.share_code, 1, 1, NEW.accessed_at)
+        ON CONFLICT(share_code) DO UPDATE SET
+            total_accesses = total_accesses + 1,
+            unique_users = unique_users + NOT EXISTS (
+                SELECT 1 FROM share_access_users
+                WHERE share_code = NEW.share_code AND user_id = NEW.user_id
+            ),
+            last_access = MAX(COALESCE(last_access, ''), excluded.last_access);
+
+        INSERT INTO share_access_users (share_code, user_id, first_access, last_access, accesses)
+        VALUES (NEW.share_code, NEW.user_id, NEW.accessed_at, NEW.accessed_at, 1)
+        ON CONFLICT(share_code, user_id) DO UPDATE SET
+            accesses = accesses + 1,
+            last_access = MAX(last_access, excluded.last_access);
+
+        INSERT INTO share_access_daily (share_code, day, accesses)
+        VALUES (NEW.share_code, substr(NEW.accessed_at, 1, 10), 1)
+        ON CONFLICT(share_code, day) DO UPDATE SET accesses = accesses + 1;
+    END
+    """)
+
+    # A deleted share takes its rollups with it
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_shared_collections_rollup_delete
+    AFTER DELETE ON shared_collections
+    BEGIN
+        DELETE FROM share_access_stats WHERE share_code = OLD.share_code;
+        DELETE FROM share_access_daily WHERE share_code = OLD.share_code;
+        DELETE FROM share_access_users WHERE share_code = OLD.share_code;
+    END
+    """)
+
+    if needs_backfill:
+        cur.execute("""
+            INSERT INTO share_access_users (share_code, user_id, first_access, last_access, accesses)
+            SELECT share_code, user_id, MIN(accessed_at), MAX(accessed_at), COUNT(*)
+            FROM shared_collection_access_log
+            GROUP BY share_code, user_id
+        """)
+        cur.execute("""
+            INSERT INTO share_access_stats (share_code, total_accesses, unique_users, last_access)
+            SELECT share_code, SUM(accesses), COUNT(*), MAX(last_access)
+            FROM share_access_users
+            GROUP BY share_code
+        """)
+        cur.execute("""
+            INSERT INTO share_access_daily (share_code, day, accesses)
+            SELECT share_code, substr(accessed_at, 1, 10), COUNT(*)
+            FROM shared_collection_access_log
+            GROUP BY share_code, substr(accessed_at, 1, 10)
+        """)
+
+
+# --- Versioned index migrations ---
+# Each entry is one schema version (PRAGMA user_version); append, never edit.
+INDEX_MIGRATIONS = [
+    # 1: composite indexes for the hot item / share queries
+    [
+        # is_duplicate_file and delete_item (prefix collection_id, file_id)
+        "CREATE INDEX IF NOT EXISTS idx_items_collection_file ON items(collection_id, file_id, file_size)",
+        # get_share_stats / get_detailed_access_log: seek by code, read in time order
+        "CREATE INDEX IF NOT EXISTS idx_access_log_code_time ON shared_collection_access_log(share_code, accessed_at)",
+        # time-range scans over the whole log (cleanup, admin reports)
+        "CREATE INDEX IF NOT EXISTS idx_access_log_time ON shared_collection_access_log(accessed_at)",
+        # active share of a collection
+        "CREATE INDEX IF NOT EXISTS idx_shared_collections_active ON shared_collections(collection_id, is_active)",
+    ],
+]
+
+
+def apply_index_migrations(cur):
+    """Apply INDEX_MIGRATIONS newer than the database's user_version."""
+    cur.execute("PRAGMA user_version")
+    current = cur.fetchone()[0]
+
+    for version, statements in enumerate(INDEX_MIGRATIONS, start=1):
+        if version <= current:
+            continue
+        for statement in statements:
+            cur.execute(statement)
+        # PRAGMA does not accept bound parameters
+        cur.execute(f"PRAGMA user_version = {int(version)}")
+        logger.info(f"Applied index migration v{version}")
+
+
+# --- Query plan audit ---
+# Hot queries are registered here so their plans can be checked at startup.
+HOT_QUERIES: dict[str, str] = {}
+
+
+def hot_query(name: str, sql: str) -> str:
+    """Register a hot query for audit_query_plans() and return its SQL."""
+    HOT_QUERIES[name] = sql
+    return sql
+
+
+def audit_query_plans() -> list[str]:
+    """
+    Run EXPLAIN QUERY PLAN on every registered hot query and warn about
+    full scans and temp B-tree sorts. Returns the warnings.
+    """
+    warnings = []
+    with db_transaction(commit=False) as (conn, cur):
+        for name, sql in HOT_QUERIES.items():
+            # Plans don't depend on the bound values
+            cur.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * sql.count("?"))
+            for row in cur.fetchall():
+                detail = row[-1]
+                if detail.startswith("SCAN") or "USE TEMP B-TREE" in detail:
+                    warning = f"Query plan for '{name}': {detail}"
+                    logger.warning(warning)
+                    warnings.append(warning)
+    return warnings
+
+
 def create_collection(name: str, user_id: int) -> int:
     with db_transaction() as (conn, cur):
         cur.execute("INSERT INTO collections (name, user_id) VALUES (?, ?)", (name, user_id))
@@ -171,10 +800,17 @@ def get_collections(user_id: int) -> list:
 
 
 def get_collection_by_id(collection_id: int) -> tuple | None:
-    """Get collection details including user_id."""
+    """Get collection details including user_id (cached)."""
+    row = _collection_cache.get(collection_id)
+    if row is not _MISSING:
+        return row
+    generation = _collection_cache.generation
     with db_transaction(commit=False) as (conn, cur):
         cur.execute("SELECT id, name, user_id FROM collections WHERE id = ?", (collection_id,))
-        return cur.fetchone()
+        row = cur.fetchone()
+    if row:
+        _collection_cache.put(collection_id, row, generation)
+    return row
 
 
 def add_item(
@@ -197,6 +833,89 @@ def add_item(
         return cur.lastrowid
 
 
+def add_items_batch(rows: list[tuple]) -> list[int]:
+    """
+    Insert many items in a single transaction (one commit for the whole batch).
+
+    Args:
+        rows: (collection_id, content_type, file_id, text_content, file_name, file_size, added_at,
+               origin_chat_id, origin_message_id) tuples
+
+    Returns:
+        The new item ids, in the same order as rows
+    """
+    with db_transaction() as (conn, cur):
+        item_ids = []
+        for row in rows:
+            cur.execute(
+                """
+                INSERT INTO items (collection_id, content_type, file_id, text_content, file_name, file_size, added_at,
+                                   origin_chat_id, origin_message_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                row
+            )
+            item_ids.append(cur.lastrowid)
+        return item_ids
+
+
+def add_items_bulk(collection_id: int, rows: list[tuple]) -> int:
+    """
+    Bulk insert items into one collection with executemany, in one transaction.
+    Used by imports, where item ids are not needed.
+
+    Args:
+        collection_id: Target collection
+        rows: (content_type, file_id, text_content, file_name, file_size) tuples
+
+    Returns:
+        Number of inserted items
+    """
+    added_at = datetime.now().isoformat()
+    with db_transaction() as (conn, cur):
+        cur.executemany(
+            """
+            INSERT INTO items (collection_id, content_type, file_id, text_content, file_name, file_size, added_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(collection_id, *row, added_at) for row in rows]
+        )
+        return len(rows)
+
+
+def get_item_origins(item_ids: list[int]) -> dict[int, tuple[int, int]]:
+    """
+    Original message references of the given items: {item_id: (chat_id, message_id)}.
+    Items saved before references were recorded (or imported ones) are missing.
+    """
+    if not item_ids:
+        return {}
+    placeholders = ",".join("?" * len(item_ids))
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(
+            f"""
+            SELECT id, origin_chat_id, origin_message_id
+            FROM items
+            WHERE id IN ({placeholders}) AND origin_message_id IS NOT NULL
+            """,
+            item_ids
+        )
+        return {item_id: (chat_id, message_id) for item_id, chat_id, message_id in cur.fetchall()}
+
+
+DUPLICATE_FILE_SQL = hot_query("duplicate_file", """
+    SELECT 1 FROM items
+    WHERE collection_id = ? AND file_id = ? AND file_size = ?
+    LIMIT 1
+""")
+
+DUPLICATE_FILE_NO_SIZE_SQL = hot_query("duplicate_file_no_size", """
+    SELECT 1 FROM items
+    WHERE collection_id = ? AND file_id = ? AND file_size IS NULL
+    LIMIT 1
+""")
+
+
 def is_duplicate_file(collection_id: int, file_id: str, file_size: int | None) -> bool:
     """
     Check if a file with the same file_id and file_size already exists in the collection.
@@ -212,19 +931,10 @@ def is_duplicate_file(collection_id: int, file_id: str, file_size: int | None) -
     with db_transaction(commit=False) as (conn, cur):
         # If file_size is None, only check file_id
         if file_size is None:
-            cur.execute(
-                """SELECT COUNT(*) FROM items 
-                   WHERE collection_id = ? AND file_id = ? AND file_size IS NULL""",
-                (collection_id, file_id)
-            )
+            cur.execute(DUPLICATE_FILE_NO_SIZE_SQL, (collection_id, file_id))
         else:
-            cur.execute(
-                """SELECT COUNT(*) FROM items 
-                   WHERE collection_id = ? AND file_id = ? AND file_size = ?""",
-                (collection_id, file_id, file_size)
-            )
-        count = cur.fetchone()[0]
-        return count > 0
+            cur.execute(DUPLICATE_FILE_SQL, (collection_id, file_id, file_size))
+        return cur.fetchone() is not None
 
 
 def get_items_by_collection(collection_id: int, offset: int = 0, limit: int = 10) -> list:
@@ -242,6 +952,108 @@ def get_items_by_collection(collection_id: int, offset: int = 0, limit: int = 10
         return cur.fetchall()
 
 
+def iter_collection_items(collection_id: int, fetch_size: int = 1000):
+    """
+    Stream all items of a collection in id order from a single cursor,
+    fetch_size rows at a time. Blocking - run it in a worker thread.
+    The pooled connection is held until the generator is exhausted or closed.
+    """
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(
+            """
+            SELECT id, content_type, file_id, text_content, file_name, file_size, added_at
+            FROM items
+            WHERE collection_id = ?
+            ORDER BY id
+            """,
+            (collection_id,)
+        )
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+ITEMS_AFTER_ID_SQL = hot_query("items_after_id", """
+    SELECT id, content_type, file_id, text_content, file_name, file_size, added_at
+    FROM items
+    WHERE collection_id = ? AND id > ?
+    ORDER BY id
+    LIMIT ?
+""")
+
+
+def get_items_after_id(collection_id: int, after_id: int = 0, limit: int = 10) -> list:
+    """
+    Keyset page: the next `limit` items with id > after_id, in id order.
+    Cost depends only on `limit`, not on how deep into the collection we are.
+    """
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(ITEMS_AFTER_ID_SQL, (collection_id, after_id, limit))
+        return cur.fetchall()
+
+
+ITEMS_BEFORE_ID_SQL = hot_query("items_before_id", """
+    SELECT id, content_type, file_id, text_content, file_name, file_size, added_at
+    FROM items
+    WHERE collection_id = ? AND id < ?
+    ORDER BY id DESC
+    LIMIT ?
+""")
+
+
+def get_items_before_id(collection_id: int, before_id: int, limit: int = 10) -> list:
+    """
+    Keyset page backwards: the `limit` items with id < before_id.
+    Returned in ascending id order, like get_items_after_id.
+    """
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(ITEMS_BEFORE_ID_SQL, (collection_id, before_id, limit))
+        return cur.fetchall()[::-1]
+
+
+PAGE_ANCHOR_SQL = hot_query("page_anchor", """
+    SELECT id FROM items
+    WHERE collection_id = ?
+    ORDER BY id
+    LIMIT 1 OFFSET ?
+""")
+
+
+def get_page_anchor_id(collection_id: int, page: int, block_size: int = 100) -> int:
+    """
+    Get the anchor for jumping straight to page N: the id of the last item
+    before that page (0 for the first page). Pass it to get_items_after_id.
+    Only walks the (collection_id, id) index, never the item rows.
+    """
+    if page <= 1:
+        return 0
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(PAGE_ANCHOR_SQL, (collection_id, (page - 1) * block_size - 1))
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+
+PREVIOUS_PAGE_ANCHOR_SQL = hot_query("previous_page_anchor", """
+    SELECT id FROM items
+    WHERE collection_id = ? AND id < ?
+    ORDER BY id DESC
+    LIMIT 1 OFFSET ?
+""")
+
+
+def get_previous_page_anchor_id(collection_id: int, first_id: int, block_size: int = 100) -> int:
+    """
+    Get the anchor of the page that ends right before `first_id`.
+    Seeks backwards from first_id, so it costs one page worth of index entries.
+    """
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(PREVIOUS_PAGE_ANCHOR_SQL, (collection_id, first_id, block_size))
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+
 def get_item_by_id(item_id: int) -> tuple | None:
     """Get a single item by its ID."""
     with db_transaction(commit=False) as (conn, cur):
@@ -256,14 +1068,36 @@ def get_item_by_id(item_id: int) -> tuple | None:
         return cur.fetchone()
 
 
+COLLECTION_ITEM_COUNT_SQL = hot_query(
+    "collection_item_count",
+    "SELECT item_count FROM collection_stats WHERE collection_id = ?"
+)
+
+
 def count_items_in_collection(collection_id: int) -> int:
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(COLLECTION_ITEM_COUNT_SQL, (collection_id,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+
+def get_collection_stats(collection_id: int) -> dict:
+    """
+    Get the trigger-maintained counters of a collection.
+    Returns {"items", "video", "photo", "document", "audio", "text", "total_size"}.
+    """
+    columns = ", ".join(f"{t}_count" for t in STATS_CONTENT_TYPES)
     with db_transaction(commit=False) as (conn, cur):
         cur.execute(
-            "SELECT COUNT(*) FROM items WHERE collection_id = ?",
+            f"SELECT item_count, {columns}, total_size FROM collection_stats WHERE collection_id = ?",
             (collection_id,)
         )
-        (count,) = cur.fetchone()
-        return count
+        row = cur.fetchone() or (0,) * (len(STATS_CONTENT_TYPES) + 2)
+
+    stats = {"items": row[0]}
+    stats.update(zip(STATS_CONTENT_TYPES, row[1:-1]))
+    stats["total_size"] = row[-1]
+    return stats
 
 
 def delete_item_by_id(item_id: int, user_id: int) -> int:
@@ -304,6 +1138,7 @@ def delete_all_items_in_collection(collection_id: int) -> int:
         return cur.rowcount
 
 
+@invalidates_collection
 def delete_collection(collection_id: int) -> bool:
     """Delete a collection (after deleting all its items)"""
     import logging
@@ -347,11 +1182,17 @@ def delete_collection(collection_id: int) -> bool:
             raise
 
 
+DELETE_ITEM_SQL = hot_query(
+    "delete_item",
+    "DELETE FROM items WHERE collection_id = ? AND file_id = ?"
+)
+
+
 def delete_item(collection_id: int, file_id: str) -> bool:
     """Delete a specific item from a collection by file_id"""
     with db_transaction() as (conn, cur):
         try:
-            cur.execute("DELETE FROM items WHERE collection_id = ? AND file_id = ?", (collection_id, file_id))
+            cur.execute(DELETE_ITEM_SQL, (collection_id, file_id))
             return cur.rowcount > 0
         except Exception:
             return False
@@ -392,6 +1233,7 @@ def get_all_users_with_collections() -> list:
         return [row[0] for row in cur.fetchall()]
 
 
+@invalidates_collection
 def transfer_collection_ownership(collection_id: int, new_user_id: int) -> bool:
     """Transfer a collection to another user."""
     with db_transaction() as (conn, cur):
@@ -429,8 +1271,10 @@ def clone_collection_for_user(source_collection_id: int, target_user_id: int) ->
             # Copy all items from source collection to new collection
             cur.execute(
                 """
-                INSERT INTO items (collection_id, content_type, file_id, text_content, file_name, file_size, added_at)
-                SELECT ?, content_type, file_id, text_content, file_name, file_size, added_at
+                INSERT INTO items (collection_id, content_type, file_id, text_content, file_name, file_size, added_at,
+                                   origin_chat_id, origin_message_id)
+                SELECT ?, content_type, file_id, text_content, file_name, file_size, added_at,
+                       origin_chat_id, origin_message_id
                 FROM items
                 WHERE collection_id = ?
                 """,
@@ -447,7 +1291,7 @@ def get_global_stats() -> dict:
         cur.execute("SELECT COUNT(*) FROM collections")
         total_collections = cur.fetchone()[0]
         
-        cur.execute("SELECT COUNT(*) FROM items")
+        cur.execute("SELECT COALESCE(SUM(item_count), 0) FROM collection_stats")
         total_items = cur.fetchone()[0]
         
         cur.execute("SELECT COUNT(DISTINCT user_id) FROM collections")
@@ -483,6 +1327,26 @@ def upsert_user(user_id: int, username: str | None, first_name: str | None, last
             """, (user_id, username, first_name, last_name, first_seen))
 
 
+def upsert_users_batch(rows: list[tuple]):
+    """
+    Insert or update many users in one transaction.
+    rows: (user_id, username, first_name, last_name, first_seen);
+    first_seen is only used for new users.
+    """
+    with db_transaction() as (conn, cur):
+        cur.executemany("""
+            INSERT INTO users (user_id, username, first_name, last_name, first_seen)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name
+            WHERE users.username IS NOT excluded.username
+               OR users.first_name IS NOT excluded.first_name
+               OR users.last_name IS NOT excluded.last_name
+        """, rows)
+
+
 def get_user(user_id: int):
     """Get user information including blocked status."""
     with db_transaction(commit=False) as (conn, cur):
@@ -583,6 +1447,7 @@ def generate_share_code() -> str:
         raise Exception("Failed to generate unique share code after maximum attempts")
 
 
+@invalidates_collection
 def create_share_link(collection_id: int, user_id: int) -> str:
     """
     Create a share code for a collection.
@@ -612,22 +1477,34 @@ def create_share_link(collection_id: int, user_id: int) -> str:
         return share_code
 
 
+COLLECTION_BY_SHARE_CODE_SQL = hot_query("collection_by_share_code", """
+    SELECT c.id, c.name, c.user_id
+    FROM collections c
+    JOIN shared_collections sc ON c.id = sc.collection_id
+    WHERE sc.share_code = ? AND sc.is_active = 1
+""")
+
+
 def get_collection_by_share_code(share_code: str) -> tuple | None:
     """
     Get collection details by share code.
     Returns (collection_id, collection_name, owner_user_id) if valid and active.
     Returns None if code is invalid or inactive.
+    Active codes are cached until revoked.
     """
+    row = _share_code_cache.get(share_code)
+    if row is not _MISSING:
+        return row
+    generation = _share_code_cache.generation
     with db_transaction(commit=False) as (conn, cur):
-        cur.execute("""
-            SELECT c.id, c.name, c.user_id
-            FROM collections c
-            JOIN shared_collections sc ON c.id = sc.collection_id
-            WHERE sc.share_code = ? AND sc.is_active = 1
-        """, (share_code,))
-        return cur.fetchone()
+        cur.execute(COLLECTION_BY_SHARE_CODE_SQL, (share_code,))
+        row = cur.fetchone()
+    if row:
+        _share_code_cache.put(share_code, row, generation)
+    return row
 
 
+@invalidates_collection
 def revoke_share_code(collection_id: int, user_id: int) -> bool:
     """
     Revoke (deactivate) the share code for a collection.
@@ -650,6 +1527,7 @@ def revoke_share_code(collection_id: int, user_id: int) -> bool:
         return cur.rowcount > 0
 
 
+@invalidates_collection
 def regenerate_share_code(collection_id: int, user_id: int) -> str:
     """
     Regenerate a new share code for a collection.
@@ -662,16 +1540,19 @@ def regenerate_share_code(collection_id: int, user_id: int) -> str:
     return create_share_link(collection_id, user_id)
 
 
+ACTIVE_SHARE_CODE_SQL = hot_query("active_share_code", """
+    SELECT share_code FROM shared_collections
+    WHERE collection_id = ? AND is_active = 1
+""")
+
+
 def get_share_code_for_collection(collection_id: int) -> str | None:
     """
     Get the active share code for a collection.
     Returns None if no active share code exists.
     """
     with db_transaction(commit=False) as (conn, cur):
-        cur.execute("""
-            SELECT share_code FROM shared_collections 
-            WHERE collection_id = ? AND is_active = 1
-        """, (collection_id,))
+        cur.execute(ACTIVE_SHARE_CODE_SQL, (collection_id,))
         row = cur.fetchone()
         return row[0] if row else None
 
@@ -688,23 +1569,64 @@ def log_share_access(share_code: str, user_id: int):
         """, (share_code, user_id, accessed_at))
 
 
+def log_share_access_batch(rows: list[tuple]):
+    """
+    Log many share accesses in one transaction.
+    rows: (share_code, user_id, accessed_at)
+    """
+    with db_transaction() as (conn, cur):
+        cur.executemany("""
+            INSERT INTO shared_collection_access_log (share_code, user_id, accessed_at)
+            VALUES (?, ?, ?)
+        """, rows)
+
+
 def get_share_access_logs(collection_id: int) -> list:
     """
-    Get access logs for a shared collection.
-    Returns list of (user_id, username, first_name, accessed_at) tuples.
+    Get the users who accessed the active share of a collection, latest first.
+    Returns list of (user_id, username, first_name, last_access) tuples, one per user.
     """
     with db_transaction(commit=False) as (conn, cur):
         cur.execute("""
-            SELECT sal.user_id, u.username, u.first_name, sal.accessed_at
-            FROM shared_collection_access_log sal
-            JOIN shared_collections sc ON sal.share_code = sc.share_code
-            LEFT JOIN users u ON sal.user_id = u.user_id
+            SELECT sau.user_id, u.username, u.first_name, sau.last_access
+            FROM shared_collections sc
+            JOIN share_access_users sau ON sau.share_code = sc.share_code
+            LEFT JOIN users u ON sau.user_id = u.user_id
             WHERE sc.collection_id = ? AND sc.is_active = 1
-            ORDER BY sal.accessed_at DESC
+            ORDER BY sau.last_access DESC
         """, (collection_id,))
         return cur.fetchall()
 
 
+EXPIRED_ACCESS_LOG_SQL = hot_query("expired_access_log", """
+    SELECT id, share_code, user_id, accessed_at
+    FROM shared_collection_access_log
+    WHERE accessed_at < ?
+    ORDER BY accessed_at, id
+    LIMIT ?
+""")
+
+
+def get_expired_access_log_rows(cutoff: str, limit: int = 500) -> list:
+    """
+    Get the oldest access log rows with accessed_at before cutoff (ISO string).
+    Returns list of (id, share_code, user_id, accessed_at) tuples.
+    """
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(EXPIRED_ACCESS_LOG_SQL, (cutoff, limit))
+        return cur.fetchall()
+
+
+def delete_access_log_rows(row_ids: list[int]) -> int:
+    """Delete access log rows by id. Rollup tables are not affected."""
+    with db_transaction() as (conn, cur):
+        cur.executemany(
+            "DELETE FROM shared_collection_access_log WHERE id = ?",
+            [(row_id,) for row_id in row_ids]
+        )
+        return cur.rowcount
+
+
 # --- Admin Shares Management Functions ---
 
 def get_all_active_shares() -> list:
@@ -718,55 +1640,65 @@ def get_all_active_shares() -> list:
                 sc.id, sc.share_code, sc.collection_id, c.name as collection_name,
                 sc.created_by, u.username as creator_username,
                 sc.created_at,
-                COUNT(DISTINCT sal.user_id) as unique_users,
-                COUNT(sal.id) as total_accesses
+                COALESCE(sas.unique_users, 0) as unique_users,
+                COALESCE(sas.total_accesses, 0) as total_accesses
             FROM shared_collections sc
             JOIN collections c ON sc.collection_id = c.id
             LEFT JOIN users u ON sc.created_by = u.user_id
-            LEFT JOIN shared_collection_access_log sal ON sc.share_code = sal.share_code
+            LEFT JOIN share_access_stats sas ON sc.share_code = sas.share_code
             WHERE sc.is_active = 1
-            GROUP BY sc.id, sc.share_code, sc.collection_id, c.name, sc.created_by, u.username, sc.created_at
             ORDER BY sc.created_at DESC
         """)
         return cur.fetchall()
 
 
+SHARE_STATS_SQL = hot_query(
+    "share_stats",
+    "SELECT unique_users, total_accesses, last_access FROM share_access_stats WHERE share_code = ?"
+)
+
+
 def get_share_stats(share_code: str) -> dict:
     """
     Get statistics for a specific share code.
     Returns dict with: unique_users, total_accesses, last_access
     """
     with db_transaction(commit=False) as (conn, cur):
-        # Count unique users
-        cur.execute("""
-            SELECT COUNT(DISTINCT user_id)
-            FROM shared_collection_access_log
-            WHERE share_code = ?
-        """, (share_code,))
-        unique_users = cur.fetchone()[0]
-        
-        # Count total accesses
-        cur.execute("""
-            SELECT COUNT(*)
-            FROM shared_collection_access_log
-            WHERE share_code = ?
-        """, (share_code,))
-        total_accesses = cur.fetchone()[0]
+        cur.execute(SHARE_STATS_SQL, (share_code,))
+        row = cur.fetchone()
         
-        # Get last access time
+    if not row:
+        return {"unique_users": 0, "total_accesses": 0, "last_access": None}
+    return {
+        "unique_users": row[0],
+        "total_accesses": row[1],
+        "last_access": row[2]
+    }
+
+
+def get_share_daily_accesses(share_code: str, days: int = 7) -> list:
+    """
+    Get per-day access counts of a share code for the last `days` days.
+    Returns list of (day, accesses) tuples, oldest first; days without access are omitted.
+    """
+    since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    with db_transaction(commit=False) as (conn, cur):
         cur.execute("""
-            SELECT MAX(accessed_at)
-            FROM shared_collection_access_log
-            WHERE share_code = ?
-        """, (share_code,))
-        last_access_row = cur.fetchone()
-        last_access = last_access_row[0] if last_access_row and last_access_row[0] else None
-        
-        return {
-            "unique_users": unique_users,
-            "total_accesses": total_accesses,
-            "last_access": last_access
-        }
+            SELECT day, accesses FROM share_access_daily
+            WHERE share_code = ? AND day >= ?
+            ORDER BY day
+        """, (share_code, since))
+        return cur.fetchall()
+
+
+DETAILED_ACCESS_LOG_SQL = hot_query("detailed_access_log", """
+    SELECT sal.user_id, u.username, u.first_name, sal.accessed_at
+    FROM shared_collection_access_log sal
+    LEFT JOIN users u ON sal.user_id = u.user_id
+    WHERE sal.share_code = ?
+    ORDER BY sal.accessed_at DESC
+    LIMIT ? OFFSET ?
+""")
 
 
 def get_detailed_access_log(share_code: str, offset: int = 0, limit: int = 50) -> list:
@@ -775,14 +1707,7 @@ def get_detailed_access_log(share_code: str, offset: int = 0, limit: int = 50) -
     Returns list of tuples: (user_id, username, first_name, accessed_at)
     """
     with db_transaction(commit=False) as (conn, cur):
-        cur.execute("""
-            SELECT sal.user_id, u.username, u.first_name, sal.accessed_at
-            FROM shared_collection_access_log sal
-            LEFT JOIN users u ON sal.user_id = u.user_id
-            WHERE sal.share_code = ?
-            ORDER BY sal.accessed_at DESC
-            LIMIT ? OFFSET ?
-        """, (share_code, limit, offset))
+        cur.execute(DETAILED_ACCESS_LOG_SQL, (share_code, limit, offset))
         return cur.fetchall()
 
 
@@ -800,6 +1725,159 @@ def get_share_by_collection(collection_id: int) -> tuple | None:
         return cur.fetchone()
 
 
+# --- Send Job Functions ---
+
+def create_send_job(
+    user_id: int,
+    chat_id: int,
+    collection_id: int,
+    collection_name: str,
+    total: int,
+    item_ids: list[int] | None = None,
+    compact: bool = False,
+) -> int:
+    """Persist a new send job. item_ids=None means the whole collection. Returns the job id."""
+    now = datetime.now().isoformat()
+    with db_transaction() as (conn, cur):
+        cur.execute("""
+            INSERT INTO send_jobs (user_id, chat_id, collection_id, collection_name, item_ids, compact, total,
+                                   created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            user_id, chat_id, collection_id, collection_name,
+            json.dumps(item_ids) if item_ids is not None else None,
+            int(compact), total, now, now
+        ))
+        return cur.lastrowid
+
+
+def set_send_job_status_message(job_id: int, message_id: int):
+    with db_transaction() as (conn, cur):
+        cur.execute("UPDATE send_jobs SET status_message_id = ? WHERE id = ?", (message_id, job_id))
+
+
+def checkpoint_send_job(job_id: int, last_item_id: int, sent: int, failed_item_ids: list[int]):
+    """Record progress: every item up to last_item_id was attempted, failed_item_ids still need sending."""
+    with db_transaction() as (conn, cur):
+        cur.execute("""
+            UPDATE send_jobs
+            SET last_item_id = ?, sent = ?, failed_item_ids = ?, updated_at = ?
+            WHERE id = ?
+        """, (last_item_id, sent, json.dumps(failed_item_ids), datetime.now().isoformat(), job_id))
+
+
+def finish_send_job(job_id: int):
+    """Forget a job that completed, was cancelled or failed for good."""
+    with db_transaction() as (conn, cur):
+        cur.execute("DELETE FROM send_jobs WHERE id = ?", (job_id,))
+
+
+def get_unfinished_send_jobs() -> list[dict]:
+    """Jobs interrupted by a restart, oldest first."""
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute("""
+            SELECT id, user_id, chat_id, collection_id, collection_name, item_ids, total,
+                   sent, failed_item_ids, last_item_id, status_message_id, compact
+            FROM send_jobs
+            ORDER BY id
+        """)
+        rows = cur.fetchall()
+
+    return [
+        {
+            "job_id": row[0],
+            "user_id": row[1],
+            "chat_id": row[2],
+            "collection_id": row[3],
+            "collection_name": row[4],
+            "item_ids": json.loads(row[5]) if row[5] is not None else None,
+            "total": row[6],
+            "sent": row[7],
+            "failed_item_ids": json.loads(row[8]),
+            "last_item_id": row[9],
+            "status_message_id": row[10],
+            "compact": bool(row[11]),
+        }
+        for row in rows
+    ]
+
+
+def get_items_by_ids(collection_id: int, item_ids: list[int]) -> list:
+    """Get the given items of a collection in id order (ids that no longer exist are skipped)."""
+    if not item_ids:
+        return []
+    placeholders = ",".join("?" * len(item_ids))
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(
+            f"""
+            SELECT id, content_type, file_id, text_content, file_name, file_size, added_at
+            FROM items
+            WHERE collection_id = ? AND id IN ({placeholders})
+            ORDER BY id
+            """,
+            (collection_id, *item_ids)
+        )
+        return cur.fetchall()
+
+
+# --- Archive Queue Functions ---
+
+ARCHIVE_QUEUE_BATCH_SQL = hot_query("archive_queue_batch", """
+    SELECT id, action, payload, created_at, attempts
+    FROM archive_queue
+    WHERE channel_id = ?
+    ORDER BY id
+    LIMIT ?
+""")
+
+ARCHIVE_QUEUE_DEPTH_SQL = hot_query("archive_queue_depth", """
+    SELECT COUNT(*), MIN(created_at)
+    FROM archive_queue
+    WHERE channel_id = ?
+""")
+
+
+def enqueue_archive_events(channel_id: int, rows: list[tuple]):
+    """
+    Persist queued channel events in one transaction.
+    rows: (action, payload JSON, created_at)
+    """
+    with db_transaction() as (conn, cur):
+        cur.executemany("""
+            INSERT INTO archive_queue (channel_id, action, payload, created_at)
+            VALUES (?, ?, ?, ?)
+        """, [(channel_id, *row) for row in rows])
+
+
+def get_archive_events(channel_id: int, limit: int = 50) -> list:
+    """Oldest queued events of a channel: (id, action, payload, created_at, attempts) tuples."""
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(ARCHIVE_QUEUE_BATCH_SQL, (channel_id, limit))
+        return cur.fetchall()
+
+
+def get_archive_queue_depth(channel_id: int) -> tuple[int, str | None]:
+    """(queued events, created_at of the oldest) for a channel."""
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(ARCHIVE_QUEUE_DEPTH_SQL, (channel_id,))
+        return cur.fetchone()
+
+
+def delete_archive_events(event_ids: list[int]):
+    """Remove events once they were sent (or given up on)."""
+    with db_transaction() as (conn, cur):
+        cur.executemany("DELETE FROM archive_queue WHERE id = ?", [(event_id,) for event_id in event_ids])
+
+
+def bump_archive_event_attempts(event_ids: list[int]):
+    """Count one more failed send for events that stay queued."""
+    with db_transaction() as (conn, cur):
+        cur.executemany(
+            "UPDATE archive_queue SET attempts = attempts + 1 WHERE id = ?",
+            [(event_id,) for event_id in event_ids]
+        )
+
+
 # --- Archive Info Functions ---
 
 def save_archive_info(item_id: int, archive_channel_id: int, archive_message_id: int) -> int:
@@ -816,6 +1894,37 @@ def save_archive_info(item_id: int, archive_channel_id: int, archive_message_id:
         return cur.lastrowid
 
 
+def save_archive_info_batch(rows: list[tuple]):
+    """
+    Save archive info for many items in one transaction.
+    Items deleted since they were queued for archiving are skipped.
+    rows: (item_id, archive_channel_id, archive_message_id)
+    """
+    archived_at = datetime.now().isoformat()
+    with db_transaction() as (conn, cur):
+        cur.executemany("""
+            INSERT INTO archive_info (item_id, archive_channel_id, archive_message_id, archived_at)
+            SELECT ?, ?, ?, ?
+            WHERE EXISTS (SELECT 1 FROM items WHERE id = ?)
+        """, [(*row, archived_at, row[0]) for row in rows])
+
+
+def get_archived_item_ids(archive_channel_id: int, item_ids: list[int]) -> set[int]:
+    """Which of the given items already have a backup in this archive channel."""
+    if not item_ids:
+        return set()
+    placeholders = ",".join("?" * len(item_ids))
+    with db_transaction(commit=False) as (conn, cur):
+        cur.execute(
+            f"""
+            SELECT item_id FROM archive_info
+            WHERE item_id IN ({placeholders}) AND archive_channel_id = ?
+            """,
+            (*item_ids, archive_channel_id)
+        )
+        return {row[0] for row in cur.fetchall()}
+
+
 def get_archive_info(item_id: int) -> list:
     """
     Get archive info for an item.
@@ -0,0 +1,229 @@
+# delivery.py
+"""
+Delivery Module
+
+Sends stored items to a chat with as few API calls as possible:
+1. Items that remember the user's original message are copied with
+   copy_messages, up to 100 messages per call (albums stay albums)
+2. Everything else (imported items, items saved before origin references
+   were recorded, runs Telegram refused, originals the user deleted) is planned by
+   utils.plan_media_sends: valid albums of up to 10, single items through
+   their own method, and text items (plus cut-off caption tails) packed into
+   messages of up to 4096 characters
+
+In compact mode every text item is packed, even ones that could be copied.
+
+Every call goes through the send scheduler.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from telegram import Bot
+
+import db
+from send_scheduler import send_scheduler
+from utils import pack_text_items, plan_media_sends, safe_send_media_group, safe_send_single_media
+
+COPY_BATCH_SIZE = 100  # Telegram's limit for copy_messages
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryResult:
+    """Outcome of one deliver_items() call."""
+
+    def __init__(self):
+        self.sent_ids: list[int] = []
+        self.failed_ids: list[int] = []
+        self.skipped = 0  # originals Telegram silently skipped (deleted by the user); resent from file ids
+        self.api_calls = 0
+
+
+def plan_copy_runs(items: list, origins: dict[int, tuple[int, int]]) -> tuple[list, list]:
+    """
+    Split items into copy runs and fallback items.
+    A run is up to COPY_BATCH_SIZE consecutive items from one source chat with
+    strictly increasing message ids (a copy_messages requirement).
+    Returns (runs, fallback_items); each run is (from_chat_id, [(item_id, message_id), ...]).
+    """
+    runs = []
+    fallback = []
+    current_chat = None
+    current: list[tuple[int, int]] = []
+
+    for item in items:
+        origin = origins.get(item[0])
+        if origin is None:
+            fallback.append(item)
+            continue
+        chat_id, message_id = origin
+        if (
+            chat_id != current_chat
+            or len(current) >= COPY_BATCH_SIZE
+            or (current and message_id <= current[-1][1])
+        ):
+            if current:
+                runs.append((current_chat, current))
+            current_chat, current = chat_id, []
+        current.append((item[0], message_id))
+
+    if current:
+        runs.append((current_chat, current))
+    return runs, fallback
+
+
+async def copy_run(
+    bot: Bot,
+    chat_id: int,
+    from_chat_id: int,
+    run: list[tuple[int, int]],
+    result: Optional[DeliveryResult] = None,
+) -> tuple[list[tuple[int, int]], list[int]]:
+    """
+    Copy one run from plan_copy_runs to chat_id.
+    Telegram skips originals that no longer exist without saying which ones,
+    so a short result can't be matched to items: the partial copies are
+    deleted and each half of the run is copied again, until the missing
+    originals are isolated. If the partial copies can't be deleted, the whole
+    run is reported missing. API errors propagate.
+
+    Returns (copied [(item_id, new_message_id)], missing item_ids).
+    """
+    message_ids = [message_id for _, message_id in run]
+    if result:
+        result.api_calls += 1
+    copies = await send_scheduler.send(
+        chat_id,
+        lambda: bot.copy_messages(chat_id=chat_id, from_chat_id=from_chat_id, message_ids=message_ids),
+        cost=send_scheduler.copy_messages_cost(len(run)),
+        method="copy_messages",
+    )
+    if len(copies) == len(run):
+        return [(item_id, copy.message_id) for (item_id, _), copy in zip(run, copies)], []
+    if not copies:
+        if result:
+            result.skipped += len(run)
+        return [], [item_id for item_id, _ in run]
+
+    copy_ids = [copy.message_id for copy in copies]
+    if result:
+        result.api_calls += 1
+    try:
+        await send_scheduler.send(
+            chat_id,
+            lambda: bot.delete_messages(chat_id=chat_id, message_ids=copy_ids),
+            method="delete_messages",
+        )
+    except Exception as e:
+        logger.warning(
+            f"Could not delete the partial copy of {len(run)} message(s) from {from_chat_id} "
+            f"in {chat_id}, giving up on the run: {e}"
+        )
+        if result:
+            result.skipped += len(run) - len(copies)
+        return [], [item_id for item_id, _ in run]
+
+    middle = len(run) // 2
+    copied, missing = await copy_run(bot, chat_id, from_chat_id, run[:middle], result)
+    copied_tail, missing_tail = await copy_run(bot, chat_id, from_chat_id, run[middle:], result)
+    return copied + copied_tail, missing + missing_tail
+
+
+async def deliver_items(
+    bot: Bot,
+    chat_id: int,
+    items: list,
+    cancel_event: Optional[asyncio.Event] = None,
+    compact: bool = False,
+) -> DeliveryResult:
+    """
+    Send items (standard item tuples, in id order) to chat_id.
+    compact=True packs all text items instead of copying them one message each.
+    Stops between API calls once cancel_event is set.
+    """
+    result = DeliveryResult()
+    copyable = [item for item in items if not (compact and item[1] == "text")]
+    origins = await db.aio.get_item_origins([item[0] for item in copyable])
+    runs, fallback = plan_copy_runs(items, origins)
+    items_by_id = {item[0]: item for item in items}
+
+    for from_chat_id, run in runs:
+        if cancel_event and cancel_event.is_set():
+            return result
+        try:
+            copied, missing = await copy_run(bot, chat_id, from_chat_id, run, result)
+        except Exception as e:
+            # Source chat gone or copying refused - resend these from their file ids
+            logger.warning(f"copy_messages of {len(run)} item(s) from {from_chat_id} failed, falling back: {e}")
+            fallback.extend(items_by_id[item_id] for item_id, _ in run)
+            continue
+
+        if missing:
+            logger.warning(
+                f"{len(missing)} of {len(run)} item(s) from {from_chat_id} could not be copied to {chat_id}, "
+                f"resending them from file ids"
+            )
+            fallback.extend(items_by_id[item_id] for item_id in missing)
+        result.sent_ids.extend(item_id for item_id, _ in copied)
+
+    fallback.sort(key=lambda item: item[0])
+    await _send_fallback(bot, chat_id, fallback, result, cancel_event)
+    return result
+
+
+async def _send_fallback(
+    bot: Bot,
+    chat_id: int,
+    items: list,
+    result: DeliveryResult,
+    cancel_event: Optional[asyncio.Event],
+):
+    plan = plan_media_sends(items)
+    result.failed_ids.extend(plan.unsendable)
+
+    # Parts of a split item are separate messages - the item failed if any part did
+    text_sent, text_failed = set(), set()
+    for item_ids, text in pack_text_items(plan.texts):
+        if cancel_event and cancel_event.is_set():
+            break
+        result.api_calls += 1
+        try:
+            await send_scheduler.send(
+                chat_id, lambda: bot.send_message(chat_id=chat_id, text=text), method="send_message"
+            )
+            text_sent.update(item_ids)
+        except Exception as e:
+            logger.error(f"Error sending packed text of item(s) {item_ids}: {e}")
+            text_failed.update(item_ids)
+    for item_id, _ in plan.texts:
+        if item_id in text_failed:
+            result.failed_ids.append(item_id)
+        elif item_id in text_sent:
+            result.sent_ids.append(item_id)
+
+    for group in plan.groups:
+        if cancel_event and cancel_event.is_set():
+            return
+        result.api_calls += 1
+        media = [m for _, m in group]
+        if len(media) == 1:
+            ok = await safe_send_single_media(bot, chat_id, media[0])
+        else:
+            ok = await safe_send_media_group(bot, chat_id, media)
+        (result.sent_ids if ok else result.failed_ids).extend(item_id for item_id, _ in group)
+
+    # Caption tails only matter for media that actually arrived
+    sent = set(result.sent_ids)
+    followups = [(item_id, text) for item_id, text in plan.followups if item_id in sent]
+    for item_ids, text in pack_text_items(followups):
+        if cancel_event and cancel_event.is_set():
+            return
+        result.api_calls += 1
+        try:
+            await send_scheduler.send(
+                chat_id, lambda: bot.send_message(chat_id=chat_id, text=text), method="send_message"
+            )
+        except Exception as e:
+            logger.error(f"Error sending caption continuation of item(s) {item_ids}: {e}")
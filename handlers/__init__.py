@@ -15,7 +15,8 @@ from .callbacks import (
     handle_revoke_share_callback, handle_export_collection_callback,
     handle_delete_collection_callback, handle_back_to_manage_callback,
     handle_exit_shared_collection_callback, handle_cancel_share_access_callback,
-    handle_exit_delete_mode_callback, handle_select_item_delete_col_callback
+    handle_exit_delete_mode_callback, handle_select_item_delete_col_callback,
+    handle_cancel_send_job_callback
 )
 from .messages import (
     handle_message, handle_new_collection_name_input, 
@@ -42,6 +43,7 @@ __all__ = [
     "handle_exit_shared_collection_callback", "handle_cancel_share_access_callback",
     "handle_exit_delete_mode_callback", "handle_import_collection_mode_callback",
     "handle_select_item_delete_col_callback", "handle_back_to_info_callback",
+    "handle_cancel_send_job_callback",
     
     # Messages
     "handle_message", "handle_new_collection_name_input"
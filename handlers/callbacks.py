@@ -8,17 +8,21 @@ from constants import active_collections
 from utils import (
     reset_user_modes, send_response, check_collection_access, 
     get_page_header, build_page_menu, show_collection_page,
-    build_page_file_type_menu, logger, prepare_media_groups, 
-    send_media_groups_in_chunks, verify_user_code,
+    build_page_file_type_menu, logger, verify_user_code,
     create_verification_code, update_batch_status, format_size,
     get_main_menu_text, build_main_menu_keyboard,
-    parse_callback_data, validate_access_wrapper, send_info_page
+    parse_callback_data, validate_access_wrapper, send_info_page,
+    parse_anchor, get_page_block, format_collection_stats
 )
 from handlers.commands import (
     new_collection_flow, list_collections_flow, manage_collections_flow, 
     remove_flow, id_file_flow, show_browse_menu
 )
 from archive_logger import log_activity, ENABLE_ARCHIVING
+from backup import UPLOAD_SIZE_LIMIT, export_size, write_collection_export
+from send_jobs import send_jobs
+from delivery import deliver_items
+from send_scheduler import send_scheduler
 
 async def handle_select_collection_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """בחירת אוסף פעיל לשמירה (לא קשור לדפדוף)"""
@@ -99,13 +103,15 @@ async def handle_browse_page_callback(update: Update, context: ContextTypes.DEFA
 
     collection_id = int(parts[0])
     page = int(parts[1])
+    anchor_id = parse_anchor(parts, 2)
 
     await show_collection_page(
         update=update,
         context=context,
         collection_id=collection_id,
         page=page,
-        edit_message_id=query.message.message_id
+        edit_message_id=query.message.message_id,
+        anchor_id=anchor_id
     )
 
 async def handle_scroll_view_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -125,13 +131,15 @@ async def handle_scroll_view_callback(update: Update, context: ContextTypes.DEFA
         item_index = int(parts[1])
     except ValueError:
         return
+    # Optional keyset cursor: "n<id>" = item after id, "p<id>" = item before id
+    cursor = parts[2] if len(parts) > 2 else ""
 
     is_allowed, collection = await validate_access_wrapper(update, context, collection_id)
     if not is_allowed:
         return
 
     # Get total items count
-    total_items = db.count_items_in_collection(collection_id)
+    total_items = await db.aio.count_items_in_collection(collection_id)
     
     if total_items == 0:
         await query.edit_message_text("אין פריטים באוסף הזה.")
@@ -143,8 +151,18 @@ async def handle_scroll_view_callback(update: Update, context: ContextTypes.DEFA
     elif item_index >= total_items:
         item_index = total_items - 1
 
-    # Get single item at the current index
-    items = db.get_items_by_collection(collection_id, offset=item_index, limit=1)
+    # Get single item - seek from the cursor item, fall back to position lookup
+    items = []
+    try:
+        if cursor.startswith("n"):
+            items = await db.aio.get_items_after_id(collection_id, int(cursor[1:]), limit=1)
+        elif cursor.startswith("p"):
+            items = await db.aio.get_items_before_id(collection_id, int(cursor[1:]), limit=1)
+    except ValueError:
+        items = []
+    if not items:
+        anchor_id = await db.aio.get_page_anchor_id(collection_id, item_index + 1, block_size=1)
+        items = await db.aio.get_items_after_id(collection_id, anchor_id, limit=1)
     if not items:
         await query.edit_message_text("פריט לא נמצא.")
         return
@@ -158,9 +176,9 @@ async def handle_scroll_view_callback(update: Update, context: ContextTypes.DEFA
     # Build navigation keyboard
     nav_buttons = []
     if item_index > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅ הקודם", callback_data=f"scroll_view:{collection_id}:{item_index - 1}"))
+        nav_buttons.append(InlineKeyboardButton("⬅ הקודם", callback_data=f"scroll_view:{collection_id}:{item_index - 1}:p{item_id}"))
     if item_index < total_items - 1:
-        nav_buttons.append(InlineKeyboardButton("הבא ➡", callback_data=f"scroll_view:{collection_id}:{item_index + 1}"))
+        nav_buttons.append(InlineKeyboardButton("הבא ➡", callback_data=f"scroll_view:{collection_id}:{item_index + 1}:n{item_id}"))
     
     keyboard = []
     if nav_buttons:
@@ -242,6 +260,7 @@ async def handle_page_info_callback(update: Update, context: ContextTypes.DEFAUL
         info_page = int(parts[2])
     except ValueError:
         return
+    anchor_id = parse_anchor(parts, 3)
 
     is_allowed, collection = await validate_access_wrapper(update, context, collection_id)
     if not is_allowed:
@@ -255,7 +274,8 @@ async def handle_page_info_callback(update: Update, context: ContextTypes.DEFAUL
         collection_id=collection_id,
         page=page,
         info_page=info_page,
-        edit_message_id=query.message.message_id
+        edit_message_id=query.message.message_id,
+        anchor_id=anchor_id
     )
 
 async def handle_back_to_info_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -276,6 +296,7 @@ async def handle_back_to_info_callback(update: Update, context: ContextTypes.DEF
         info_page = int(parts[2])
     except ValueError:
         return
+    anchor_id = parse_anchor(parts, 3)
 
     is_allowed, collection = await validate_access_wrapper(update, context, collection_id)
     if not is_allowed:
@@ -298,7 +319,8 @@ async def handle_back_to_info_callback(update: Update, context: ContextTypes.DEF
         context=context,
         collection_id=collection_id,
         page=page,
-        info_page=info_page
+        info_page=info_page,
+        anchor_id=anchor_id
     )
 
 async def handle_browse_group_or_select_all_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -317,11 +339,13 @@ async def handle_browse_group_or_select_all_callback(update: Update, context: Co
         collection_id = int(parts[0])
         page = int(parts[1])
         idx = int(parts[2])
+        anchor_id = parse_anchor(parts, 3)
     elif data.startswith("browse_page_select_all:"):
         is_select_all = True
         parts = parse_callback_data(data, "browse_page_select_all")
         collection_id = int(parts[0])
         page = int(parts[1])
+        anchor_id = parse_anchor(parts, 2)
     else:
         return
 
@@ -349,8 +373,7 @@ async def handle_browse_group_or_select_all_callback(update: Update, context: Co
     
     # Let's count totals for this scope to show on buttons
     block_size = 100
-    offset_block = (page - 1) * block_size
-    items_block = db.get_items_by_collection(collection_id, offset=offset_block, limit=block_size)
+    items_block, anchor_id = await get_page_block(collection_id, page, block_size, anchor_id)
     
     if not is_select_all:
         # filter only group items
@@ -367,15 +390,17 @@ async def handle_browse_group_or_select_all_callback(update: Update, context: Co
             await query.answer("אין פריטים בקבוצה זו.", show_alert=True)
             return
 
-        # Prepare and send immediately
-        media_visual, media_docs, text_items = prepare_media_groups(items_scope)
-        
-        await context.bot.send_message(
-            chat_id=query.message.chat_id, 
-            text=f"🚀 שולח {len(items_scope)} פריטים מקבוצה {idx}..."
+        await send_scheduler.send(
+            query.message.chat_id,
+            lambda: context.bot.send_message(
+                chat_id=query.message.chat_id,
+                text=f"🚀 שולח {len(items_scope)} פריטים מקבוצה {idx}..."
+            ),
+            method="send_message",
         )
         
-        await send_media_groups_in_chunks(context.bot, query.message.chat_id, media_visual, media_docs, text_items)
+        # Send immediately (copies the original messages where possible)
+        await deliver_items(context.bot, query.message.chat_id, items_scope)
         
         # After sending, we resend the collection page so it appears at the bottom
         await show_collection_page(
@@ -383,7 +408,8 @@ async def handle_browse_group_or_select_all_callback(update: Update, context: Co
             context=context,
             collection_id=collection_id,
             page=page,
-            force_resend=True
+            force_resend=True,
+            anchor_id=anchor_id
         )
         return
 
@@ -396,13 +422,14 @@ async def handle_browse_group_or_select_all_callback(update: Update, context: Co
     context.user_data[f"send_scope_{user_id}"] = {
         "collection_id": collection_id,
         "page": page,
+        "anchor_id": anchor_id,
         "is_select_all": is_select_all,
         "group_idx": idx,
         "items_ids": [x[0] for x in items_scope]  # Store IDs to send
     }
 
     reply_markup = build_page_file_type_menu(
-        collection_id, page, video_count, image_count, doc_count
+        collection_id, page, video_count, image_count, doc_count, anchor_id
     )
 
     await query.edit_message_text(
@@ -418,7 +445,7 @@ async def handle_page_file_send_choice_callback(update: Update, context: Context
     data = query.data
     user_id = query.from_user.id
     
-    # data format: page_files_<type>:<collection_id>:<page>
+    # data format: page_files_<type>:<collection_id>:<page>[:<anchor_id>]
     parts = parse_callback_data(data)
     if not parts or len(parts) < 3:
         return
@@ -431,9 +458,10 @@ async def handle_page_file_send_choice_callback(update: Update, context: Context
         page = int(parts[2])
     except ValueError:
         return
+    anchor_id = parse_anchor(parts, 3)
 
     # Check permission again
-    is_allowed, _, collection = check_collection_access(user_id, collection_id)
+    is_allowed, _, collection = await check_collection_access(user_id, collection_id)
     if not is_allowed:
         return
 
@@ -445,15 +473,15 @@ async def handle_page_file_send_choice_callback(update: Update, context: Context
     if not scope or scope["collection_id"] != collection_id or scope["page"] != page:
         # Fallback: Just fetch all items in page
         block_size = 100
-        offset_block = (page - 1) * block_size
-        items = db.get_items_by_collection(collection_id, offset=offset_block, limit=block_size)
+        items, anchor_id = await get_page_block(collection_id, page, block_size, anchor_id)
     else:
         # Fetch actual items by stored IDs
         # To avoid massive DB query with "IN (...)", we can just fetch the page and filter in python,
         # since we know the page anyway.
         block_size = 100
-        offset_block = (page - 1) * block_size
-        items_block = db.get_items_by_collection(collection_id, offset=offset_block, limit=block_size)
+        if anchor_id is None:
+            anchor_id = scope.get("anchor_id")
+        items_block, anchor_id = await get_page_block(collection_id, page, block_size, anchor_id)
         target_ids = set(scope["items_ids"])
         items = [x for x in items_block if x[0] in target_ids]
 
@@ -465,7 +493,7 @@ async def handle_page_file_send_choice_callback(update: Update, context: Context
         final_items = [x for x in items if x[1] == 'photo']
     elif action == "page_files_document":
         final_items = [x for x in items if x[1] == 'document']
-    elif action == "page_files_queue_all":
+    elif action in ("page_files_queue_all", "page_files_compact"):
         final_items = items
     
     if not final_items:
@@ -473,29 +501,63 @@ async def handle_page_file_send_choice_callback(update: Update, context: Context
         # Restoration logic omitted for brevity, user can click back
         return
 
-    # Send items
+    # Send items as a checkpointed background job (resumes after a restart)
     chat_id = query.message.chat_id
-    await context.bot.send_message(chat_id=chat_id, text=f"🚀 שולח {len(final_items)} פריטים...")
-    
-    media_visual, media_docs, text_items = prepare_media_groups(final_items)
-    await send_media_groups_in_chunks(context.bot, chat_id, media_visual, media_docs, text_items)
-    
-    if media_visual or media_docs or text_items:
+    page_message_id = query.message.message_id
+    
+    async def restore_page(job):
+        if not job.sent:
+            await send_scheduler.send(
+                chat_id,
+                lambda: context.bot.send_message(chat_id=chat_id, text="חלה שגיאה בעיבוד הפריטים."),
+                method="send_message",
+            )
+            return
         # Show the collection page again (fresh message at bottom)
         await show_collection_page(
             update=update,
             context=context,
             collection_id=collection_id,
             page=page,
-            edit_message_id=query.message.message_id,
-            force_resend=True
+            edit_message_id=page_message_id,
+            force_resend=True,
+            anchor_id=anchor_id
         )
-    else:
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="חלה שגיאה בעיבוד הפריטים.",
+    
+    job = await send_jobs.start(
+        context.bot, chat_id, user_id, collection_id, collection[1],
+        on_done=restore_page, item_ids=[x[0] for x in final_items],
+        compact=action == "page_files_compact"
+    )
+    if job is None:
+        await send_scheduler.send(
+            chat_id,
+            lambda: context.bot.send_message(
+                chat_id=chat_id, text="⏳ כבר מתבצעת שליחה של אוסף. עצור אותה או המתן לסיומה."
+            ),
+            method="send_message",
         )
 
+async def handle_cancel_send_job_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Stop a running background send-all job"""
+    query = update.callback_query
+    
+    parts = parse_callback_data(query.data, "cancel_send_job")
+    if not parts:
+        await query.answer()
+        return
+        
+    try:
+        job_id = int(parts[0])
+    except ValueError:
+        await query.answer()
+        return
+        
+    if send_jobs.cancel(job_id, query.from_user.id):
+        await query.answer("עוצר את השליחה...")
+    else:
+        await query.answer("השליחה כבר הסתיימה.", show_alert=True)
+
 async def handle_batch_status_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """הצגת התראה קופצת עם מספר הקבצים שנוספו"""
     query = update.callback_query
@@ -538,7 +600,7 @@ async def handle_collection_send_all_callback(update: Update, context: ContextTy
     if not is_allowed:
         return
         
-    total_items = db.count_items_in_collection(collection_id)
+    total_items = await db.aio.count_items_in_collection(collection_id)
     if total_items == 0:
         await query.answer("האוסף ריק", show_alert=True)
         return
@@ -616,7 +678,7 @@ async def handle_delete_select_collection_callback(update: Update, context: Cont
         {"collection_id": collection_id}
     )
     
-    item_count = db.count_items_in_collection(collection_id)
+    item_count = await db.aio.count_items_in_collection(collection_id)
     
     text = (
         f"⚠️ **בטוח שאתה רוצה למחוק את האוסף?**\n\n"
@@ -715,6 +777,7 @@ async def handle_manage_collection_callback(update: Update, context: ContextType
     if not is_admin_view:
         keyboard = [
             [InlineKeyboardButton("📤 ייצוא לקובץ (גיבוי)", callback_data=f"export_collection:{collection_id}")],
+            [InlineKeyboardButton("🗜 ייצוא דחוס (gz)", callback_data=f"export_collection:{collection_id}:gz")],
             [InlineKeyboardButton("🔗 יצירת קישור שיתוף", callback_data=f"share_collection:{collection_id}")],
             [InlineKeyboardButton("🗑 מחיקת אוסף", callback_data=f"delete_collection:{collection_id}")],
             [InlineKeyboardButton("🔙 חזור לרשימה", callback_data="back_to_manage")],
@@ -726,8 +789,14 @@ async def handle_manage_collection_callback(update: Update, context: ContextType
             [InlineKeyboardButton("🔙 חזור לרשימה", callback_data="back_to_manage")],
         ]
     
+    stats = await db.aio.get_collection_stats(collection_id)
+    text = f"ניהול אוסף: **{collection[1]}**\n📦 פריטים: {stats['items']}"
+    breakdown = format_collection_stats(stats)
+    if breakdown:
+        text += f"\n{breakdown}"
+    
     await query.edit_message_text(
-        f"ניהול אוסף: **{collection[1]}**",
+        text,
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode="Markdown"
     )
@@ -752,7 +821,7 @@ async def handle_share_collection_callback(update: Update, context: ContextTypes
         return
         
     collection_name = collection[1]
-    share_code = db.create_share_link(collection_id, user.id)
+    share_code = await db.aio.create_share_link(collection_id, user.id)
     
     if ENABLE_ARCHIVING:
         asyncio.create_task(
@@ -767,8 +836,8 @@ async def handle_share_collection_callback(update: Update, context: ContextTypes
             )
         )
     
-    logs = db.get_share_access_logs(collection_id)
-    access_count = len(logs)
+    share_stats = await db.aio.get_share_stats(share_code)
+    access_count = share_stats["total_accesses"]
     
     args = [str(collection_name), str(share_code), str(access_count)]
     text = (
@@ -810,7 +879,7 @@ async def handle_share_stats_callback(update: Update, context: ContextTypes.DEFA
     if not is_allowed:
         return
         
-    logs = db.get_share_access_logs(collection_id)
+    logs = await db.aio.get_share_access_logs(collection_id)
     
     if not logs:
         text = "📊 אין עדיין צפיות באוסף המשותף הזה."
@@ -849,7 +918,7 @@ async def handle_regenerate_share_callback(update: Update, context: ContextTypes
     except ValueError:
         return
         
-    new_code = db.regenerate_share_code(collection_id, query.from_user.id)
+    new_code = await db.aio.regenerate_share_code(collection_id, query.from_user.id)
     
     if new_code:
         # Provide same view as initial share creation but updated
@@ -877,7 +946,7 @@ async def handle_revoke_share_callback(update: Update, context: ContextTypes.DEF
     except ValueError:
         return
         
-    db.revoke_share_code(collection_id, query.from_user.id)
+    await db.aio.revoke_share_code(collection_id, query.from_user.id)
     
     # Log share revocation
     if ENABLE_ARCHIVING:
@@ -912,50 +981,55 @@ async def handle_export_collection_callback(update: Update, context: ContextType
     except ValueError:
         return
         
-    # Get items
-    items = db.get_items_by_collection(collection_id, limit=100000) # Get all
-    if not items:
-        await query.edit_message_text("האוסף ריק, אין מה לייצא.")
-        return
-        
+    compress = len(parts) > 1 and parts[1] == "gz"
+
     is_allowed, collection = await validate_access_wrapper(update, context, collection_id)
     if not is_allowed:
         return
-        
-    # Generate TXT content
-    # Format: CONTENT_TYPE|FILE_ID|TEXT|FILENAME|SIZE
-    lines = []
-    lines.append(f"# COLLECTION EXPORT: {collection[1]}")
-    lines.append(f"# DATE: {db.datetime.now()}")
-    lines.append("# DO NOT EDIT THIS FILE")
-    lines.append("")
-    
-    for item in items:
-        # item: id, content_type, file_id, text_content, file_name, file_size, added_at
-        c_type = item[1]
-        f_id = item[2]
-        text = item[3] or ""
-        text = text.replace("|", "<PIPE>") # Escape pipe
-        text = text.replace("\n", "<NL>") # Escape newline
-        f_name = item[4] or ""
-        f_size = str(item[5]) if item[5] else "0"
-        
-        line = f"{c_type}|{f_id}|{text}|{f_name}|{f_size}"
-        lines.append(line)
-        
-    content = "\n".join(lines)
-    
-    # Send as document
-    from io import BytesIO
-    bio = BytesIO(content.encode('utf-8'))
-    bio.name = f"Build_Collection_{collection_id}_backup.txt"
-    
-    await context.bot.send_document(
-        chat_id=query.message.chat_id,
-        document=bio,
-        caption=f"📦 גיבוי מלא לאוסף: {collection[1]}",
-        filename=bio.name
+
+    if await db.aio.count_items_in_collection(collection_id) == 0:
+        await query.edit_message_text("האוסף ריק, אין מה לייצא.")
+        return
+
+    # Stream rows into a spooled temp file off the event loop. The upload reads
+    # the whole file into memory, so anything over the Bot API limit stops here.
+    export_file, item_count = await asyncio.to_thread(
+        write_collection_export, collection_id, collection[1], compress
     )
+    size = export_size(export_file)
+    if size > UPLOAD_SIZE_LIMIT:
+        export_file.close()
+        if compress:
+            text = (
+                f"❌ קובץ הגיבוי גדול מדי ({format_size(size)}), גם בדחיסה.\n"
+                f"טלגרם מאפשר לשלוח קבצים עד {format_size(UPLOAD_SIZE_LIMIT)}.\n"
+                "פצל את האוסף לכמה אוספים קטנים יותר וייצא כל אחד בנפרד."
+            )
+            buttons = []
+        else:
+            text = (
+                f"❌ קובץ הגיבוי גדול מדי ({format_size(size)}).\n"
+                f"טלגרם מאפשר לשלוח קבצים עד {format_size(UPLOAD_SIZE_LIMIT)}.\n"
+                "נסה ייצוא דחוס (gz), או פצל את האוסף לכמה אוספים קטנים יותר."
+            )
+            buttons = [[InlineKeyboardButton("🗜 ייצוא דחוס (gz)", callback_data=f"export_collection:{collection_id}:gz")]]
+        buttons.append([InlineKeyboardButton("🔙 חזור לניהול", callback_data=f"manage_collection:{collection_id}")])
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+        return
+
+    filename = f"Build_Collection_{collection_id}_backup.txt"
+    if compress:
+        filename += ".gz"
+
+    try:
+        await context.bot.send_document(
+            chat_id=query.message.chat_id,
+            document=export_file,
+            caption=f"📦 גיבוי מלא לאוסף: {collection[1]}\n📊 {item_count} פריטים",
+            filename=filename
+        )
+    finally:
+        export_file.close()
 
 async def handle_delete_collection_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Delete a collection with confirmation"""
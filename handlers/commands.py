@@ -29,7 +29,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
             # Fetch Item
-            item = db.get_item_by_id(item_id)
+            item = await db.aio.get_item_by_id(item_id)
             if not item:
                 await update.message.reply_text("❌ הקובץ חיפשת לא נמצא במאגר.")
                 return
@@ -124,7 +124,7 @@ async def new_collection_flow(message, user, context, args: list[str], edit_mess
 
     name = " ".join(args)
     try:
-        collection_id = db.create_collection(name, user.id)
+        collection_id = await db.aio.create_collection(name, user.id)
         active_collections[user.id] = collection_id
         
         # Auto-activate collection mode
@@ -182,7 +182,7 @@ async def show_browse_menu(chat_id: int, user_id: int, context: ContextTypes.DEF
     Shared function to display browse menu.
     Can be used from both command handlers and callback queries.
     """
-    collections = db.get_collections(user_id)
+    collections = await db.aio.get_collections(user_id)
     if not collections:
         text = "אין אוספים לדפדוף."
         if edit_message_id:
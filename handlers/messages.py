@@ -1,4 +1,7 @@
 import asyncio
+import contextlib
+import tempfile
+import time
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 import db
@@ -7,10 +10,18 @@ from constants import active_collections, active_shared_collections, MSG_NO_COLL
 from utils import (
     track_and_reset_user, verify_user_code, update_batch_status,
     send_response, show_collection_page, format_size, logger,
-    check_collection_access, extract_file_info
+    check_collection_access, extract_file_info, format_duration
 )
 from archive_logger import (
-    archive_file_to_channels, log_activity, ENABLE_ARCHIVING
+    archive_file_to_channels, archive_album_to_channels, log_activity, ENABLE_ARCHIVING
+)
+from ingest import item_writer, album_aggregator
+from write_behind import user_tracker, access_log
+from send_jobs import send_jobs
+from send_scheduler import send_scheduler
+from backup import (
+    parse_backup_header, import_backup_file, is_gzip_file, decompress_to_tempfile,
+    BackupTooLargeError, MAX_DECOMPRESSED_SIZE
 )
 
 async def handle_new_collection_name_input(message, context: ContextTypes.DEFAULT_TYPE):
@@ -27,7 +38,7 @@ async def handle_new_collection_name_input(message, context: ContextTypes.DEFAUL
         return
 
     try:
-        collection_id = db.create_collection(name, user.id)
+        collection_id = await db.aio.create_collection(name, user.id)
         active_collections[user.id] = collection_id
         
         if "creating_collection_mode" in context.user_data:
@@ -66,101 +77,92 @@ async def handle_import_collection_mode_callback(update: Update, context: Contex
     
     await query.edit_message_text(
         "📂 **מצב יבוא אוסף**\n\n"
-        "שלח לי עכשיו את קובץ הגיבוי (.txt) שקיבלת מהבוט.\n"
+        "שלח לי עכשיו את קובץ הגיבוי (.txt או .txt.gz) שקיבלת מהבוט.\n"
         "אני אצור אוסף חדש מהתוכן שלו.",
         parse_mode="Markdown",
         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 ביטול", callback_data="back_to_main")]])
     )
 
 async def process_imported_collection(message, context: ContextTypes.DEFAULT_TYPE):
-    """Process uploaded TXT file for collection import"""
+    """Process uploaded TXT (or gzipped TXT) file for collection import"""
     doc = message.document
     
-    if not doc.file_name.endswith(".txt"):
-        await message.reply_text("❌ זה לא קובץ טקסט. אנא שלח קובץ גיבוי (.txt) תקני.")
+    if not doc.file_name.endswith((".txt", ".gz")):
+        await message.reply_text("❌ זה לא קובץ טקסט. אנא שלח קובץ גיבוי (.txt או .txt.gz) תקני.")
         return
 
     status_msg = await message.reply_text("⏳ מוריד ומעבד את קובץ הגיבוי...")
+    context.user_data.pop("import_mode", None)
+    
+    # Large backups take a while - run in the background so the bot stays responsive
+    context.application.create_task(run_collection_import(message, context, status_msg))
+
+async def run_collection_import(message, context: ContextTypes.DEFAULT_TYPE, status_msg):
+    """Download a backup to a temp file and stream its rows into a new collection"""
+    doc = message.document
+    user_id = message.from_user.id
     
     try:
         file_obj = await doc.get_file()
-        from io import BytesIO
-        data = BytesIO()
-        await file_obj.download_to_memory(data)
-        content = data.getvalue().decode('utf-8')
-        
-        lines = content.splitlines()
         
-        # Verify header
-        header = lines[0] if lines else ""
-        if not header.startswith("# COLLECTION EXPORT:"):
-            await status_msg.edit_text("❌ הקובץ לא נראה כמו גיבוי תקין של הבוט.")
-            return
+        with contextlib.ExitStack() as files:
+            data = files.enter_context(tempfile.TemporaryFile())
+            await file_obj.download_to_memory(data)
+            data.seek(0)
             
-        # Extract name from header or filename
-        col_name = header.replace("# COLLECTION EXPORT:", "").strip()
-        if not col_name:
-            col_name = doc.file_name.replace(".txt", "").replace("_backup", "")
+            # Compressed backups are inflated to a second temp file so progress stays byte-accurate
+            if is_gzip_file(data):
+                data = files.enter_context(await asyncio.to_thread(decompress_to_tempfile, data))
             
-        original_name = col_name
-        counter = 1
-        
-        # Try to create collection, append number if exists
-        user_id = message.from_user.id
-        collection_id = None
-        
-        while True:
-            try:
-                collection_id = db.create_collection(col_name, user_id)
-                break
-            except Exception as e:
-                if "UNIQUE constraint failed" in str(e):
-                    col_name = f"{original_name} ({counter})"
-                    counter += 1
-                else:
-                    raise e
-                    
-        # Parse items
-        imported_count = 0
-        errors = 0
-        
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
+            # Verify header
+            header = (await asyncio.to_thread(data.readline)).decode("utf-8", errors="replace")
+            col_name = parse_backup_header(header)
+            if col_name is None:
+                await status_msg.edit_text("❌ הקובץ לא נראה כמו גיבוי תקין של הבוט.")
+                return
                 
-            parts = line.split("|")
-            if len(parts) < 5:
-                continue
+            # Extract name from header or filename
+            if not col_name:
+                col_name = doc.file_name.replace(".gz", "").replace(".txt", "").replace("_backup", "")
                 
-            # c_type|f_id|text|f_name|f_size
-            c_type = parts[0]
-            f_id = parts[1]
-            text = parts[2].replace("<PIPE>", "|").replace("<NL>", "\n")
-            # If text is empty string, make it None
-            text = text if text else None
+            original_name = col_name
+            counter = 1
             
-            f_name = parts[3]
-            f_name = f_name if f_name else None
+            # Try to create collection, append number if exists
+            collection_id = None
             
-            f_size = 0
-            try:
-                f_size = int(parts[4])
-            except:
-                pass
-                
-            # Insert
-            try:
-                db.add_item(
-                    collection_id, c_type, f_id, text,
-                    f_name, f_size
-                )
-                imported_count += 1
-            except:
-                errors += 1
+            while True:
+                try:
+                    collection_id = await db.aio.create_collection(col_name, user_id)
+                    break
+                except Exception as e:
+                    if "UNIQUE constraint failed" in str(e):
+                        col_name = f"{original_name} ({counter})"
+                        counter += 1
+                    else:
+                        raise e
+            
+            started = time.monotonic()
+            
+            async def report_progress(imported: int, bytes_read: int, total_bytes: int):
+                elapsed = max(time.monotonic() - started, 0.001)
+                rate = imported / elapsed
+                percent = bytes_read * 100 // total_bytes if total_bytes else 100
+                eta = (total_bytes - bytes_read) / (bytes_read / elapsed) if bytes_read else 0
+                try:
+                    await status_msg.edit_text(
+                        f"⏳ מייבא לאוסף '{col_name}'...\n\n"
+                        f"📦 פריטים שיובאו: {imported}\n"
+                        f"📊 התקדמות: {percent}%\n"
+                        f"⚡ קצב: {rate:.0f} פריטים/שנייה\n"
+                        f"⏱ זמן משוער לסיום: {format_duration(eta)}"
+                    )
+                except Exception as e:
+                    logger.debug(f"Failed to update import progress: {e}")
+            
+            imported_count, errors = await import_backup_file(data, collection_id, report_progress)
                 
         # Finish
-        context.user_data.pop("import_mode", None)
         active_collections[user_id] = collection_id
         
         await status_msg.edit_text(
@@ -176,6 +178,11 @@ async def process_imported_collection(message, context: ContextTypes.DEFAULT_TYP
             ])
         )
         
+    except BackupTooLargeError:
+        logger.warning(f"Import from user {user_id} rejected: backup inflates past {MAX_DECOMPRESSED_SIZE} bytes")
+        await status_msg.edit_text(
+            f"❌ קובץ הגיבוי גדול מדי לאחר פריסה (מעל {format_size(MAX_DECOMPRESSED_SIZE)})."
+        )
     except Exception as e:
         logger.exception("Import failed")
         await status_msg.edit_text(f"❌ שגיאה ביבוא הקובץ:\n{str(e)}")
@@ -197,36 +204,35 @@ async def handle_send_collection_confirmation(update: Update, context: ContextTy
         collection_id = data["collection_id"]
         
         # Double check access
-        is_allowed, _, collection = check_collection_access(message.from_user.id, collection_id)
+        is_allowed, _, collection = await check_collection_access(message.from_user.id, collection_id)
         if not is_allowed:
              await message.reply_text("❌ שגיאת הרשאה.")
              return True
              
-        status_msg = await message.reply_text(f"🚀 מאמת קוד... מתחיל שליחה של אוסף '{collection[1]}'.")
-        
-        # Start sending
-        # Get all items
-        items = db.get_items_by_collection(collection_id, limit=10000)
-        
-        media_visual, media_docs, text_items = prepare_media_groups(items)
-        
-        await status_msg.edit_text(f"📦 שולח {len(items)} פריטים...\n(זה ייקח קצת זמן)")
-        
-        await send_media_groups_in_chunks(context.bot, message.chat_id, media_visual, media_docs, text_items)
-        
-        await message.reply_text("✅ כל הפריטים נשלחו בהצלחה.")
-        
         msg_id_to_delete = data.get("msg_id") 
         
-        # Restore the collection page so user can continue browsing
-        await show_collection_page(
-             update=update, 
-             context=context, 
-             collection_id=collection_id, 
-             page=1, 
-             edit_message_id=msg_id_to_delete, # Verify function uses this to delete if force_resend is True
-             force_resend=True
+        async def restore_page(job):
+            # Restore the collection page so user can continue browsing
+            await show_collection_page(
+                 update=update, 
+                 context=context, 
+                 collection_id=collection_id, 
+                 page=1, 
+                 edit_message_id=msg_id_to_delete, # Verify function uses this to delete if force_resend is True
+                 force_resend=True
+            )
+        
+        # Runs in the background - progress and a cancel button are on the job's status message
+        job = await send_jobs.start(
+            context.bot, message.chat_id, message.from_user.id,
+            collection_id, collection[1], on_done=restore_page
         )
+        if job is None:
+            await send_scheduler.send(
+                message.chat_id,
+                lambda: message.reply_text("⏳ כבר מתבצעת שליחה של אוסף. עצור אותה או המתן לסיומה."),
+                method="send_message",
+            )
         return True
         
     elif "verify_send_collection" in context.user_data: # Incorrect code but mode active
@@ -247,9 +253,9 @@ async def handle_delete_confirmation(update: Update, context: ContextTypes.DEFAU
         collection_id = data["collection_id"]
         
         # Verify ownership/access again
-        is_allowed, _, collection = check_collection_access(message.from_user.id, collection_id)
+        is_allowed, _, collection = await check_collection_access(message.from_user.id, collection_id)
         if is_allowed:
-            db.delete_collection(collection_id)
+            await db.aio.delete_collection(collection_id)
             # Remove from active if needed
             if active_collections.get(message.from_user.id) == collection_id:
                 del active_collections[message.from_user.id]
@@ -288,7 +294,7 @@ async def activate_shared_collection(update: Update, context: ContextTypes.DEFAU
     Helper to activate shared collection access.
     Consolidates logic for both /access command and interactive flow.
     """
-    collection = db.get_collection_by_share_code(share_code)
+    collection = await db.aio.get_collection_by_share_code(share_code)
     user = update.effective_user
     
     if not collection:
@@ -302,7 +308,7 @@ async def activate_shared_collection(update: Update, context: ContextTypes.DEFAU
     
     # Store access
     active_shared_collections[user.id] = share_code
-    db.log_share_access(collection_id, user.id)
+    access_log.record(share_code, user.id)
     
     # Log share access event
     if ENABLE_ARCHIVING:
@@ -376,7 +382,7 @@ async def handle_item_delete_message(update: Update, context: ContextTypes.DEFAU
         return
 
     # Delete from DB
-    success = db.delete_item(collection_id, file_id)
+    success = await db.aio.delete_item(collection_id, file_id)
     
     keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton("🏁 סיום מחיקה", callback_data="back_to_main")]
@@ -398,9 +404,9 @@ async def handle_item_delete_message(update: Update, context: ContextTypes.DEFAU
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     # track_and_reset_user clears modes, which breaks flows like creating_collection_mode.
-    # We only want to upsert the user here.
+    # We only want to upsert the user here (write-behind, unchanged profiles are skipped).
     if user:
-        db.upsert_user(user.id, user.username, user.first_name, user.last_name)
+        user_tracker.track(user.id, user.username, user.first_name, user.last_name)
     message = update.message
     
     # 1. Handle flows that intercept messages
@@ -424,14 +430,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
              # Fetch item by ID
              try:
                  if hasattr(db, 'get_item_by_id'):
-                    item = db.get_item_by_id(target_id)
+                    item = await db.aio.get_item_by_id(target_id)
                     if item:
                         # Send file with "back to info list" button
                         page = context.user_data.get("info_page_page", 1)
                         info_page = context.user_data.get("info_page_info_page", 0)
+                        anchor_id = context.user_data.get("info_page_anchor_id", 0)
                         
                         back_button = InlineKeyboardMarkup([
-                            [InlineKeyboardButton("🔙 חזור לרשימת מידע", callback_data=f"back_to_info:{info_col_id}:{page}:{info_page}")]
+                            [InlineKeyboardButton("🔙 חזור לרשימת מידע", callback_data=f"back_to_info:{info_col_id}:{page}:{info_page}:{anchor_id}")]
                         ])
                         
                         # Send the file
@@ -502,37 +509,47 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await message.reply_text("סוג תוכן לא נתמך.")
         return
 
+    # Album parts are collected and saved together (see save_album)
+    if message.media_group_id:
+        album_aggregator.add(
+            (message.chat_id, message.media_group_id, collection_id),
+            (message, file_info),
+            lambda entries: save_album(entries, context, collection_id)
+        )
+        return
+
     content_type = file_info["content_type"]
     file_id = file_info["file_id"]
     text_content = file_info["text_content"]
     f_name = file_info["file_name"]
     f_size = file_info["file_size"]
 
-    # Add to DB
+    # Add to DB (batched with other concurrent uploads into one commit)
     try:
-        item_id = db.add_item(
-            collection_id, content_type, file_id, text_content, f_name, f_size
+        item_id = await item_writer.add_item(
+            collection_id, content_type, file_id, text_content, f_name, f_size,
+            origin_chat_id=message.chat_id, origin_message_id=message.message_id
         )
         # Verify collection name available
-        col_data = db.get_collection_by_id(collection_id)
+        col_data = await db.aio.get_collection_by_id(collection_id)
         col_name = col_data[1] if col_data else "Unknown"
         
-        # Archive to channels (async, non-blocking)
+        # Archive to channels (only queues the event, never waits on a send)
         if ENABLE_ARCHIVING:
-            asyncio.create_task(
-                archive_file_to_channels(
-                    bot=context.bot,
-                    item_id=item_id,
-                    file_id=file_id,
-                    content_type=content_type,
-                    user_id=user.id,
-                    collection_id=collection_id,
-                    collection_name=col_name,
-                    file_name=f_name,
-                    original_caption=text_content,
-                    user_name=user.full_name,
-                    username=user.username
-                )
+            await archive_file_to_channels(
+                bot=context.bot,
+                item_id=item_id,
+                file_id=file_id,
+                content_type=content_type,
+                user_id=user.id,
+                collection_id=collection_id,
+                collection_name=col_name,
+                file_name=f_name,
+                original_caption=text_content,
+                user_name=user.full_name,
+                username=user.username,
+                origin_chat_id=message.chat_id,
+                origin_message_id=message.message_id
             )
 
 
@@ -542,6 +559,49 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error adding item: {e}")
         await message.reply_text("שגיאה בשמירת הפריט.")
 
+async def save_album(entries: list, context: ContextTypes.DEFAULT_TYPE, collection_id: int):
+    """Save an album's items in one transaction, then archive, log and count them as one unit"""
+    entries.sort(key=lambda entry: entry[0].message_id)
+    last_message = entries[-1][0]
+    user = last_message.from_user
+    files = [
+        {
+            "content_type": info["content_type"],
+            "file_id": info["file_id"],
+            "text_content": info["text_content"],
+            "file_name": info["file_name"],
+            "file_size": info["file_size"],
+            "origin_chat_id": message.chat_id,
+            "origin_message_id": message.message_id,
+        }
+        for message, info in entries
+    ]
+
+    try:
+        item_ids = await item_writer.add_items(collection_id, files)
+        col_data = await db.aio.get_collection_by_id(collection_id)
+        col_name = col_data[1] if col_data else "Unknown"
+
+        if ENABLE_ARCHIVING:
+            await archive_album_to_channels(
+                bot=context.bot,
+                files=[
+                    {**f, "item_id": item_id, "original_caption": f["text_content"]}
+                    for f, item_id in zip(files, item_ids)
+                ],
+                user_id=user.id,
+                collection_id=collection_id,
+                collection_name=col_name,
+                user_name=user.full_name,
+                username=user.username
+            )
+
+        await update_batch_status(last_message, context, col_name, count=len(item_ids))
+
+    except Exception as e:
+        logger.error(f"Error adding album: {e}")
+        await last_message.reply_text("שגיאה בשמירת הפריטים.")
+
 async def handle_delete_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # This handler monitors deletions
     pass
@@ -0,0 +1,234 @@
+# ingest.py
+"""
+Item Ingestion Module
+
+Write-behind pipeline for saving uploaded items:
+1. Handlers enqueue item inserts and await the new item id
+2. A single writer task drains the queue and commits items in batches
+3. Each batch is one transaction (one fsync) instead of one per item
+
+Batches are bounded by size and by a few milliseconds of latency.
+
+Albums arrive as one update per item. AlbumAggregator holds the parts of a
+media group for a short window so the handler can save, archive, log and
+count the whole album as one unit.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+import db
+
+MAX_BATCH_SIZE = 200  # items per transaction
+MAX_BATCH_DELAY = 0.005  # seconds to wait for more items before committing
+ALBUM_WINDOW = 1.0  # seconds after an album's last part before it is processed
+ALBUM_MAX_ITEMS = 10  # Telegram albums hold at most 10 items
+
+logger = logging.getLogger(__name__)
+
+
+class ItemWriter:
+    """
+    Single-writer group-commit queue for item inserts.
+    The writer task is started lazily on the first enqueued item.
+    """
+
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_delay: float = MAX_BATCH_DELAY):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.batches_committed = 0
+        self.items_committed = 0
+
+    async def add_item(
+        self,
+        collection_id: int,
+        content_type: str,
+        file_id: Optional[str] = None,
+        text_content: Optional[str] = None,
+        file_name: Optional[str] = None,
+        file_size: Optional[int] = None,
+        origin_chat_id: Optional[int] = None,
+        origin_message_id: Optional[int] = None,
+    ) -> int:
+        """
+        Queue an item insert and wait for its id once the batch commits.
+        origin_chat_id/origin_message_id point at the user's message, for copy delivery.
+        """
+        added_at = datetime.now().isoformat()
+        row = (
+            collection_id, content_type, file_id, text_content, file_name, file_size, added_at,
+            origin_chat_id, origin_message_id
+        )
+        future = asyncio.get_running_loop().create_future()
+
+        self._ensure_writer()
+        self._queue.put_nowait((row, future))
+        return await future
+
+    async def add_items(self, collection_id: int, items: list[dict]) -> list[int]:
+        """
+        Insert related items (an album) in one transaction of their own and return their ids.
+        items: dicts with the add_item fields (content_type, file_id, text_content,
+        file_name, file_size, origin_chat_id, origin_message_id).
+        """
+        added_at = datetime.now().isoformat()
+        rows = [
+            (
+                collection_id, item["content_type"], item.get("file_id"), item.get("text_content"),
+                item.get("file_name"), item.get("file_size"), added_at,
+                item.get("origin_chat_id"), item.get("origin_message_id")
+            )
+            for item in items
+        ]
+        item_ids = await db.aio.add_items_batch(rows)
+        self.batches_committed += 1
+        self.items_committed += len(item_ids)
+        return item_ids
+
+    def _ensure_writer(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+
+            # Collect more items until the batch is full or the latency budget is spent
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: list):
+        rows = [row for row, _ in batch]
+        try:
+            item_ids = await db.aio.add_items_batch(rows)
+        except Exception as e:
+            if len(batch) == 1:
+                _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            # One bad row (e.g. collection deleted meanwhile) must not fail
+            # everybody else's items - retry them one by one.
+            logger.warning(f"Batch insert of {len(batch)} items failed, retrying individually: {e}")
+            for entry in batch:
+                await self._commit([entry])
+            return
+
+        self.batches_committed += 1
+        self.items_committed += len(item_ids)
+        for (_, future), item_id in zip(batch, item_ids):
+            if not future.done():
+                future.set_result(item_id)
+
+    async def close(self):
+        """Commit everything still queued and stop the writer task."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches_committed,
+            "items": self.items_committed,
+        }
+
+
+class AlbumAggregator:
+    """
+    Buffers the updates of one album (same chat and media_group_id) and hands
+    them to a callback once no new part arrived for ALBUM_WINDOW seconds, or
+    as soon as the album is full.
+    """
+
+    def __init__(self, window: float = ALBUM_WINDOW, max_items: int = ALBUM_MAX_ITEMS):
+        self.window = window
+        self.max_items = max_items
+        # key -> {"entries": [...], "on_complete": callback, "timer": TimerHandle}
+        self._albums: dict = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.albums_processed = 0
+        self.items_processed = 0
+
+    def add(self, key, entry, on_complete: Callable[[list], Awaitable[None]]):
+        """
+        Add one album part. on_complete(entries) is called once per album with
+        every part seen, in arrival order; the first part's callback is used.
+        """
+        album = self._albums.get(key)
+        if album is None:
+            album = self._albums[key] = {"entries": [], "on_complete": on_complete, "timer": None}
+        else:
+            album["timer"].cancel()
+        album["entries"].append(entry)
+
+        if len(album["entries"]) >= self.max_items:
+            self._complete(key)
+        else:
+            album["timer"] = asyncio.get_running_loop().call_later(self.window, self._complete, key)
+
+    def _complete(self, key):
+        album = self._albums.pop(key, None)
+        if album is None:
+            return
+        if album["timer"] is not None:
+            album["timer"].cancel()
+        self.albums_processed += 1
+        self.items_processed += len(album["entries"])
+        task = asyncio.create_task(album["on_complete"](album["entries"]))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Album processing failed: {task.exception()}")
+
+    async def close(self):
+        """Process every buffered album now and wait for all of them."""
+        for key in list(self._albums):
+            self._complete(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._albums),
+            "albums": self.albums_processed,
+            "items": self.items_processed,
+        }
+
+
+# Shared writer used by all handlers
+item_writer = ItemWriter()
+
+# Shared album buffer used by the upload handler
+album_aggregator = AlbumAggregator()
@@ -0,0 +1,156 @@
+# retention.py
+"""
+Access Log Retention Module
+
+Keeps shared_collection_access_log from growing forever:
+1. Rows older than ACCESS_LOG_RETENTION_DAYS are moved, in small batches,
+   into a side archive database as zlib-compressed chunks
+2. The archived rows are then deleted from the main database, one short
+   write transaction per batch so other writes are never held up for long
+3. Per-share and per-day totals live on in the rollup tables (they are
+   maintained on insert and never decremented)
+
+Runs in the background every RETENTION_INTERVAL seconds.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+import db
+
+# Retention settings
+ACCESS_LOG_RETENTION_DAYS = 90  # raw rows newer than this stay in the main DB
+RETENTION_INTERVAL = 6 * 60 * 60  # seconds between retention runs
+RETENTION_START_DELAY = 60  # seconds after startup before the first run
+RETENTION_BATCH_SIZE = 500  # rows archived and deleted per transaction
+RETENTION_BATCH_PAUSE = 0.05  # seconds between batches, lets other writers in
+
+ARCHIVE_DB_PATH = "access_log_archive.db"
+
+logger = logging.getLogger(__name__)
+
+
+def _archive_chunk(rows: list[tuple]):
+    """Append one compressed chunk of access log rows to the archive DB (blocking)."""
+    payload = zlib.compress(json.dumps(rows, separators=(",", ":")).encode("utf-8"), 9)
+    conn = sqlite3.connect(ARCHIVE_DB_PATH)
+    try:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS access_log_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_row_id INTEGER NOT NULL,
+            last_row_id INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            oldest_access TEXT NOT NULL,
+            newest_access TEXT NOT NULL,
+            archived_at TEXT NOT NULL,
+            payload BLOB NOT NULL,  -- zlib(JSON [[id, share_code, user_id, accessed_at], ...])
+            UNIQUE(first_row_id, last_row_id)
+        )
+        """)
+        # A chunk re-archived after a crash between archive and delete is ignored
+        conn.execute("""
+            INSERT OR IGNORE INTO access_log_chunks
+                (first_row_id, last_row_id, row_count, oldest_access, newest_access, archived_at, payload)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            min(row[0] for row in rows),
+            max(row[0] for row in rows),
+            len(rows),
+            rows[0][3],
+            rows[-1][3],
+            datetime.now().isoformat(),
+            payload,
+        ))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def read_archived_rows(share_code: Optional[str] = None) -> list[tuple]:
+    """Decompress archived rows, optionally only one share code's (blocking, for admin/debug use)."""
+    conn = sqlite3.connect(ARCHIVE_DB_PATH)
+    try:
+        chunks = conn.execute("SELECT payload FROM access_log_chunks ORDER BY id").fetchall()
+    except sqlite3.OperationalError:
+        return []  # nothing archived yet
+    finally:
+        conn.close()
+
+    rows = []
+    for (payload,) in chunks:
+        for row in json.loads(zlib.decompress(payload)):
+            if share_code is None or row[1] == share_code:
+                rows.append(tuple(row))
+    return rows
+
+
+class AccessLogRetention:
+    """Background job that archives and prunes old access log rows."""
+
+    def __init__(self, retention_days: int = ACCESS_LOG_RETENTION_DAYS, interval: float = RETENTION_INTERVAL):
+        self.retention_days = retention_days
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.archived = 0
+
+    async def run_once(self) -> int:
+        """Archive and delete every row older than the horizon. Returns rows moved."""
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        moved = 0
+
+        while True:
+            rows = await db.aio.get_expired_access_log_rows(cutoff, RETENTION_BATCH_SIZE)
+            if not rows:
+                break
+
+            # Archive first: a crash in between leaves rows in both places, never in neither
+            await asyncio.to_thread(_archive_chunk, rows)
+            await db.aio.delete_access_log_rows([row[0] for row in rows])
+            moved += len(rows)
+
+            if len(rows) < RETENTION_BATCH_SIZE:
+                break
+            await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+        self.runs += 1
+        self.archived += moved
+        if moved:
+            logger.info(f"Access log retention: archived {moved} row(s) older than {cutoff[:10]}")
+        return moved
+
+    async def _run(self):
+        await asyncio.sleep(RETENTION_START_DELAY)
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Access log retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the periodic job (call from the application's post_init)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "archived": self.archived}
+
+
+# Shared retention job
+access_log_retention = AccessLogRetention()
@@ -0,0 +1,345 @@
+# send_jobs.py
+"""
+Send Jobs Module
+
+Runs "send all items" requests and page sends as background jobs:
+1. Confirming a send-all (or a page send) starts a job and returns right away
+2. The job streams the collection (or the chosen items) in keyset chunks and
+   hands them to the delivery engine (bulk copy_messages, media groups as
+   fallback)
+3. One status message is edited with throttled progress (sent/total, rate,
+   ETA) and carries a cancel button
+
+One active job per user; the user's chat stays responsive meanwhile.
+
+Jobs are persisted in the send_jobs table and checkpointed after every
+chunk (last item id attempted + ids of items that failed). A job cut short
+by a restart resumes from its checkpoint on startup: the failed items are
+retried first, then sending continues after the last checkpointed item,
+so at most one chunk is sent twice.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+
+import db
+from delivery import deliver_items
+from send_scheduler import send_scheduler
+from utils import format_duration
+
+SEND_CHUNK_SIZE = 100  # items read from the DB per step (one copy_messages call at best)
+PROGRESS_INTERVAL = 3.0  # minimum seconds between status message edits
+
+logger = logging.getLogger(__name__)
+
+
+class SendJob:
+    """State of one background send job (a whole collection or a list of items)."""
+
+    def __init__(
+        self,
+        job_id: int,
+        user_id: int,
+        chat_id: int,
+        collection_id: int,
+        collection_name: str,
+        total: int,
+        item_ids: Optional[list[int]] = None,
+        compact: bool = False,
+    ):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.collection_id = collection_id
+        self.collection_name = collection_name
+        self.total = total
+        self.item_ids = sorted(item_ids) if item_ids is not None else None  # None = whole collection
+        self.compact = compact  # pack text items into as few messages as possible
+        self.sent = 0
+        self.failed_ids: list[int] = []
+        self.retry_ids: list[int] = []  # failed before a restart, sent again first
+        self.last_item_id = 0
+        self.status = "running"  # running / done / cancelled / failed
+        self.started = time.monotonic()
+        self.processed_at_start = 0
+        self.status_message_id: Optional[int] = None
+        self.cancel_event = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_row(cls, row: dict) -> "SendJob":
+        """Rebuild an interrupted job from its checkpoint (see db.get_unfinished_send_jobs)."""
+        job = cls(
+            row["job_id"], row["user_id"], row["chat_id"], row["collection_id"],
+            row["collection_name"], row["total"], row["item_ids"], row["compact"]
+        )
+        job.sent = row["sent"]
+        job.last_item_id = row["last_item_id"]
+        job.retry_ids = row["failed_item_ids"]
+        job.processed_at_start = job.sent + len(job.retry_ids)
+        return job
+
+    @property
+    def failed(self) -> int:
+        return len(self.failed_ids)
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed + len(self.retry_ids)
+
+    def cancel_markup(self) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton("⛔ עצור שליחה", callback_data=f"cancel_send_job:{self.job_id}")]
+        ])
+
+    def progress_text(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 0.001)
+        rate = (self.processed - self.processed_at_start) / elapsed
+        eta = (self.total - self.processed + len(self.retry_ids)) / rate if rate else 0
+        percent = self.processed * 100 // self.total if self.total else 100
+        text = (
+            f"📤 שולח את האוסף '{self.collection_name}'...\n\n"
+            f"✅ נשלחו: {self.sent}/{self.total} ({percent}%)\n"
+            f"⚡ קצב: {rate:.1f} פריטים/שנייה\n"
+            f"⏱ זמן משוער לסיום: {format_duration(eta)}"
+        )
+        if self.failed:
+            text += f"\n⚠️ נכשלו: {self.failed}"
+        return text
+
+
+# on_done(job) runs after the job finished (done, cancelled or failed)
+DoneCallback = Callable[[SendJob], Awaitable[None]]
+
+
+class SendJobManager:
+    """Starts, tracks and cancels send-all jobs."""
+
+    def __init__(self):
+        self._jobs: dict[int, SendJob] = {}
+        self._user_jobs: dict[int, Optional[int]] = {}  # user_id -> active job_id (None while starting)
+        self.api_calls = 0
+
+    def get_active_job(self, user_id: int) -> Optional[SendJob]:
+        job_id = self._user_jobs.get(user_id)
+        return self._jobs.get(job_id) if job_id else None
+
+    async def start(
+        self,
+        bot: Bot,
+        chat_id: int,
+        user_id: int,
+        collection_id: int,
+        collection_name: str,
+        on_done: Optional[DoneCallback] = None,
+        item_ids: Optional[list[int]] = None,
+        compact: bool = False,
+    ) -> Optional[SendJob]:
+        """
+        Start a send job for the whole collection, or only for item_ids.
+        compact=True packs text items (see delivery.deliver_items).
+        Returns None if the user already has one running (or starting).
+        If the job can't be started, nothing of it is left behind and the
+        error propagates.
+        """
+        if user_id in self._user_jobs:
+            return None
+        # Reserved before the first await, so two confirmations can't both start a job
+        self._user_jobs[user_id] = None
+
+        job = None
+        try:
+            if item_ids is None:
+                total = await db.aio.count_items_in_collection(collection_id)
+            else:
+                total = len(item_ids)
+            job_id = await db.aio.create_send_job(
+                user_id, chat_id, collection_id, collection_name, total, item_ids, compact
+            )
+            job = SendJob(job_id, user_id, chat_id, collection_id, collection_name, total, item_ids, compact)
+            await self._launch(bot, job, on_done)
+        except BaseException:
+            if job is None:
+                self._user_jobs.pop(user_id, None)
+            else:
+                self._forget(job)
+                try:
+                    await db.aio.finish_send_job(job.job_id)
+                except Exception as e:
+                    logger.error(f"Failed to remove send job {job.job_id} that could not start: {e}")
+            raise
+        return job
+
+    async def resume_all(self, bot: Bot) -> int:
+        """Resume the jobs a restart interrupted (call from the application's post_init)."""
+        resumed = 0
+        for row in await db.aio.get_unfinished_send_jobs():
+            if self.get_active_job(row["user_id"]):
+                await db.aio.finish_send_job(row["job_id"])
+                continue
+
+            job = SendJob.from_row(row)
+            # The old status message is buried in the chat by now - post a fresh one
+            if row["status_message_id"]:
+                try:
+                    await send_scheduler.send(
+                        job.chat_id,
+                        lambda: bot.delete_message(chat_id=job.chat_id, message_id=row["status_message_id"]),
+                        max_retries=0,
+                        method="delete_message",
+                    )
+                except Exception as e:
+                    logger.debug(f"Failed to delete old status of send job {job.job_id}: {e}")
+            try:
+                await self._launch(bot, job, None)
+            except Exception as e:
+                # Chat unreachable (bot blocked, chat deleted) - give up on the job
+                logger.warning(f"Could not resume send job {job.job_id}: {e}")
+                self._forget(job)
+                await db.aio.finish_send_job(job.job_id)
+                continue
+            resumed += 1
+
+        if resumed:
+            logger.info(f"Resumed {resumed} interrupted send job(s)")
+        return resumed
+
+    async def _launch(self, bot: Bot, job: SendJob, on_done: Optional[DoneCallback]):
+        self._jobs[job.job_id] = job
+        self._user_jobs[job.user_id] = job.job_id
+
+        status = await send_scheduler.send(
+            job.chat_id,
+            lambda: bot.send_message(chat_id=job.chat_id, text=job.progress_text(), reply_markup=job.cancel_markup()),
+            method="send_message",
+        )
+        job.status_message_id = status.message_id
+        await db.aio.set_send_job_status_message(job.job_id, job.status_message_id)
+
+        job.task = asyncio.create_task(self._run(bot, job, on_done))
+
+    def _forget(self, job: SendJob):
+        self._user_jobs.pop(job.user_id, None)
+        self._jobs.pop(job.job_id, None)
+
+    def cancel(self, job_id: int, user_id: int) -> bool:
+        """Ask a job to stop after the current album. Only its owner may cancel."""
+        job = self._jobs.get(job_id)
+        if not job or job.user_id != user_id or job.status != "running":
+            return False
+        job.cancel_event.set()
+        return True
+
+    async def _run(self, bot: Bot, job: SendJob, on_done: Optional[DoneCallback]):
+        last_progress = time.monotonic()
+        try:
+            # Items that failed before a restart go first
+            while job.retry_ids and not job.cancel_event.is_set():
+                chunk_ids = job.retry_ids[:SEND_CHUNK_SIZE]
+                items = await db.aio.get_items_by_ids(job.collection_id, chunk_ids)
+                await self._send_chunk(bot, job, items)
+                del job.retry_ids[:len(chunk_ids)]
+                await self._checkpoint(job)
+
+            while not job.cancel_event.is_set():
+                items, chunk_last_id = await self._next_chunk(job)
+                if chunk_last_id is None:
+                    break
+
+                await self._send_chunk(bot, job, items)
+                job.last_item_id = chunk_last_id
+                await self._checkpoint(job)
+
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = now
+                    await self._edit_status(bot, job, job.progress_text(), job.cancel_markup())
+
+            job.status = "cancelled" if job.cancel_event.is_set() else "done"
+        except asyncio.CancelledError:
+            # Shutdown: the checkpoint stays in the DB and the job resumes on startup
+            job.status = "cancelled"
+            self._forget(job)
+            raise
+        except Exception as e:
+            logger.error(f"Send job {job.job_id} failed: {e}")
+            job.status = "failed"
+
+        self._forget(job)
+        try:
+            await db.aio.finish_send_job(job.job_id)
+        except Exception as e:
+            logger.error(f"Failed to remove finished send job {job.job_id}: {e}")
+
+        await self._edit_status(bot, job, self._final_text(job))
+        if on_done:
+            try:
+                await on_done(job)
+            except Exception as e:
+                logger.error(f"Send job {job.job_id} completion callback failed: {e}")
+
+    async def _next_chunk(self, job: SendJob) -> tuple[list, Optional[int]]:
+        """Next items after the checkpoint and the id to checkpoint after them (None when done)."""
+        if job.item_ids is None:
+            items = await db.aio.get_items_after_id(job.collection_id, job.last_item_id, SEND_CHUNK_SIZE)
+            return items, (items[-1][0] if items else None)
+
+        chunk_ids = [item_id for item_id in job.item_ids if item_id > job.last_item_id][:SEND_CHUNK_SIZE]
+        if not chunk_ids:
+            return [], None
+        # Items deleted since the job started are simply skipped
+        return await db.aio.get_items_by_ids(job.collection_id, chunk_ids), chunk_ids[-1]
+
+    async def _checkpoint(self, job: SendJob):
+        await db.aio.checkpoint_send_job(job.job_id, job.last_item_id, job.sent, job.failed_ids + job.retry_ids)
+
+    async def _send_chunk(self, bot: Bot, job: SendJob, items: list):
+        result = await deliver_items(bot, job.chat_id, items, job.cancel_event, job.compact)
+        job.sent += len(result.sent_ids)
+        job.failed_ids.extend(result.failed_ids)
+        self.api_calls += result.api_calls
+
+    async def _edit_status(self, bot: Bot, job: SendJob, text: str, reply_markup=None):
+        try:
+            await send_scheduler.send(
+                job.chat_id,
+                lambda: bot.edit_message_text(
+                    chat_id=job.chat_id,
+                    message_id=job.status_message_id,
+                    text=text,
+                    reply_markup=reply_markup
+                ),
+                method="edit_message_text",
+            )
+        except Exception as e:
+            logger.debug(f"Failed to update send job {job.job_id} status: {e}")
+
+    def _final_text(self, job: SendJob) -> str:
+        elapsed = format_duration(time.monotonic() - job.started)
+        if job.status == "done":
+            text = f"✅ נשלחו {job.sent} פריטים מהאוסף '{job.collection_name}' ({elapsed})."
+        elif job.status == "cancelled":
+            text = f"⛔ השליחה בוטלה. נשלחו {job.sent} מתוך {job.total} פריטים."
+        else:
+            text = f"❌ השליחה נעצרה בשל שגיאה. נשלחו {job.sent} מתוך {job.total} פריטים."
+        if job.failed:
+            text += f"\n⚠️ {job.failed} פריטים לא נשלחו."
+        return text
+
+    async def shutdown(self):
+        """Stop all running jobs (call on shutdown); they resume from their checkpoints on startup."""
+        tasks = [job.task for job in self._jobs.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"active": len(self._jobs), "api_calls": self.api_calls}
+
+
+# Shared job manager used by all handlers
+send_jobs = SendJobManager()
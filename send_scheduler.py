@@ -0,0 +1,242 @@
+# send_scheduler.py
+"""
+Send Scheduler Module
+
+Paces outgoing Telegram sends with token buckets instead of fixed sleeps:
+1. A global bucket keeps the bot under Telegram's overall message rate
+2. A bucket per chat keeps each chat under its own limit
+3. A RetryAfter from Telegram blocks that chat's bucket for the requested
+   time and halves its rate; sustained success slowly raises it again
+
+send_scheduler.send() is also the shared retry engine for every outgoing
+Telegram call (media groups, copies, text items, archive/activity channels):
+- RetryAfter is caught by type and retried after the server's retry_after
+- network errors and timeouts are retried with jittered exponential backoff,
+  limited by a global retry budget so an outage can't turn into a retry storm
+- everything else (BadRequest, Forbidden, ...) fails at once
+Outcomes are counted per API method (see stats()).
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+# Global budget (Telegram allows ~30 messages/second per bot)
+GLOBAL_RATE = 25.0  # tokens per second
+GLOBAL_BURST = 30.0
+
+# Per-chat budgets (private chats tolerate ~1 message/second,
+# groups and channels ~20 messages/minute)
+PRIVATE_CHAT_RATE = 1.0
+PRIVATE_CHAT_MAX_RATE = 2.0
+GROUP_CHAT_RATE = 0.33
+GROUP_CHAT_MAX_RATE = 0.5
+CHAT_BURST = 3.0
+MIN_RATE = 0.05  # floor after repeated RetryAfter
+
+RATE_INCREASE = 0.05  # tokens/second added back after each successful send
+RATE_DECREASE = 0.5  # multiplier applied on RetryAfter
+
+# A media group is several messages for Telegram's limits
+MEDIA_GROUP_ITEM_COST = 0.3
+# copy_messages is one request that re-posts existing messages server-side;
+# a full 100-message batch costs 5 tokens rather than 30
+COPY_MESSAGES_ITEM_COST = 0.05
+
+# Retry policy
+MAX_RETRIES = 3  # retries per send (RetryAfter and transient errors)
+BACKOFF_BASE = 1.0  # seconds before the first retry of a network error
+BACKOFF_MAX = 30.0
+RETRY_BUDGET_MAX = 20.0  # transient-error retries available at once
+RETRY_BUDGET_RATIO = 0.1  # budget earned back per successful send
+IDLE_BUCKET_TTL = 600  # seconds before an unused chat bucket is dropped
+MAX_CHAT_BUCKETS = 1000
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Token bucket with an adjustable rate and a hard block for RetryAfter."""
+
+    def __init__(self, rate: float, burst: float, max_rate: Optional[float] = None):
+        self.rate = rate
+        self.max_rate = max_rate or rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, cost: float) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now)."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        # Costs above the burst size are allowed once the bucket is full
+        needed = min(cost, self.burst)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, cost: float):
+        self.tokens -= cost
+
+    def penalize(self, retry_after: float):
+        """Telegram asked us to back off: block, empty and slow down."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.tokens = 0.0
+        self.rate = max(MIN_RATE, self.rate * RATE_DECREASE)
+
+    def reward(self):
+        self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+
+
+def is_transient(error: Exception) -> bool:
+    """Network errors and timeouts are worth retrying; BadRequest (a NetworkError subclass) is not."""
+    return isinstance(error, NetworkError) and not isinstance(error, BadRequest)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class SendScheduler:
+    """Global + per-chat token buckets and the retry policy shared by all senders."""
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._last_used: dict[int, float] = {}
+        self.sent = 0
+        self.retry_afters = 0
+        self.waited = 0.0
+        self.retry_budget = RETRY_BUDGET_MAX
+        self.budget_exhausted = 0
+        # method -> {"ok", "failed", "retry_after", "retried"}
+        self.method_stats: dict[str, dict[str, int]] = defaultdict(
+            lambda: {"ok": 0, "failed": 0, "retry_after": 0, "retried": 0}
+        )
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._prune()
+            if chat_id > 0:
+                bucket = TokenBucket(PRIVATE_CHAT_RATE, CHAT_BURST, PRIVATE_CHAT_MAX_RATE)
+            else:
+                bucket = TokenBucket(GROUP_CHAT_RATE, CHAT_BURST, GROUP_CHAT_MAX_RATE)
+            self._chat_buckets[chat_id] = bucket
+        self._last_used[chat_id] = time.monotonic()
+        return bucket
+
+    def _prune(self):
+        cutoff = time.monotonic() - IDLE_BUCKET_TTL
+        for chat_id in [c for c, used in self._last_used.items() if used < cutoff]:
+            self._chat_buckets.pop(chat_id, None)
+            self._last_used.pop(chat_id, None)
+
+    async def acquire(self, chat_id: int, cost: float = 1.0):
+        """Wait until both the chat and the global budget allow a send."""
+        bucket = self._bucket(chat_id)
+        while True:
+            delay = max(bucket.delay_for(cost), self.global_bucket.delay_for(1.0))
+            if delay <= 0:
+                bucket.consume(cost)
+                self.global_bucket.consume(1.0)
+                return
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+    def _spend_retry_budget(self) -> bool:
+        if self.retry_budget < 1.0:
+            self.budget_exhausted += 1
+            return False
+        self.retry_budget -= 1.0
+        return True
+
+    async def send(
+        self,
+        chat_id: int,
+        send_func: Callable[[], Awaitable[T]],
+        cost: float = 1.0,
+        max_retries: int = MAX_RETRIES,
+        method: str = "send",
+    ) -> T:
+        """
+        Run send_func() once the budgets allow it, retrying per the module's policy.
+        RetryAfter penalizes the chat's bucket, so the retry waits out retry_after;
+        transient errors back off with jitter while the retry budget lasts. The
+        last error propagates. `method` names the API call in the metrics.
+        """
+        bucket = self._bucket(chat_id)
+        metrics = self.method_stats[method]
+        attempt = 0
+        while True:
+            await self.acquire(chat_id, cost)
+            try:
+                result = await send_func()
+            except RetryAfter as e:
+                self.retry_afters += 1
+                metrics["retry_after"] += 1
+                retry_after = float(e.retry_after)
+                bucket.penalize(retry_after)
+                logger.warning(f"RetryAfter {retry_after:.0f}s for chat {chat_id}, rate now {bucket.rate:.2f}/s")
+                if attempt >= max_retries:
+                    metrics["failed"] += 1
+                    raise
+                attempt += 1
+                metrics["retried"] += 1
+                continue
+            except Exception as e:
+                if not is_transient(e) or attempt >= max_retries or not self._spend_retry_budget():
+                    metrics["failed"] += 1
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"{method} to chat {chat_id} failed ({e}), retrying in {delay:.1f}s")
+                attempt += 1
+                metrics["retried"] += 1
+                await asyncio.sleep(delay)
+                continue
+            bucket.reward()
+            self.sent += 1
+            self.retry_budget = min(RETRY_BUDGET_MAX, self.retry_budget + RETRY_BUDGET_RATIO)
+            metrics["ok"] += 1
+            return result
+
+    def media_group_cost(self, media: list) -> float:
+        return self.batch_cost(len(media))
+
+    def copy_messages_cost(self, count: int) -> float:
+        return self.batch_cost(count, COPY_MESSAGES_ITEM_COST)
+
+    def batch_cost(self, count: int, item_cost: float = MEDIA_GROUP_ITEM_COST) -> float:
+        """Cost of one call that delivers `count` messages at once."""
+        return max(1.0, count * item_cost)
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retry_afters": self.retry_afters,
+            "waited_seconds": round(self.waited, 1),
+            "chats": len(self._chat_buckets),
+            "retry_budget": round(self.retry_budget, 1),
+            "budget_exhausted": self.budget_exhausted,
+            "methods": {method: dict(counts) for method, counts in self.method_stats.items()},
+        }
+
+
+# Shared scheduler used by all senders
+send_scheduler = SendScheduler()
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import sys
+import types
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import RetryAfter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py holds the bot token and is not part of the repository
+try:
+    import config  # noqa: F401
+except ImportError:
+    config = types.ModuleType("config")
+    config.BOT_TOKEN = "0:test"
+    config.ADMIN_IDS = [1]
+    config.MAX_CAPTION_LENGTH = 800
+    config.is_admin = lambda user_id: user_id in config.ADMIN_IDS
+    sys.modules["config"] = config
+
+import db  # noqa: E402
+from send_scheduler import send_scheduler  # noqa: E402
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point db at a fresh SQLite file for one test."""
+    db.close_pool()
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    db.init_db()
+    yield db
+    db.close_pool()
+
+
+@pytest.fixture
+def no_pacing(monkeypatch):
+    """Let sends through at once; the token buckets are not under test."""
+    async def acquire(chat_id, cost=1.0):
+        pass
+    monkeypatch.setattr(send_scheduler, "acquire", acquire)
+
+
+ORIGIN_CHAT_ID = 500
+
+
+def add_items(db, count, content_type="photo"):
+    """
+    Save count items with their origin messages into a new collection.
+    Returns (collection_id, item tuples as db.get_items_by_collection reads them);
+    item i has file_id f"file{i}" and origin message 10 + i in ORIGIN_CHAT_ID.
+    """
+    collection_id = db.create_collection("c", 1)
+    rows = [
+        (collection_id, content_type, f"file{i}", None, None, 1, "2024-01-01", ORIGIN_CHAT_ID, 10 + i)
+        for i in range(count)
+    ]
+    item_ids = db.add_items_batch(rows)
+    items = [
+        (item_id, content_type, f"file{i}", None, None, 1, "2024-01-01")
+        for i, item_id in enumerate(item_ids)
+    ]
+    return collection_id, items
+
+
+class FakeBot:
+    """
+    Records Bot API calls as (method, detail) in `calls`.
+
+    missing: origin message ids copy_messages silently skips
+    failures: method -> exceptions raised by its next calls, in order
+    down: answer every call with a flood wait
+    Calls block while `gate` is cleared.
+    """
+
+    username = "test_bot"
+
+    def __init__(self, missing=(), failures=None, down=False):
+        self.missing = set(missing)
+        self.failures = {method: list(errors) for method, errors in (failures or {}).items()}
+        self.down = down
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.calls = []
+        self.sent = []  # (chat_id, text) of every send_message
+        self._next_message_id = 1000
+
+    @property
+    def methods(self):
+        return [method for method, _ in self.calls]
+
+    async def _call(self, method, detail):
+        await self.gate.wait()
+        if self.down:
+            raise RetryAfter(0)
+        if self.failures.get(method):
+            raise self.failures[method].pop(0)
+        self.calls.append((method, detail))
+
+    def _message(self):
+        self._next_message_id += 1
+        return SimpleNamespace(message_id=self._next_message_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("send_message", text)
+        self.sent.append((chat_id, text))
+        return self._message()
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        await self._call("edit_message_text", text)
+
+    async def delete_message(self, chat_id, message_id):
+        await self._call("delete_message", message_id)
+        return True
+
+    async def delete_messages(self, chat_id, message_ids):
+        await self._call("delete_messages", len(message_ids))
+        return True
+
+    async def copy_messages(self, chat_id, from_chat_id, message_ids, **kwargs):
+        await self._call("copy_messages", len(message_ids))
+        return [self._message() for m in message_ids if m not in self.missing]
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        await self._call("send_media_group", len(media))
+        return [self._message() for _ in media]
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        await self._call("send_photo", caption)
+        return self._message()
+
+    async def send_document(self, chat_id, document, caption=None, **kwargs):
+        await self._call("send_document", caption)
+        return self._message()
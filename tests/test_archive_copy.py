@@ -0,0 +1,58 @@
+import asyncio
+
+from archive_logger import _copy_to_archive_channel
+from conftest import ORIGIN_CHAT_ID, FakeBot, add_items
+
+CHANNEL = -100123
+
+
+def _events(db, count):
+    collection_id, items = add_items(db, count)
+    return [
+        {
+            "action": "ARCHIVE_COPY", "item_id": item[0],
+            "origin_chat_id": ORIGIN_CHAT_ID, "origin_message_id": 10 + i,
+            "file_id": item[2], "content_type": "photo", "file_name": None,
+            "caption": f"meta {item[0]}", "user_id": 1, "collection_id": collection_id,
+        }
+        for i, item in enumerate(items)
+    ]
+
+
+def test_full_copy_records_every_item(temp_db, no_pacing):
+    events = _events(temp_db, 3)
+    bot = FakeBot()
+
+    asyncio.run(_copy_to_archive_channel(bot, CHANNEL, events))
+
+    assert bot.calls == [("copy_messages", 3)]
+    for event in events:
+        assert len(temp_db.get_archive_info(event["item_id"])) == 1
+
+
+def test_short_copy_backs_up_only_missing_files_one_by_one(temp_db, no_pacing):
+    events = _events(temp_db, 3)
+    bot = FakeBot(missing={10})
+
+    asyncio.run(_copy_to_archive_channel(bot, CHANNEL, events))
+
+    assert bot.calls == [
+        ("copy_messages", 3), ("delete_messages", 2), ("copy_messages", 1), ("copy_messages", 2),
+        ("send_photo", events[0]["caption"]),
+    ]
+    for event in events:
+        assert len(temp_db.get_archive_info(event["item_id"])) == 1
+
+
+def test_outage_keeps_events_and_retry_skips_backed_up_files(temp_db, no_pacing):
+    events = _events(temp_db, 3)
+
+    kept = asyncio.run(_copy_to_archive_channel(FakeBot(down=True), CHANNEL, events))
+    assert kept == [0, 1, 2]
+    assert all(not temp_db.get_archive_info(event["item_id"]) for event in events)
+
+    # The first file made it before the outage; the retry only copies the rest
+    temp_db.save_archive_info_batch([(events[0]["item_id"], CHANNEL, 1)])
+    bot = FakeBot()
+    assert asyncio.run(_copy_to_archive_channel(bot, CHANNEL, events)) == []
+    assert bot.calls == [("copy_messages", 2)]
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+import archive_logger
+from archive_logger import (
+    ADMIN_ACTIVITY_CHANNEL, ArchiveDigest, ChannelWorker,
+    close_archive_workers, log_activity, start_archive_workers,
+)
+from conftest import FakeBot
+
+
+@pytest.fixture
+def workers(temp_db, no_pacing, monkeypatch):
+    """Fresh module-level workers, as after a process start."""
+    def install(high_water_mark=archive_logger.HIGH_WATER_MARK):
+        activity = ChannelWorker(
+            ADMIN_ACTIVITY_CHANNEL, archive_logger._send_activity_events, high_water_mark=high_water_mark
+        )
+        monkeypatch.setattr(archive_logger, "_activity_worker", activity)
+        monkeypatch.setattr(archive_logger, "_archive_digest", ArchiveDigest(activity))
+        monkeypatch.setattr(archive_logger, "_archive_workers", [])
+        return activity
+    return install
+
+
+async def _wait_until_drained(worker, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while worker.depth and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def _queue_then_shut_down(bot, count):
+    for i in range(count):
+        await log_activity(bot, "SHARE_CREATED", user_id=i, collection_id=1)
+    await close_archive_workers()
+
+
+def test_queued_events_survive_shutdown(workers, temp_db):
+    workers()
+    bot = FakeBot()
+    asyncio.run(_queue_then_shut_down(bot, 3))
+
+    depth, oldest = temp_db.get_archive_queue_depth(ADMIN_ACTIVITY_CHANNEL)
+    assert depth == 3
+    assert oldest is not None
+    assert bot.sent == []
+
+
+def test_restart_sends_and_deletes_queued_events(workers, temp_db):
+    workers()
+    asyncio.run(_queue_then_shut_down(FakeBot(), 3))
+
+    activity = workers()  # new process
+    bot = FakeBot()
+
+    async def restart():
+        await start_archive_workers(bot)
+        assert activity.depth == 3
+        await _wait_until_drained(activity)
+        await close_archive_workers()
+
+    asyncio.run(restart())
+
+    assert len(bot.sent) == 3
+    assert all(chat_id == ADMIN_ACTIVITY_CHANNEL for chat_id, _ in bot.sent)
+    assert temp_db.get_archive_queue_depth(ADMIN_ACTIVITY_CHANNEL)[0] == 0
+    assert activity.stats()["processed"] == 3
+
+
+def test_low_priority_events_shed_above_high_water(workers, temp_db, monkeypatch):
+    activity = workers(high_water_mark=3)
+    monkeypatch.setattr(archive_logger, "DIGEST_MODE", False)
+    bot = FakeBot()
+    bot.gate.clear()  # the channel is stuck, nothing drains
+
+    async def flood():
+        for i in range(3):
+            await log_activity(bot, "SHARE_CREATED", user_id=i, collection_id=1)
+        await asyncio.sleep(0.05)
+
+        # Dropped outright
+        await log_activity(bot, "FILE_SAVED", user_id=1, collection_id=1)
+        # Coalesced into a digest instead of queued one by one
+        for item_id in (10, 11):
+            await archive_logger.archive_file_to_channels(
+                bot, item_id, "file", "photo", user_id=1, collection_id=1, collection_name="c"
+            )
+        stats = archive_logger.get_archive_stats()
+        await close_archive_workers()
+        return stats
+
+    stats = asyncio.run(flood())
+
+    assert activity.is_above_high_water()
+    assert stats["activity"]["depth"] == 3
+    assert stats["activity"]["dropped"] == 1
+    assert stats["activity"]["oldest_age_seconds"] >= 0
+    assert stats["digest"] == {"open": 1, "events": 2, "emitted": 0}
+    assert bot.sent == []
+
+
+def test_outage_keeps_events_queued(workers, temp_db, monkeypatch):
+    activity = workers()
+    monkeypatch.setattr(archive_logger, "OUTAGE_BACKOFF_BASE", 0.01)
+    bot = FakeBot()
+    bot.down = True
+
+    async def outage_then_recovery():
+        for i in range(3):
+            await log_activity(bot, "SHARE_CREATED", user_id=i, collection_id=1)
+        while not activity.deferred:
+            await asyncio.sleep(0.01)
+        during = temp_db.get_archive_queue_depth(ADMIN_ACTIVITY_CHANNEL)[0]
+        bot.down = False
+        await _wait_until_drained(activity)
+        await close_archive_workers()
+        return during
+
+    assert asyncio.run(outage_then_recovery()) == 3
+    assert len(bot.sent) == 3
+    assert temp_db.get_archive_queue_depth(ADMIN_ACTIVITY_CHANNEL)[0] == 0
+    assert activity.stats()["failed"] == 0
@@ -0,0 +1,57 @@
+import asyncio
+import gzip
+import io
+
+import pytest
+
+import backup
+from backup import (
+    BackupTooLargeError, decompress_to_tempfile, export_size, import_backup_file, write_collection_export,
+)
+
+
+def _gzip(data: bytes) -> io.BytesIO:
+    return io.BytesIO(gzip.compress(data))
+
+
+def test_decompress_within_limit():
+    data = b"# COLLECTION EXPORT: c\n" + b"text|None|x||0\n" * 1000
+    with decompress_to_tempfile(_gzip(data), max_size=len(data)) as out:
+        assert out.read() == data
+
+
+def test_decompress_stops_past_limit():
+    bomb = _gzip(b"\0" * (5 * 1024 * 1024))
+    with pytest.raises(BackupTooLargeError):
+        decompress_to_tempfile(bomb, max_size=1024 * 1024)
+
+
+def test_export_size_is_the_uploaded_size(temp_db):
+    collection_id = temp_db.create_collection("c", 1)
+    temp_db.add_items_batch([
+        (collection_id, "text", None, f"note {i}", None, 0, "2024-01-01", None, None) for i in range(50)
+    ])
+
+    export_file, count = write_collection_export(collection_id, "c", compress=True)
+    with export_file:
+        size = export_size(export_file)
+        assert count == 50
+        assert size == len(export_file.read())
+
+
+def test_import_reads_in_batches(temp_db, monkeypatch):
+    monkeypatch.setattr(backup, "IMPORT_BATCH_SIZE", 7)
+    source_id = temp_db.create_collection("source", 1)
+    temp_db.add_items_batch([
+        (source_id, "text", None, f"note {i}", None, 0, "2024-01-01", None, None) for i in range(20)
+    ])
+    export_file, _ = write_collection_export(source_id, "source")
+    data = io.BytesIO(export_file.read() + b"\xff\xfe|broken\n")
+    export_file.close()
+    data.readline()  # the header is the caller's
+    target_id = temp_db.create_collection("target", 1)
+
+    imported, errors = asyncio.run(import_backup_file(data, target_id))
+
+    assert (imported, errors) == (20, 1)
+    assert temp_db.count_items_in_collection(target_id) == 20
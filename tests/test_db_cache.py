@@ -0,0 +1,32 @@
+import contextlib
+
+import db
+
+
+def test_put_skipped_after_invalidation():
+    cache = db.LRUCache()
+    generation = cache.generation
+    cache.invalidate("code")
+    cache.put("code", (1, "c", 1), generation)
+    assert cache.get("code") is db._MISSING
+    assert cache.stats()["stale_puts"] == 1
+
+
+def test_revoke_during_share_code_read_is_not_cached(temp_db, monkeypatch):
+    collection_id = db.create_collection("c", 1)
+    code = db.create_share_link(collection_id, 1)
+    db._share_code_cache.clear()
+    original = db.db_transaction
+
+    @contextlib.contextmanager
+    def revoke_after_query(commit=True):
+        # The row is read, then the revoke commits before it is cached
+        with original(commit) as conn_cur:
+            yield conn_cur
+        monkeypatch.setattr(db, "db_transaction", original)
+        db.revoke_share_code(collection_id, 1)
+
+    monkeypatch.setattr(db, "db_transaction", revoke_after_query)
+
+    assert db.get_collection_by_share_code(code)[0] == collection_id
+    assert db.get_collection_by_share_code(code) is None
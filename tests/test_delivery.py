@@ -0,0 +1,46 @@
+import asyncio
+
+from telegram.error import BadRequest
+
+from conftest import FakeBot, add_items
+from delivery import deliver_items
+
+
+def test_full_copy_marks_run_sent(temp_db, no_pacing):
+    _, items = add_items(temp_db, 5)
+    bot = FakeBot()
+
+    result = asyncio.run(deliver_items(bot, 42, items))
+
+    assert bot.calls == [("copy_messages", 5)]
+    assert result.sent_ids == [item[0] for item in items]
+    assert result.failed_ids == []
+
+
+def test_short_copy_isolates_missing_originals(temp_db, no_pacing):
+    _, items = add_items(temp_db, 5)
+    bot = FakeBot(missing={10})
+
+    result = asyncio.run(deliver_items(bot, 42, items))
+
+    # 4 of 5 came back: delete them, then copy each half again
+    assert bot.calls == [
+        ("copy_messages", 5), ("delete_messages", 4),
+        ("copy_messages", 2), ("delete_messages", 1), ("copy_messages", 1), ("copy_messages", 1),
+        ("copy_messages", 3),
+        ("send_photo", None),
+    ]
+    assert result.skipped == 1
+    assert sorted(result.sent_ids) == [item[0] for item in items]
+    assert result.failed_ids == []
+
+
+def test_undeletable_partial_copy_resends_run_from_file_ids(temp_db, no_pacing):
+    _, items = add_items(temp_db, 5)
+    bot = FakeBot(missing={10}, failures={"delete_messages": [BadRequest("Message can't be deleted")]})
+
+    result = asyncio.run(deliver_items(bot, 42, items))
+
+    assert bot.calls == [("copy_messages", 5), ("send_media_group", 5)]
+    assert result.skipped == 1
+    assert sorted(result.sent_ids) == [item[0] for item in items]
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from telegram.error import Forbidden, RetryAfter
+
+from conftest import FakeBot, add_items
+from send_jobs import SendJobManager
+from send_scheduler import send_scheduler
+
+
+def test_job_status_messages_go_through_the_scheduler(temp_db, no_pacing):
+    collection_id, _ = add_items(temp_db, 3)
+    # The first status message hits a flood wait
+    bot = FakeBot(failures={"send_message": [RetryAfter(0)]})
+    retried_before = send_scheduler.method_stats["send_message"]["retried"]
+
+    async def run():
+        job = await SendJobManager().start(bot, 42, 1, collection_id, "c")
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+
+    assert job.status == "done"
+    assert job.sent == 3
+    assert bot.methods == ["send_message", "copy_messages", "edit_message_text"]
+    assert send_scheduler.method_stats["send_message"]["retried"] == retried_before + 1
+    assert temp_db.get_unfinished_send_jobs() == []
+
+
+def test_failed_start_leaves_no_job_behind(temp_db, no_pacing):
+    collection_id = temp_db.create_collection("c", 1)
+    manager = SendJobManager()
+
+    # The user blocked the bot before the status message went out
+    blocked = FakeBot(failures={"send_message": [Forbidden("Forbidden: bot was blocked by the user")]})
+
+    with pytest.raises(Forbidden):
+        asyncio.run(manager.start(blocked, 42, 1, collection_id, "c"))
+
+    assert manager.get_active_job(1) is None
+    assert temp_db.get_unfinished_send_jobs() == []
+    # The user can try again
+    job = asyncio.run(manager.start(FakeBot(), 42, 1, collection_id, "c"))
+    assert job is not None
+
+
+def test_concurrent_confirmations_start_one_job(temp_db, no_pacing):
+    collection_id = temp_db.create_collection("c", 1)
+    manager = SendJobManager()
+
+    async def confirm_twice():
+        jobs = await asyncio.gather(
+            manager.start(FakeBot(), 42, 1, collection_id, "c"),
+            manager.start(FakeBot(), 42, 1, collection_id, "c"),
+        )
+        for job in jobs:
+            if job:
+                await job.task
+        return jobs
+
+    jobs = asyncio.run(confirm_twice())
+
+    assert sum(job is not None for job in jobs) == 1
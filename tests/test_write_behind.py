@@ -0,0 +1,36 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import db
+from write_behind import AccessLogBuffer, WriteBehindBuffer
+
+
+def test_base_buffer_is_abstract():
+    with pytest.raises(TypeError):
+        WriteBehindBuffer()
+
+
+def test_failed_row_fallback_restores_only_unwritten_rows(monkeypatch):
+    written = []
+
+    async def log_share_access_batch(rows):
+        if len(rows) > 1:
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        if rows[0][0] == "gone":
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        if rows[0][0] == "locked":
+            raise sqlite3.OperationalError("database is locked")
+        written.append(rows[0])
+
+    monkeypatch.setattr(db.aio, "log_share_access_batch", log_share_access_batch, raising=False)
+    buffer = AccessLogBuffer()
+    buffer._pending = [("a", 1, "t"), ("gone", 1, "t"), ("locked", 1, "t"), ("b", 1, "t")]
+
+    asyncio.run(buffer.flush())
+
+    assert written == [("a", 1, "t")]
+    assert buffer._pending == [("locked", 1, "t"), ("b", 1, "t")]
+    assert buffer.dropped == 1
+    assert buffer.written == 1
@@ -12,15 +12,33 @@ from telegram import (
     InputMediaVideo,
     InputMediaPhoto,
     InputMediaDocument,
+    InputMediaAudio,
 )
 from telegram.ext import ContextTypes
 from telegram.error import NetworkError
 import db
 from config import ADMIN_IDS, is_admin
+from write_behind import user_tracker
+from send_scheduler import send_scheduler
+from batch_status import batch_status_ticker
 from constants import MSG_NO_COLLECTIONS, active_collections, active_shared_collections
 
 logger = logging.getLogger(__name__)
 
+# Telegram limits for bulk sends
+TEXT_MESSAGE_LIMIT = 4096  # characters per text message
+CAPTION_LIMIT = 1024  # characters per media caption
+MEDIA_GROUP_SIZE = 10  # items per album
+TEXT_PACK_SEPARATOR = "\n\n➖➖➖\n\n"
+
+# Single-item sends: InputMedia type -> (Bot method, file argument)
+SINGLE_MEDIA_METHODS = {
+    "photo": ("send_photo", "photo"),
+    "video": ("send_video", "video"),
+    "document": ("send_document", "document"),
+    "audio": ("send_audio", "audio"),
+}
+
 # Custom filter - only user action logs and errors
 class UserActionFilter(logging.Filter):
     def filter(self, record):
@@ -65,7 +83,7 @@ async def validate_access_wrapper(update: Update, context: ContextTypes.DEFAULT_
         user_id = update.effective_user.id
         message_func = update.effective_chat.send_message if update.effective_chat else None
 
-    is_allowed, error_msg, collection = check_collection_access(user_id, collection_id)
+    is_allowed, error_msg, collection = await check_collection_access(user_id, collection_id)
     
     if not is_allowed and message_func:
         try:
@@ -132,7 +150,7 @@ def record_activity(func):
     @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user = update.effective_user
-        track_and_reset_user(user, context)
+        await track_and_reset_user(user, context)
         return await func(update, context, *args, **kwargs)
     return wrapper
 
@@ -183,7 +201,7 @@ async def show_collections_menu(update: Update, context: ContextTypes.DEFAULT_TY
     Helper to show a list of collections as a menu.
     Reduces code duplication for collection selection flows.
     """
-    collections = db.get_collections(user_id)
+    collections = await db.aio.get_collections(user_id)
     
     if not collections:
         await send_response(update, context, MSG_NO_COLLECTIONS, edit_message_id=edit_message_id)
@@ -218,11 +236,11 @@ def reset_user_modes(context: ContextTypes.DEFAULT_TYPE):
                 "item_delete_mode", "delete_target_collection_id"]:
         context.user_data.pop(key, None)
 
-def track_and_reset_user(user, context: ContextTypes.DEFAULT_TYPE):
+async def track_and_reset_user(user, context: ContextTypes.DEFAULT_TYPE):
     """Track user in DB and reset all modes"""
     reset_user_modes(context)
     if user:
-        db.upsert_user(user.id, user.username, user.first_name, user.last_name)
+        user_tracker.track(user.id, user.username, user.first_name, user.last_name)
 
 def get_user_keyboard():
     """בניית מקלדת קבועה עם כפתור התחל בלבד"""
@@ -233,13 +251,13 @@ def get_user_keyboard():
         is_persistent=True,
     )
 
-def check_collection_access(user_id: int, collection_id: int) -> tuple[bool, str, tuple | None]:
+async def check_collection_access(user_id: int, collection_id: int) -> tuple[bool, str, tuple | None]:
     """
     Check if user has access to the collection.
     Supports both owned collections and shared collections.
     Returns: (is_allowed, error_message, collection_object)
     """
-    collection = db.get_collection_by_id(collection_id)
+    collection = await db.aio.get_collection_by_id(collection_id)
     if not collection:
         return False, "האוסף לא נמצא (אולי נמחק?).", None
     
@@ -253,7 +271,7 @@ def check_collection_access(user_id: int, collection_id: int) -> tuple[bool, str
     # Check if user has shared access
     if user_id in active_shared_collections:
         share_code = active_shared_collections[user_id]
-        shared_collection = db.get_collection_by_share_code(share_code)
+        shared_collection = await db.aio.get_collection_by_share_code(share_code)
         if shared_collection and shared_collection[0] == collection_id:
             return True, "", collection
     
@@ -295,89 +313,203 @@ def verify_user_code(message, context: ContextTypes.DEFAULT_TYPE, action_type: s
     except ValueError:
         return False, None
 
-def prepare_media_groups(items: list) -> tuple[list, list, list]:
+def fit_caption(text: str | None) -> tuple[str | None, str | None]:
+    """
+    Cut a caption to Telegram's limit on a line or word boundary.
+    Returns (caption, overflow); the overflow is sent as a follow-up text.
     """
-    Prepare media items into visual and document groups.
+    if not text or len(text) <= CAPTION_LIMIT:
+        return text or None, None
+    head = split_text(text, CAPTION_LIMIT - 1)[0]
+    return head + "…", text[len(head):].lstrip()
+
+def balanced_chunks(entries: list, size: int) -> list[list]:
+    """Split entries into the fewest chunks of at most `size`, as evenly as possible (no lone leftovers)."""
+    if not entries:
+        return []
+    count = -(-len(entries) // size)
+    base, extra = divmod(len(entries), count)
+    chunks, start = [], 0
+    for i in range(count):
+        end = start + base + (1 if i < extra else 0)
+        chunks.append(entries[start:end])
+        start = end
+    return chunks
+
+class MediaPlan:
+    """How plan_media_sends() will deliver a list of items."""
+
+    def __init__(self):
+        self.texts: list[tuple[int, str]] = []  # text items
+        self.groups: list[list[tuple[int, object]]] = []  # (item_id, InputMedia*), one album kind, 1-10 each
+        self.followups: list[tuple[int, str]] = []  # caption overflows, sent after the media
+        self.unsendable: list[int] = []  # no file id / unknown type
+
+def plan_media_sends(items: list) -> MediaPlan:
     """
-    media_visual = []
-    media_docs = []
-    text_items = []
+    Turn items into valid, minimal sends:
+    - captions are cut to CAPTION_LIMIT, the rest becomes a follow-up text
+    - photos/videos, documents and audio go to separate albums (Telegram can't mix them)
+    - each kind is split into the fewest albums of up to MEDIA_GROUP_SIZE, evenly sized,
+      so a lone item only happens when a kind has exactly one
+    """
+    plan = MediaPlan()
+    albums = {"visual": [], "document": [], "audio": []}
     
     for item_id, content_type, file_id, text_content, file_name, file_size, added_at in items:
         # Handle text items (no file_id)
         if content_type == "text" or (not file_id and text_content):
-            text_items.append(text_content)
+            plan.texts.append((item_id, text_content))
             continue
             
         if not file_id:
+            plan.unsendable.append(item_id)
             continue
             
+        caption, overflow = fit_caption(text_content)
         if content_type == "video":
-            media_visual.append(InputMediaVideo(media=file_id, caption=text_content))
+            albums["visual"].append((item_id, InputMediaVideo(media=file_id, caption=caption)))
         elif content_type == "photo":
-            media_visual.append(InputMediaPhoto(media=file_id, caption=text_content))
+            albums["visual"].append((item_id, InputMediaPhoto(media=file_id, caption=caption)))
         elif content_type == "document":
-            media_docs.append(InputMediaDocument(media=file_id, filename=file_name, caption=text_content))
+            albums["document"].append((item_id, InputMediaDocument(media=file_id, filename=file_name, caption=caption)))
+        elif content_type == "audio":
+            albums["audio"].append((item_id, InputMediaAudio(media=file_id, filename=file_name, caption=caption)))
+        else:
+            plan.unsendable.append(item_id)
+            continue
+        if overflow:
+            plan.followups.append((item_id, overflow))
     
-    return media_visual, media_docs, text_items
+    for entries in albums.values():
+        plan.groups.extend(balanced_chunks(entries, MEDIA_GROUP_SIZE))
+    return plan
+
+def split_text(text: str, limit: int) -> list[str]:
+    """Split text into pieces of at most `limit` characters, preferring line, then word boundaries."""
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut < limit // 2:
+            cut = text.rfind(" ", 0, limit + 1)
+        if cut < limit // 2:
+            cut = limit
+        pieces.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+def pack_text_items(text_items: list, limit: int = TEXT_MESSAGE_LIMIT) -> list[tuple[list, str]]:
+    """
+    Merge (item_id, text) pairs into as few messages as possible, keeping their order.
+    Every item gets an "ID: n" header (omitted when item_id is None). An item too long
+    for one message is split into numbered parts, each sent on its own.
+    Returns (item_ids, message_text) pairs.
+    """
+    messages = []
+    ids, blocks, size = [], [], 0
+
+    for item_id, text in text_items:
+        header = f"ID: {item_id}" if item_id is not None else ""
+        block = f"{header}\n{text}" if header else text
+
+        if len(block) > limit:
+            if blocks:
+                messages.append((ids, TEXT_PACK_SEPARATOR.join(blocks)))
+                ids, blocks, size = [], [], 0
+            # Leave room for the " (n/m)" part counter
+            pieces = split_text(text, limit - len(header) - 16)
+            for n, piece in enumerate(pieces, 1):
+                messages.append(([item_id], f"{header} ({n}/{len(pieces)})\n{piece}".lstrip()))
+            continue
+
+        added = len(block) + (len(TEXT_PACK_SEPARATOR) if blocks else 0)
+        if blocks and size + added > limit:
+            messages.append((ids, TEXT_PACK_SEPARATOR.join(blocks)))
+            ids, blocks, size = [], [], 0
+            added = len(block)
+        ids.append(item_id)
+        blocks.append(block)
+        size += added
+
+    if blocks:
+        messages.append((ids, TEXT_PACK_SEPARATOR.join(blocks)))
+    return messages
 
-async def safe_send_media_group(bot, chat_id, media, reply_to_message_id=None):
+async def safe_send_single_media(bot, chat_id, media) -> bool:
     """
-    Safe wrapper for send_media_group that handles RetryAfter errors.
+    Send one InputMedia with its own method (send_photo etc.) - Telegram rejects
+    albums of a single item. Paced by the send scheduler. Returns True if sent.
     """
+    method, argument = SINGLE_MEDIA_METHODS[media.type]
+    send = getattr(bot, method)
     try:
-        await bot.send_media_group(chat_id=chat_id, media=media, reply_to_message_id=reply_to_message_id)
+        await send_scheduler.send(
+            chat_id,
+            lambda: send(chat_id=chat_id, caption=media.caption, **{argument: media.media}),
+            method=method,
+        )
+        return True
     except Exception as e:
-        if "RetryAfter" in str(e):
-            # Extract retry time if possible, or default to a safe wait
-            logger.warning(f"Flood control triggered. Waiting... Error: {e}")
-            await asyncio.sleep(5) 
-            try:
-                await bot.send_media_group(chat_id=chat_id, media=media, reply_to_message_id=reply_to_message_id)
-            except Exception as retry_e:
-                logger.error(f"Failed to send media group after retry: {retry_e}")
-        else:
-            logger.error(f"Error sending media group: {e}")
+        logger.error(f"Error sending single {media.type}: {e}")
+        return False
 
-async def send_media_groups_in_chunks(bot, chat_id: int, media_visual: list, media_docs: list, text_items: list = None):
+async def safe_send_media_group(bot, chat_id, media, reply_to_message_id=None) -> bool:
     """
-    Send media groups in chunks of 10 to avoid flood limits.
-    Also sends text messages.
+    Safe wrapper for send_media_group, paced by the send scheduler
+    (which also absorbs RetryAfter errors). Returns True if the group was sent.
     """
-    if text_items:
-        for text in text_items:
-            try:
-                await bot.send_message(chat_id=chat_id, text=text)
-                await asyncio.sleep(0.5) # Small delay
-            except Exception as e:
-                logger.error(f"Error sending text item: {e}")
+    try:
+        await send_scheduler.send(
+            chat_id,
+            lambda: bot.send_media_group(chat_id=chat_id, media=media, reply_to_message_id=reply_to_message_id),
+            cost=send_scheduler.media_group_cost(media),
+            method="send_media_group",
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Error sending media group: {e}")
+        return False
 
-    for i in range(0, len(media_visual), 10):
-        chunk = media_visual[i:i + 10]
-        await safe_send_media_group(bot, chat_id=chat_id, media=chunk)
-        if i + 10 < len(media_visual):
-            await asyncio.sleep(4)
-    
-    for i in range(0, len(media_docs), 10):
-        chunk = media_docs[i:i + 10]
-        await safe_send_media_group(bot, chat_id=chat_id, media=chunk)
-        if i + 10 < len(media_docs):
-            await asyncio.sleep(4)
+def parse_anchor(parts: list[str], index: int) -> int | None:
+    """Read the optional page anchor id from callback parts (None if absent)."""
+    if len(parts) > index:
+        try:
+            return int(parts[index])
+        except ValueError:
+            return None
+    return None
 
-def get_page_header(collection_id: int, page: int, block_size: int = 100, page_prefix: str = "") -> tuple[str, int, int, int, int, list]:
+async def get_page_block(collection_id: int, page: int, block_size: int = 100, anchor_id: int | None = None) -> tuple[list, int]:
+    """
+    Fetch the items of a browse page using keyset paging.
+    anchor_id is the id of the last item before the page (carried in callback
+    data); when missing it is looked up once from the index.
+    Returns (items_block, anchor_id).
+    """
+    if anchor_id is None:
+        anchor_id = await db.aio.get_page_anchor_id(collection_id, page, block_size)
+    items_block = await db.aio.get_items_after_id(collection_id, anchor_id, limit=block_size)
+    return items_block, anchor_id
+
+async def get_page_header(collection_id: int, page: int, block_size: int = 100, page_prefix: str = "", anchor_id: int | None = None) -> tuple[str, int, int, int, int, list, int]:
     """
     Calculate pagination details and generate header text.
     """
-    total_items = db.count_items_in_collection(collection_id)
+    stats = await db.aio.get_collection_stats(collection_id)
+    total_items = stats["items"]
     total_pages = max(1, math.ceil(total_items / block_size))
     
     if page < 1:
         page = 1
+        anchor_id = None
     elif page > total_pages:
         page = total_pages
+        anchor_id = None
         
     offset = (page - 1) * block_size
-    items_block = db.get_items_by_collection(collection_id, offset=offset, limit=block_size)
+    items_block, anchor_id = await get_page_block(collection_id, page, block_size, anchor_id)
     items_in_block = len(items_block)
 
     first_index = offset + 1
@@ -391,8 +523,11 @@ def get_page_header(collection_id: int, page: int, block_size: int = 100, page_p
         f"✅ עמוד {page} מתוך {total_pages}\n"
         f"📦 מציג פריטים {first_index}-{last_index} מתוך {total_items}"
     )
+    breakdown = format_collection_stats(stats)
+    if breakdown:
+        header_text += f"\n{breakdown}"
     
-    return header_text, total_items, total_pages, items_in_block, page, items_block
+    return header_text, total_items, total_pages, items_in_block, page, items_block, anchor_id
 
 def build_main_menu_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
@@ -450,54 +585,25 @@ def format_size(size: int | None) -> str:
         return f"{int(s)} {units[idx]}"
     return f"{s:.1f} {units[idx]}"
 
-async def batch_status_loop(chat_id: int, collection_id: int, collection_name: str, context: ContextTypes.DEFAULT_TYPE, user_data_status: dict):
-    """Background loop to update status message every few seconds"""
-    try:
-        while True:
-            current_count = user_data_status["count"]
-            last_sent_count = user_data_status.get("last_sent_count", 0)
-            
-            # If count changed or message doesn't exist, send update
-            if current_count != last_sent_count or not user_data_status.get("msg_id"):
-                
-                # Delete old message if exists
-                old_msg_id = user_data_status.get("msg_id")
-                if old_msg_id:
-                    try:
-                        await context.bot.delete_message(chat_id=chat_id, message_id=old_msg_id)
-                    except Exception:
-                        pass
-                
-                # Send new message
-                text = f"✅ נוספו קבצים לאוסף \"{collection_name}\""
-                keyboard = InlineKeyboardMarkup([
-                    [
-                        InlineKeyboardButton("📊 מצב איסוף", callback_data=f"batch_status:{collection_id}"),
-                        InlineKeyboardButton("🏠 חזרה לבית", callback_data="back_to_main")
-                    ]
-                ])
-                
-                try:
-                    msg = await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard)
-                    user_data_status["msg_id"] = msg.message_id
-                    user_data_status["last_sent_count"] = current_count
-                except Exception as e:
-                    logger.error(f"Error sending batch status: {e}")
-            
-            # Wait 2 seconds
-            await asyncio.sleep(2)
-            
-            if user_data_status["count"] == user_data_status["last_sent_count"]:
-                # No new files in last 2 seconds, stop loop
-                user_data_status["is_updating"] = False
-                break
-                
-    except Exception as e:
-        logger.error(f"Error in batch_status_loop: {e}")
-        user_data_status["is_updating"] = False
-
-async def update_batch_status(message, context: ContextTypes.DEFAULT_TYPE, collection_name: str):
-    """Update file collection status message - throttled system"""
+def format_collection_stats(stats: dict) -> str:
+    """One-line type breakdown from db.get_collection_stats, e.g. '🎬 3 | 🖼 12 | 💾 1.2 GB'."""
+    icons = {"video": "🎬", "photo": "🖼", "document": "📄", "audio": "🎵", "text": "📝"}
+    parts = [f"{icon} {stats[t]}" for t, icon in icons.items() if stats.get(t)]
+    if stats.get("total_size"):
+        parts.append(f"💾 {format_size(stats['total_size'])}")
+    return " | ".join(parts)
+
+def format_duration(seconds: float) -> str:
+    """Format a duration as H:MM:SS / M:SS for progress messages."""
+    seconds = max(0, int(seconds))
+    hours, rem = divmod(seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+async def update_batch_status(message, context: ContextTypes.DEFAULT_TYPE, collection_name: str, count: int = 1):
+    """Count `count` new files for the status message; the shared ticker refreshes it"""
     user_id = message.from_user.id
     
     # Get active collection for this user
@@ -517,25 +623,18 @@ async def update_batch_status(message, context: ContextTypes.DEFAULT_TYPE, colle
             "count": 0,
             "msg_id": None,
             "last_sent_count": 0,
-            "is_updating": False
+            "last_seen_msg_id": None
         }
     
-    # Update count
-    status = user_data["batch_status"][collection_id]
-    status["count"] += 1
-    
-    # Start loop if not running
-    if not status["is_updating"]:
-        status["is_updating"] = True
-        context.application.create_task(
-            batch_status_loop(
-                chat_id=message.chat_id,
-                collection_id=collection_id,
-                collection_name=collection_name,
-                context=context,
-                user_data_status=status
-            )
-        )
+    batch_status_ticker.bump(
+        context.bot,
+        chat_id=message.chat_id,
+        collection_id=collection_id,
+        collection_name=collection_name,
+        status=user_data["batch_status"][collection_id],
+        count=count,
+        message_id=message.message_id
+    )
 
 async def delete_message_after_delay(bot, chat_id: int, message_id: int, delay: int):
     """Delete a message after delay"""
@@ -551,14 +650,21 @@ def build_page_menu(
     total_pages: int,
     items_in_block: int,
     group_size: int = 10,
+    anchor_id: int = 0,
+    next_anchor_id: int | None = None,
+    prev_anchor_id: int | None = None,
 ) -> InlineKeyboardMarkup:
-    """Browsing menu: Select All and below numbers representing groups of items"""
+    """
+    Browsing menu: Select All and below numbers representing groups of items.
+    Anchors are page keyset cursors carried in callback data so the next
+    handler can seek straight to the page instead of using OFFSET.
+    """
 
     # First row: Select All
     row_select_all = [
         InlineKeyboardButton(
             "✳ בחר הכל",
-            callback_data=f"browse_page_select_all:{collection_id}:{page}",
+            callback_data=f"browse_page_select_all:{collection_id}:{page}:{anchor_id}",
         )
     ]
 
@@ -576,7 +682,7 @@ def build_page_menu(
         display_number = display_base + idx
         btn = InlineKeyboardButton(
             str(display_number),
-            callback_data=f"browse_group:{collection_id}:{page}:{idx}",
+            callback_data=f"browse_group:{collection_id}:{page}:{idx}:{anchor_id}",
         )
         if idx <= 5:
             row_numbers_1.append(btn)
@@ -592,17 +698,19 @@ def build_page_menu(
     # Navigation between 100-item pages
     nav_row: list[InlineKeyboardButton] = []
     if page > 1:
+        prev_suffix = f":{prev_anchor_id}" if prev_anchor_id is not None else ""
         nav_row.append(
             InlineKeyboardButton(
                 "⬅ עמוד קודם",
-                callback_data=f"browse_page:{collection_id}:{page - 1}",
+                callback_data=f"browse_page:{collection_id}:{page - 1}{prev_suffix}",
             )
         )
     if page < total_pages:
+        next_suffix = f":{next_anchor_id}" if next_anchor_id is not None else ""
         nav_row.append(
             InlineKeyboardButton(
                 "עמוד הבא ➡",
-                callback_data=f"browse_page:{collection_id}:{page + 1}",
+                callback_data=f"browse_page:{collection_id}:{page + 1}{next_suffix}",
             )
         )
     if nav_row:
@@ -616,32 +724,40 @@ def build_page_file_type_menu(
     video_count: int,
     image_count: int,
     doc_count: int,
+    anchor_id: int = 0,
 ) -> InlineKeyboardMarkup:
     """תפריט סוגי קבצים עבור עמוד דפדוף מסוים"""
+    page_ref = f"{collection_id}:{page}:{anchor_id}"
 
     keyboard = [
         [
             InlineKeyboardButton(
                 text=f"🎬 סרטונים ({video_count})",
-                callback_data=f"page_files_videos:{collection_id}:{page}",
+                callback_data=f"page_files_videos:{page_ref}",
             )
         ],
         [
             InlineKeyboardButton(
                 text=f"🖼 תמונות ({image_count})",
-                callback_data=f"page_files_images:{collection_id}:{page}",
+                callback_data=f"page_files_images:{page_ref}",
             )
         ],
         [
             InlineKeyboardButton(
                 text=f"💿 קבצים ({doc_count})",
-                callback_data=f"page_files_document:{collection_id}:{page}",
+                callback_data=f"page_files_document:{page_ref}",
             )
         ],
         [
             InlineKeyboardButton(
                 text="📨 שלח את כל התוכן בעמוד",
-                callback_data=f"page_files_queue_all:{collection_id}:{page}",
+                callback_data=f"page_files_queue_all:{page_ref}",
+            ),
+        ],
+        [
+            InlineKeyboardButton(
+                text="🗜 שליחה מרוכזת (טקסטים מאוחדים)",
+                callback_data=f"page_files_compact:{page_ref}",
             ),
         ],
         [
@@ -653,7 +769,7 @@ def build_page_file_type_menu(
         [
             InlineKeyboardButton(
                 text="⬅️ חזור",
-                callback_data=f"browse_page:{collection_id}:{page}",
+                callback_data=f"browse_page:{page_ref}",
             ),
         ],
     ]
@@ -666,7 +782,8 @@ async def show_collection_page(
     collection_id: int,
     page: int,
     edit_message_id: int = None,
-    force_resend: bool = False
+    force_resend: bool = False,
+    anchor_id: int | None = None
 ):
     """
     Central function to display a collection browse page.
@@ -677,7 +794,7 @@ async def show_collection_page(
     chat_id = update.effective_chat.id
     
     # 1. Check access
-    is_allowed, error_msg, collection = check_collection_access(user_id, collection_id)
+    is_allowed, error_msg, collection = await check_collection_access(user_id, collection_id)
     if not is_allowed:
         if edit_message_id and not force_resend:
              try:
@@ -692,8 +809,8 @@ async def show_collection_page(
     block_size = 100
     group_size = 10
     
-    header_text, total_items, total_pages, items_in_block, page, _ = get_page_header(
-        collection_id, page, block_size
+    header_text, total_items, total_pages, items_in_block, page, items_block, anchor_id = await get_page_header(
+        collection_id, page, block_size, anchor_id=anchor_id
     )
 
     if total_items == 0:
@@ -708,12 +825,21 @@ async def show_collection_page(
         return
 
     # 3. Build Menu (Numbers buttons)
+    # Keyset cursors for the neighbouring pages
+    next_anchor_id = items_block[-1][0] if items_block else None
+    prev_anchor_id = None
+    if page > 1 and items_block:
+        prev_anchor_id = await db.aio.get_previous_page_anchor_id(collection_id, items_block[0][0], block_size)
+
     reply_markup = build_page_menu(
         collection_id=collection_id,
         page=page,
         total_pages=total_pages,
         items_in_block=items_in_block,
         group_size=group_size,
+        anchor_id=anchor_id,
+        next_anchor_id=next_anchor_id,
+        prev_anchor_id=prev_anchor_id,
     )
 
     # 4. Add Extra Buttons (Scroll, Info, Navigation)
@@ -722,7 +848,7 @@ async def show_collection_page(
     # Row: Scroll View | Info
     keyboard_list.append([
         InlineKeyboardButton("🔄 צפייה בגלילה", callback_data=f"scroll_view:{collection_id}:0"),
-        InlineKeyboardButton("ℹ️ מידע", callback_data=f"page_info:{collection_id}:{page}:0")
+        InlineKeyboardButton("ℹ️ מידע", callback_data=f"page_info:{collection_id}:{page}:0:{anchor_id}")
     ])
     
     # Back button logic
@@ -774,15 +900,15 @@ async def send_info_page(
     collection_id: int,
     page: int,
     info_page: int,
-    edit_message_id: int = None
+    edit_message_id: int = None,
+    anchor_id: int | None = None
 ):
     """Send or edit info page message showing file details for a collection."""
     block_size = 100
     info_group_size = 10
 
     # Get items for current page block
-    offset_block = (page - 1) * block_size
-    items_block = db.get_items_by_collection(collection_id, offset=offset_block, limit=block_size)
+    items_block, anchor_id = await get_page_block(collection_id, page, block_size, anchor_id)
     
     if not items_block:
         text = "אין פריטים בעמוד זה."
@@ -840,23 +966,24 @@ async def send_info_page(
     context.user_data["info_page_collection_id"] = collection_id
     context.user_data["info_page_page"] = page
     context.user_data["info_page_info_page"] = info_page
+    context.user_data["info_page_anchor_id"] = anchor_id
     
     info_text += f"\n💡 <i>שלח את מספר ה-ID כדי לקבל את הקובץ</i>"
     
     # Build navigation keyboard
     nav_buttons = []
     if info_page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ הקודם", callback_data=f"page_info:{collection_id}:{page}:{info_page - 1}"))
+        nav_buttons.append(InlineKeyboardButton("⬅️ הקודם", callback_data=f"page_info:{collection_id}:{page}:{info_page - 1}:{anchor_id}"))
     if info_page < total_info_pages - 1:
-        nav_buttons.append(InlineKeyboardButton("הבא ➡️", callback_data=f"page_info:{collection_id}:{page}:{info_page + 1}"))
+        nav_buttons.append(InlineKeyboardButton("הבא ➡️", callback_data=f"page_info:{collection_id}:{page}:{info_page + 1}:{anchor_id}"))
     
     keyboard = []
     if nav_buttons:
         keyboard.append(nav_buttons)
-    keyboard.append([InlineKeyboardButton("🔙 חזור לתפריט דפדוף", callback_data=f"browse_page:{collection_id}:{page}")])
+    keyboard.append([InlineKeyboardButton("🔙 חזור לתפריט דפדוף", callback_data=f"browse_page:{collection_id}:{page}:{anchor_id}")])
     
     # Check admin status for back button
-    collection = db.get_collection_by_id(collection_id)
+    collection = await db.aio.get_collection_by_id(collection_id)
     if is_admin(user_id) and collection and collection[2] != user_id:
         keyboard.append([InlineKeyboardButton("⬅️ חזור לניהול האוסף", callback_data=f"admin_manage_col:{collection_id}")])
     else:
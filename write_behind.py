@@ -0,0 +1,211 @@
+# write_behind.py
+"""
+Write-Behind Module
+
+Buffers low-value writes that arrive with almost every update and flushes
+them to SQLite in periodic batches instead of one transaction per update.
+
+- UserProfileTracker: remembers a fingerprint of each user's profile and
+  only writes when it actually changed.
+- AccessLogBuffer: batches shared-collection access events; SQLite
+  triggers roll them up into per-share stats.
+"""
+
+import asyncio
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+import db
+
+FLUSH_INTERVAL = 5.0  # seconds between batch flushes
+MAX_PENDING = 500  # flush early once this many changes are waiting
+MAX_TRACKED_USERS = 50000  # fingerprints kept in memory (least recently seen dropped)
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer(ABC):
+    """
+    Base for buffers that flush in batches from a background task.
+    The task is started lazily on the first buffered change. Subclasses
+    implement _drain() (take the pending batch), _write(batch) and
+    _restore(batch) (put a batch back after a failed write).
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.flushes = 0
+
+    @abstractmethod
+    def _pending_count(self) -> int:
+        ...
+
+    @abstractmethod
+    def _drain(self):
+        ...
+
+    @abstractmethod
+    async def _write(self, batch):
+        """Write a drained batch. On failure, leave in `batch` only what still needs writing."""
+
+    @abstractmethod
+    def _restore(self, batch):
+        ...
+
+    def _buffered(self):
+        """Call after adding a change: starts the flusher, flushes early when full."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self._pending_count() >= self.max_pending:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything pending in one batch."""
+        if not self._pending_count():
+            return
+        batch = self._drain()
+        try:
+            await self._write(batch)
+        except Exception as e:
+            logger.warning(f"{type(self).__name__}: failed to flush {len(batch)} change(s), will retry: {e}")
+            self._restore(batch)
+            return
+        self.flushes += 1
+        self.written += len(batch)
+
+    async def close(self):
+        """Stop the flusher and write whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending_count(),
+            "written": self.written,
+            "flushes": self.flushes,
+        }
+
+
+class UserProfileTracker(WriteBehindBuffer):
+    """
+    Write-behind cache for the users table.
+    track() is cheap and synchronous; only changed profiles are upserted.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING):
+        super().__init__(flush_interval, max_pending)
+        self._fingerprints: OrderedDict = OrderedDict()
+        self._pending: dict[int, tuple] = {}
+        self.skipped = 0
+
+    def track(self, user_id: int, username: Optional[str], first_name: Optional[str], last_name: Optional[str]):
+        """Record a user's current profile; unchanged profiles cost nothing."""
+        fingerprint = (username, first_name, last_name)
+        if self._fingerprints.get(user_id) == fingerprint:
+            self._fingerprints.move_to_end(user_id)
+            self.skipped += 1
+            return
+
+        self._fingerprints[user_id] = fingerprint
+        self._fingerprints.move_to_end(user_id)
+        if len(self._fingerprints) > MAX_TRACKED_USERS:
+            self._fingerprints.popitem(last=False)
+
+        first_seen = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._pending[user_id] = (user_id, username, first_name, last_name, first_seen)
+        self._buffered()
+
+    def _pending_count(self) -> int:
+        return len(self._pending)
+
+    def _drain(self):
+        batch, self._pending = self._pending, {}
+        return batch
+
+    async def _write(self, batch):
+        await db.aio.upsert_users_batch(list(batch.values()))
+
+    def _restore(self, batch):
+        # Keep newer changes that arrived meanwhile
+        for user_id, row in batch.items():
+            self._pending.setdefault(user_id, row)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "tracked": len(self._fingerprints), "skipped": self.skipped}
+
+
+class AccessLogBuffer(WriteBehindBuffer):
+    """
+    Write-behind buffer for shared_collection_access_log.
+    Rows are inserted in batches; the rollup triggers update share stats.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING):
+        super().__init__(flush_interval, max_pending)
+        self._pending: list[tuple] = []
+        self.dropped = 0
+
+    def record(self, share_code: str, user_id: int):
+        """Buffer one share access, timestamped now."""
+        self._pending.append((share_code, user_id, datetime.now().isoformat()))
+        self._buffered()
+
+    def _pending_count(self) -> int:
+        return len(self._pending)
+
+    def _drain(self):
+        batch, self._pending = self._pending, []
+        return batch
+
+    async def _write(self, batch):
+        try:
+            await db.aio.log_share_access_batch(batch)
+        except sqlite3.IntegrityError:
+            # A share was deleted before its accesses were flushed - keep the rest
+            written = 0
+            for i, row in enumerate(batch):
+                try:
+                    await db.aio.log_share_access_batch([row])
+                    written += 1
+                except sqlite3.IntegrityError:
+                    self.dropped += 1
+                except Exception:
+                    # Rows before this one are written (or dropped) - only the
+                    # rest may be restored, or the rollups would count them twice
+                    self.written += written
+                    del batch[:i]
+                    raise
+
+    def _restore(self, batch):
+        self._pending[:0] = batch
+
+    def stats(self) -> dict:
+        return {**super().stats(), "dropped": self.dropped}
+
+
+# Shared buffers used by all handlers
+user_tracker = UserProfileTracker()
+access_log = AccessLogBuffer()